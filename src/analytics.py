@@ -1,40 +1,447 @@
+import numpy as np
 import pandas as pd
+import psycopg2
+from src.config import get_source_config
+from src.db_conn import get_conn
+
+# Report dimension -> surrogate key in the fact table
+DIMENSIONS = {
+    "product": "product_id",
+    "location": "location_id",
+    "payment": "payment_id",
+}
+
+# Dimension -> load.tables df_key of its staging table
+DIMENSION_TABLES = {
+    "product": "stg_product",
+    "location": "stg_location",
+    "payment": "stg_payment_method",
+}
+
+# Rows per round trip when reading from a server-side cursor
+FETCH_SIZE = 10_000
+
+# Same cube as _build_cube, aggregated by the server over everything loaded into the fact table
+CUBE_SQL = """
+    SELECT product_id, location_id, payment_id, transaction_date::date AS transaction_date,
+           SUM(total_spent)::float8 AS total_spent,
+           COUNT(*) AS num_transactions,
+           SUM(quantity)::bigint AS total_quantity
+    FROM {sales}
+    {where}
+    GROUP BY 1, 2, 3, 4
+"""
+
+# The daily rollup the Loader maintains (load.tables[].rollup) already holds the cube
+ROLLUP_SQL = """
+    SELECT * FROM {rollup}
+    WHERE {count} <> 0 {where}
+"""
+
+class _SortedIndex:
+    # Row order of a frame sorted by transaction_date, computed once. A date range is two binary
+    # searches over the sorted dates. Each dimension gets, on first use, a code per sorted row and
+    # the ascending positions of every member, so filters start from the smallest member list and
+    # check the other dimensions only on those rows. The frame itself is never copied or reordered.
+    def __init__(self, frame):
+        dates = frame['transaction_date']
+        if not pd.api.types.is_datetime64_any_dtype(dates.dtype):
+            dates = pd.to_datetime(dates)
+        dates = dates.to_numpy(dtype='datetime64[ns]')
+        self.frame = frame
+        self.order = np.argsort(dates, kind='stable')
+        self.dates = dates[self.order]
+        self._dims = {}
+
+    def dimension(self, key):
+        # (code per sorted row, {member: code}, positions per code)
+        if key not in self._dims:
+            codes, uniques = pd.factorize(self.frame[key].to_numpy()[self.order])
+            by_code = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[by_code], np.arange(len(uniques) + 1))
+            positions = [by_code[bounds[i]:bounds[i + 1]] for i in range(len(uniques))]
+            self._dims[key] = (codes, {u: i for i, u in enumerate(uniques)}, positions)
+        return self._dims[key]
+
+    def select(self, start=None, end=None, members=None):
+        # Rows with start <= transaction_date < end whose keys are among the given members, in date order
+        lo = 0 if start is None else np.searchsorted(self.dates, pd.Timestamp(start).to_datetime64(), 'left')
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, pd.Timestamp(end).to_datetime64(), 'left')
+
+        wanted = {}
+        for key, ids in (members or {}).items():
+            codes, lookup, positions = self.dimension(key)
+            wanted[key] = [lookup[i] for i in ids if i in lookup]
+
+        if not wanted:
+            rows = np.arange(lo, hi)
+        else:
+            def window(key):
+                positions = self.dimension(key)[2]
+                return [p[np.searchsorted(p, lo):np.searchsorted(p, hi)] for p in (positions[c] for c in wanted[key])]
+
+            # Start from the most selective dimension, then check the rest row by row
+            first = min(wanted, key=lambda k: sum(len(p) for p in window(k)))
+            parts = window(first)
+            rows = parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts or [np.empty(0, dtype=np.intp)]))
+            for key, codes in wanted.items():
+                if key != first and len(rows):
+                    rows = rows[np.isin(self.dimension(key)[0][rows], codes)]
+
+        return self.frame.take(self.order[rows])
+
 
 class SalesAnalytics:
-    def __init__(self, stg_sales, stg_product, stg_location, stg_payment_method):
-        self.sales = stg_sales.copy()
-        self.product = stg_product.copy()
-        self.location = stg_location.copy()
-        self.payment = stg_payment_method.copy()
-        
-        self.sales['transaction_date'] = pd.to_datetime(self.sales['transaction_date'])
-    
-   
+    # The staging frames are referenced, never copied or modified. Every report is a roll-up of one
+    # cube computed on first use in a single groupby over the fact table: total spent, quantity and
+    # transaction count per product x location x payment x day. Labels are joined onto the small result.
+    # A precomputed cube (see from_db) replaces the fact table, which can then be None.
+    # filter() returns a view with the same reports over a date range and/or dimension members.
+    def __init__(self, stg_sales, stg_product, stg_location, stg_payment_method, cube=None):
+        self.sales = stg_sales
+        self.product = stg_product
+        self.location = stg_location
+        self.payment = stg_payment_method
+        self._cube = cube
+        self._filters = {}
+        # Sorted indexes over the unfiltered cube and fact table, shared with filtered views
+        self._indexes = {}
+
+
+    @classmethod
+    def from_db(cls, conn_params, yaml_path="config/sources.yml", source_name="dirty_cafe_sales", start=None, end=None):
+        # Analytics over everything loaded into Postgres. The cube is read from the Loader's daily rollup
+        # when one is configured, so its size follows days x dimension members rather than transactions;
+        # otherwise the server aggregates the fact table. Dimension tables are read whole. All reads go
+        # through server-side cursors. start/end bound transaction_date.
+        src_cfg = get_source_config(yaml_path, source_name)
+        if not src_cfg or not src_cfg.load:
+            raise ValueError(f"YAML missing load rules for source '{source_name}'")
+        tables = {t["df_key"]: t for t in src_cfg.load.get("tables", [])}
+        targets = {df_key: t["target"] for df_key, t in tables.items()}
+        rollup = tables["stg_sales"].get("rollup")
+
+        where, params = [], []
+        if start is not None:
+            where.append("transaction_date >= %s")
+            params.append(start)
+        if end is not None:
+            where.append("transaction_date < %s")
+            params.append(end)
+        cube_sql = CUBE_SQL.format(sales=targets["stg_sales"], where=f"WHERE {' AND '.join(where)}" if where else "")
+
+        with get_conn(conn_params, pooled=True, settings=src_cfg.load.get("session")) as conn:
+            cube = None
+            if rollup:
+                rollup_sql = ROLLUP_SQL.format(rollup=rollup["target"], count=rollup["count"],
+                                               where="".join(f" AND {w}" for w in where))
+                try:
+                    cube = _read_sql(conn, "analytics_rollup", rollup_sql, params)
+                except psycopg2.errors.UndefinedTable:
+                    # Nothing loaded since the rollup was configured
+                    conn.rollback()
+            if cube is None:
+                cube = _read_sql(conn, "analytics_cube", cube_sql, params)
+            dims = {name: _read_sql(conn, f"analytics_{name}", f"SELECT * FROM {targets[df_key]}")
+                    for name, df_key in DIMENSION_TABLES.items()}
+            conn.commit()
+
+        cube['transaction_date'] = pd.to_datetime(cube['transaction_date'])
+        # NUMERIC sums arrive as Decimal
+        for col in ('total_spent', 'total_quantity', 'num_transactions'):
+            if col in cube.columns:
+                cube[col] = pd.to_numeric(cube[col])
+        return cls(None, dims["product"], dims["location"], dims["payment"], cube=cube)
+
+
+    @property
+    def cube(self):
+        if self._cube is None:
+            self._cube = self._build_cube()
+        return self._cube
+
+
+    def _build_cube(self):
+        sales = self.sales
+        dates = sales['transaction_date']
+        if not pd.api.types.is_datetime64_any_dtype(dates.dtype):
+            dates = pd.to_datetime(dates)
+
+        keys = [sales[k] for k in DIMENSIONS.values() if k in sales.columns]
+        keys.append(dates.dt.normalize().rename('transaction_date'))
+
+        aggs = {'total_spent': ('total_spent', 'sum'), 'num_transactions': ('total_spent', 'size')}
+        if 'quantity' in sales.columns:
+            aggs['total_quantity'] = ('quantity', 'sum')
+        values = sales[[c for c in ('total_spent', 'quantity') if c in sales.columns]]
+        return values.groupby(keys, sort=False, dropna=False, observed=True).agg(**aggs).reset_index()
+
+
+    def _index(self, name):
+        if name not in self._indexes:
+            self._indexes[name] = _SortedIndex(self.cube if name == 'cube' else self.sales)
+        return self._indexes[name]
+
+
+    def _member_ids(self, dimension, values):
+        # Surrogate keys of the members with the given labels (or keys, for a dimension without labels)
+        values = [values] if isinstance(values, str) or not pd.api.types.is_list_like(values) else list(values)
+        key = DIMENSIONS[dimension]
+        dim = getattr(self, dimension)
+        label = self.label_column(dim, key)
+        if label == key:
+            return set(values)
+        return set(dim.loc[dim[label].isin(values), key])
+
+
+    def filter(self, start=None, end=None, product=None, location=None, payment=None):
+        # View over start <= transaction_date < end and the given products/locations/payment methods
+        # (labels, or lists of labels). Filters on a view narrow it further.
+        filters = dict(self._filters)
+        if start is not None:
+            start = pd.Timestamp(start)
+            filters['start'] = max(start, filters['start']) if 'start' in filters else start
+        if end is not None:
+            end = pd.Timestamp(end)
+            filters['end'] = min(end, filters['end']) if 'end' in filters else end
+        for dimension, values in (('product', product), ('location', location), ('payment', payment)):
+            if values is not None:
+                ids = self._member_ids(dimension, values)
+                key = DIMENSIONS[dimension]
+                filters[key] = filters[key] & ids if key in filters else ids
+
+        # Build the shared index from the full cube before a view replaces it
+        cube_index = self._index('cube')
+        view = SalesAnalytics(self.sales, self.product, self.location, self.payment, cube=self._select(cube_index, filters))
+        view._filters = filters
+        view._indexes = self._indexes
+        return view
+
+
+    @staticmethod
+    def _select(index, filters):
+        members = {k: v for k, v in filters.items() if k not in ('start', 'end')}
+        return index.select(filters.get('start'), filters.get('end'), members)
+
+
+    def transactions(self):
+        # Fact rows matching this view's filters, in date order
+        if self.sales is None:
+            raise ValueError("transactions: no fact table (analytics built from the database)")
+        return self._select(self._index('sales'), self._filters)
+
+
+    def _rollup(self, by, columns=None):
+        columns = columns or [c for c in ('total_spent', 'total_quantity', 'num_transactions') if c in self.cube.columns]
+        return self.cube.groupby(by, sort=False, dropna=False, observed=True)[columns].sum().reset_index()
+
+
+    @staticmethod
+    def label_column(dim, key):
+        # First descriptive column of a dimension table (e.g. Item for products), else the key itself
+        if dim is None:
+            return key
+        return next((c for c in dim.columns if c != key), key)
+
+
+    def breakdown(self, dimension, columns=None):
+        # Totals per member of a dimension, labelled and sorted by total spent
+        key = DIMENSIONS[dimension]
+        dim = getattr(self, dimension)
+        label = self.label_column(dim, key)
+
+        df = self._rollup(key, columns)
+        if label != key:
+            df = df.merge(dim[[key, label]].drop_duplicates(key), on=key)
+        values = [c for c in df.columns if c not in (key, label)]
+        return df[[label, *values]].sort_values('total_spent', ascending=False).reset_index(drop=True)
+
+
+    def totals(self):
+        # Column by column, so counts stay integers instead of being summed as floats with the amounts
+        measures = self.cube.columns.difference([*DIMENSIONS.values(), 'transaction_date'], sort=False)
+        return {c: self.cube[c].sum().item() for c in measures}
+
+
     def sales_by_product(self):
-        df = self.sales.groupby('product_id')['total_spent'].sum().reset_index()
-        df = df.merge(self.product[['product_id', 'Item']], on='product_id')
-        df = df[['Item', 'total_spent']].sort_values('total_spent', ascending=False).reset_index(drop=True)
+        df = self.breakdown("product", ['total_spent'])
         df.title = "Sales by Product (Greatest to Least)"
         return df
-    
-    
+
+
     def sales_by_location(self):
-        df = self.sales.groupby('location_id')['total_spent'].sum().reset_index()
-        df = df.merge(self.location[['location_id', 'location_type']], on='location_id')
-        df = df[['location_type', 'total_spent']].sort_values('total_spent', ascending=False).reset_index(drop=True)
+        df = self.breakdown("location", ['total_spent'])
         df.title = "Sales by Location (Greatest to Least)"
         return df
-    
-    
+
+
     def sales_by_payment(self):
-        df = self.sales.groupby('payment_id')['total_spent'].sum().reset_index()
-        df = df.merge(self.payment[['payment_id', 'payment_method']], on='payment_id')
-        df = df[['payment_method', 'total_spent']].sort_values('total_spent', ascending=False).reset_index(drop=True)
+        df = self.breakdown("payment", ['total_spent'])
         df.title = "Sales by Payment Method (Greatest to Least)"
         return df
-    
-   
+
+
+    def daily_summary(self, columns=None):
+        df = self._rollup('transaction_date', columns).sort_values('transaction_date').reset_index(drop=True)
+        df['transaction_date'] = df['transaction_date'].dt.date
+        return df
+
+
     def daily_sales(self):
-        df = self.sales.groupby(self.sales['transaction_date'].dt.date)['total_spent'].sum().reset_index(name='total_spent')
-        df = df.rename(columns={df.columns[0]: 'transaction_date'})
-        return df
\ No newline at end of file
+        return self.daily_summary(['total_spent'])
+
+
+    def _dense_daily(self, dimension=None, value='total_spent'):
+        # One pass over the cube into a dense days x members array (every calendar day, zeros where
+        # nothing sold). Members are dimension labels; without a dimension there is one column.
+        cube = self.cube
+        days = cube['transaction_date']
+        label = None
+        if dimension is None:
+            members = np.array(['total'], dtype=object)
+            codes = np.zeros(len(cube), dtype=np.intp)
+        else:
+            key = DIMENSIONS[dimension]
+            dim = getattr(self, dimension)
+            label = self.label_column(dim, key)
+            labels = cube[key] if label == key else cube[key].map(dim.drop_duplicates(key).set_index(key)[label])
+            codes, members = pd.factorize(labels)
+            members = np.asarray(members, dtype=object)
+
+        valid = days.notna().to_numpy() & (codes >= 0)
+        if not valid.any():
+            return pd.DatetimeIndex([], name='transaction_date'), label, members, np.zeros((0, len(members)))
+
+        days = days[valid].to_numpy(dtype='datetime64[D]')
+        first = days.min()
+        offsets = (days - first).astype(np.int64)
+        n_days, m = int(offsets.max()) + 1, len(members)
+        dense = np.bincount(offsets * m + codes[valid], weights=cube[value].to_numpy(dtype=np.float64)[valid],
+                            minlength=n_days * m).reshape(n_days, m)
+        dates = pd.date_range(pd.Timestamp(first), periods=n_days, freq='D', name='transaction_date')
+        return dates, label, members, dense
+
+
+    @staticmethod
+    def _long(index, label, members, columns: dict):
+        # (rows x members) arrays -> one row per (index value, member)
+        out = {index.name: np.repeat(index.to_numpy(), len(members))}
+        if label is not None:
+            out[label] = np.tile(members, len(index))
+        out.update({name: values.ravel() for name, values in columns.items()})
+        return pd.DataFrame(out)
+
+
+    def rolling_sales(self, windows=(7, 28), dimension=None):
+        # Trailing N-day revenue per day (and per product/location/payment member), all windows from
+        # one cumulative sum: window total = cumsum[t] - cumsum[t - N]
+        dates, label, members, dense = self._dense_daily(dimension)
+        cumsum = np.vstack([np.zeros((1, dense.shape[1])), np.cumsum(dense, axis=0)])
+        end = np.arange(1, len(dates) + 1)
+        columns = {'total_spent': dense}
+        for w in windows:
+            columns[f'rolling_{w}d'] = cumsum[end] - cumsum[np.maximum(end - w, 0)]
+        return self._long(dates, label, members, columns)
+
+
+    def period_over_period(self, freq='W', dimension=None):
+        # Weekly ('W', Monday to Sunday) or monthly ('M') revenue with the change from the previous period
+        dates, label, members, dense = self._dense_daily(dimension)
+        periods = dates.to_period(freq)
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]]) if len(periods) else np.array([], dtype=np.intp)
+        totals = np.add.reduceat(dense, starts, axis=0) if len(starts) else dense
+
+        previous = np.vstack([np.full((1, totals.shape[1]), np.nan), totals[:-1]])
+        change = totals - previous
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_change = np.where(previous != 0, change / previous, np.nan)
+
+        index = pd.DatetimeIndex(periods[starts].start_time, name='period')
+        return self._long(index, label, members, {'total_spent': totals, 'change': change, 'pct_change': pct_change})
+
+
+    def rolling_window(self, windows=(7, 28), dimension=None):
+        # RollingWindow holding the current window sums, to be advanced day by day with add_day
+        dates, label, members, dense = self._dense_daily(dimension)
+        state = RollingWindow(members, windows)
+        # Days older than the longest window no longer count towards any sum
+        depth = max(windows)
+        for day, row in zip(dates[-depth:], dense[-depth:]):
+            state.add_day(day, dict(zip(members, row)))
+        return state
+
+
+class RollingWindow:
+    # Trailing window sums per member, advanced one day at a time: each new day adds its totals and
+    # subtracts the day leaving each window (a ring buffer of the last max(windows) days), so an
+    # update costs O(members), not a recomputation over the history.
+    def __init__(self, members=(), windows=(7, 28)):
+        self.windows = tuple(windows)
+        self.depth = max(self.windows)
+        self.members = list(members)
+        self._columns = {m: i for i, m in enumerate(self.members)}
+        self.history = np.zeros((self.depth, len(self.members)))
+        self.sums = np.zeros((len(self.windows), len(self.members)))
+        self.last_day = None
+        self._pos = 0
+
+
+    def _add_member(self, member):
+        self._columns[member] = len(self.members)
+        self.members.append(member)
+        self.history = np.hstack([self.history, np.zeros((self.depth, 1))])
+        self.sums = np.hstack([self.sums, np.zeros((len(self.windows), 1))])
+
+
+    def _push(self, row):
+        for k, w in enumerate(self.windows):
+            self.sums[k] += row - self.history[(self._pos - w) % self.depth]
+        self.history[self._pos % self.depth] = row
+        self._pos += 1
+
+
+    def add_day(self, day, totals: dict):
+        # totals: {member: revenue} for the new day; members not seen before are added
+        day = pd.Timestamp(day).normalize()
+        if self.last_day is not None and day <= self.last_day:
+            raise ValueError(f"RollingWindow: {day.date()} is not after {self.last_day.date()}")
+
+        for member in totals:
+            if member not in self._columns:
+                self._add_member(member)
+
+        if self.last_day is not None:
+            # Days without sales still move the windows
+            for _ in range(min((day - self.last_day).days - 1, self.depth)):
+                self._push(np.zeros(len(self.members)))
+
+        row = np.zeros(len(self.members))
+        for member, value in totals.items():
+            row[self._columns[member]] = value
+        self._push(row)
+        self.last_day = day
+        return self.current()
+
+
+    def current(self):
+        return pd.DataFrame(self.sums.T, index=pd.Index(self.members, name='member'),
+                            columns=[f'rolling_{w}d' for w in self.windows])
+
+
+def _read_sql(conn, name, sql, params=None):
+    # Streams a query through a named (server-side) cursor, FETCH_SIZE rows at a time
+    cur = conn.cursor(name=name)
+    cur.itersize = FETCH_SIZE
+    try:
+        cur.execute(sql, params or None)
+        chunks, columns = [], None
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if columns is None:
+                columns = [d[0] for d in cur.description]
+            if not rows:
+                break
+            chunks.append(pd.DataFrame.from_records(rows, columns=columns))
+    finally:
+        cur.close()
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
@@ -0,0 +1,107 @@
+import logging
+import re
+import threading
+from src.util import get_logger
+
+logger = get_logger(name="Catalog", log_file="../logs/etl.log", level=logging.INFO)
+
+# Column names and types of every user table, read from information_schema once per database
+# per process. The Loader consults it to skip DDL for tables that already exist and to report
+# drift between a frame and its target table.
+
+CATALOG_SQL = """
+    SELECT table_schema, table_name, column_name, data_type
+    FROM information_schema.columns
+    WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
+    ORDER BY table_schema, table_name, ordinal_position;
+"""
+
+PARTITIONED_SQL = "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s));"
+
+# DDL type -> information_schema.columns.data_type
+DATA_TYPES = {
+    "TIMESTAMP": "timestamp without time zone",
+    "TIMESTAMPTZ": "timestamp with time zone",
+}
+
+
+def qualified(table_name: str) -> str:
+    name = table_name.replace('"', "").lower()
+    return name if "." in name else f"public.{name}"
+
+
+def data_type(pg_type: str) -> str:
+    # "NUMERIC(10,2)" -> "numeric", "INTEGER" -> "integer"
+    base = re.sub(r"\(.*\)", "", pg_type).strip().upper()
+    return DATA_TYPES.get(base, base.lower())
+
+
+class Catalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = None
+        self._partitioned = {}
+
+    def _load(self, conn):
+        cur = conn.cursor()
+        cur.execute(CATALOG_SQL)
+        tables = {}
+        for schema, table, column, dtype in cur.fetchall():
+            tables.setdefault(f"{schema}.{table}", {})[column] = dtype
+        cur.close()
+        conn.commit()
+        logger.info(f"Catalog: {len(tables)} tables introspected")
+        return tables
+
+    def columns(self, conn, table_name: str):
+        # {column: data_type} of an existing table, or None if the table doesn't exist
+        with self._lock:
+            if self._tables is None:
+                self._tables = self._load(conn)
+            return self._tables.get(qualified(table_name))
+
+    def partitioned(self, conn, table_name: str) -> bool:
+        # Whether the table is a partitioned parent; asked once per table, only for partition_by tables
+        name = qualified(table_name)
+        with self._lock:
+            if name not in self._partitioned:
+                cur = conn.cursor()
+                cur.execute(PARTITIONED_SQL, (name,))
+                self._partitioned[name] = bool(cur.fetchone()[0])
+                cur.close()
+            return self._partitioned[name]
+
+    def add(self, table_name: str, columns: dict, partitioned: bool = None):
+        with self._lock:
+            if self._tables is None:
+                self._tables = {}
+            self._tables[qualified(table_name)] = dict(columns)
+            if partitioned is not None:
+                self._partitioned[qualified(table_name)] = partitioned
+
+    def forget(self, table_name: str = None):
+        with self._lock:
+            if table_name is None:
+                self._tables = None
+                self._partitioned.clear()
+                return
+            self._partitioned.pop(qualified(table_name), None)
+            if self._tables is not None:
+                self._tables.pop(qualified(table_name), None)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(conn_params: dict) -> Catalog:
+    key = tuple((conn_params or {}).get(k) for k in ("host", "port", "database"))
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = Catalog()
+        return _catalogs[key]
+
+
+def clear_catalogs():
+    with _catalogs_lock:
+        _catalogs.clear()
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping
+import yaml
+
+
+def _freeze(obj):
+    # Read-only view of parsed YAML: dicts -> mappingproxy, lists -> tuples
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
+def _thaw(obj):
+    if isinstance(obj, Mapping):
+        return {k: _thaw(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return [_thaw(v) for v in obj]
+    return obj
+
+
+EMPTY = MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class SourceConfig:
+    name: str
+    schema: Mapping = field(default_factory=lambda: EMPTY)
+    cleaning: Mapping = field(default_factory=lambda: EMPTY)
+    normalize: Mapping = field(default_factory=lambda: EMPTY)
+    load: Mapping = field(default_factory=lambda: EMPTY)
+    extract: Mapping = field(default_factory=lambda: EMPTY)
+    raw: Mapping = field(default_factory=lambda: EMPTY)
+
+    @classmethod
+    def from_dict(cls, source: dict) -> "SourceConfig":
+        frozen = _freeze(source)
+        return cls(
+            name=source.get("name"),
+            schema=frozen.get("schema", EMPTY),
+            cleaning=frozen.get("cleaning", EMPTY),
+            normalize=frozen.get("normalize", EMPTY),
+            load=frozen.get("load", EMPTY),
+            extract=frozen.get("extract", EMPTY),
+            raw=frozen,
+        )
+
+    def __reduce__(self):
+        # mappingproxy can't be pickled (process pools); rebuild from plain dicts instead
+        return (_rebuild_source, (self.name, _thaw(self.raw)))
+
+
+def _rebuild_source(name: str, raw: dict) -> SourceConfig:
+    return SourceConfig.from_dict(raw) if raw else SourceConfig(name=name)
+
+
+@dataclass
+class _Entry:
+    stat_key: tuple
+    digest: str
+    sources: Mapping
+
+
+class ConfigRegistry:
+    # Parses each config file once per process. Every lookup stats the file; a changed
+    # mtime/size triggers a re-read, and only a changed content hash triggers a re-parse.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def sources(self, path: str) -> Mapping:
+        abspath = os.path.abspath(path)
+        st = os.stat(abspath)
+        stat_key = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(abspath)
+            if entry and entry.stat_key == stat_key:
+                return entry.sources
+
+            with open(abspath, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if entry and entry.digest == digest:
+                entry.stat_key = stat_key
+                return entry.sources
+
+            config = yaml.safe_load(data) or {}
+            sources = MappingProxyType({
+                s.get("name"): SourceConfig.from_dict(s) for s in config.get("sources", [])
+            })
+            self._entries[abspath] = _Entry(stat_key, digest, sources)
+            return sources
+
+    def source(self, path: str, source_name: str):
+        # SourceConfig for source_name, or None if the file has no such source
+        return self.sources(path).get(source_name)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+registry = ConfigRegistry()
+
+
+def get_source_config(path: str, source_name: str):
+    return registry.source(path, source_name)
@@ -1,5 +1,10 @@
 import psycopg2
+import psycopg2.pool
+import atexit
 import logging
+import os
+import threading
+import time
 from contextlib import contextmanager
 from src.util import get_logger
 
@@ -7,17 +12,145 @@ logger = get_logger(name='Connection', log_file='../logs/etl.log', level=logging
 
 VALID_CONN_KEYS = {"host", "database", "user", "password", "port"}
 
+# Pooled connections: at most POOL_MAX_SIZE per database, shared by every thread in the process
+# whatever session settings they ask for. Connections idle longer than HEALTH_CHECK_SECONDS are
+# pinged before reuse.
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+HEALTH_CHECK_SECONDS = 30
+
+
+def _connect_kwargs(conn_params, settings=None):
+    safe_params = {k: v for k, v in conn_params.items() if k in VALID_CONN_KEYS}
+    if settings:
+        # Session settings (e.g. synchronous_commit, work_mem) are sent with the startup packet
+        opts = []
+        for k, v in settings.items():
+            value = str(v).replace(" ", "\\ ")
+            opts.append(f"-c {k}={value}")
+        safe_params["options"] = " ".join(opts)
+    return safe_params
+
+
+class _Pool:
+    def __init__(self, kwargs, maxconn):
+        # Opens connections lazily; minconn is also how many idle ones putconn keeps, so raise it afterwards
+        self.pool = psycopg2.pool.ThreadedConnectionPool(0, maxconn, **kwargs)
+        self.pool.minconn = maxconn
+        # ThreadedConnectionPool raises when exhausted; callers wait for a free slot instead
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.last_used = {}
+        self.settings = {}
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self.last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < HEALTH_CHECK_SECONDS:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def _apply_settings(self, conn, settings):
+        # Connections are shared across settings, so each checkout sets its own (only when they changed)
+        settings = dict(settings or {})
+        if self.settings.get(id(conn), {}) == settings:
+            return
+        cur = conn.cursor()
+        cur.execute("RESET ALL")
+        for k, v in settings.items():
+            cur.execute("SELECT set_config(%s, %s, false)", (k, str(v)))
+        cur.close()
+        conn.commit()
+        self.settings[id(conn)] = settings
+
+    def acquire(self, settings=None):
+        self.slots.acquire()
+        conn = None
+        try:
+            conn = self.pool.getconn()
+            if not self._healthy(conn):
+                logger.warning("DB: discarding broken pooled connection")
+                self._forget(conn)
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+            self._apply_settings(conn, settings)
+            return conn
+        except Exception:
+            if conn is not None:
+                self._forget(conn)
+                self.pool.putconn(conn, close=True)
+            self.slots.release()
+            raise
+
+    def _forget(self, conn):
+        self.last_used.pop(id(conn), None)
+        self.settings.pop(id(conn), None)
+
+    def release(self, conn, broken=False):
+        try:
+            if not broken and not conn.closed:
+                # Hand the next user a connection outside any transaction
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                self.last_used[id(conn)] = time.monotonic()
+                self.pool.putconn(conn)
+            else:
+                self._forget(conn)
+                self.pool.putconn(conn, close=True)
+        finally:
+            self.slots.release()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(kwargs):
+    key = tuple(sorted((k, str(v)) for k, v in kwargs.items()))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = _Pool(kwargs, POOL_MAX_SIZE)
+            logger.info(f"DB: connection pool created (max {POOL_MAX_SIZE})")
+        return _pools[key]
+
+
+def close_pools():
+    with _pools_lock:
+        for p in _pools.values():
+            p.pool.closeall()
+        _pools.clear()
+
+
+atexit.register(close_pools)
+
+
 @contextmanager
-def get_conn(conn_params):
+def get_conn(conn_params, pooled=False, settings=None):
+    if pooled:
+        pool = _get_pool(_connect_kwargs(conn_params))
+        conn = pool.acquire(settings)
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            pool.release(conn, broken=broken)
+        return
+
     conn = None
-    safe_params = {k: v for k, v in conn_params.items() if k in VALID_CONN_KEYS}
     try:
-        conn = psycopg2.connect(**safe_params)
+        conn = psycopg2.connect(**_connect_kwargs(conn_params, settings))
         logger.info("DB: Postgres connection opened")
         yield conn
     finally:
         if conn:
             conn.close()
             logger.info("DB: Postgres connection closed")
-
-
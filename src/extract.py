@@ -4,9 +4,47 @@ import json
 from pathlib import Path
 from src.util import get_logger
 import os
+from src.config import SourceConfig, get_source_config
+import glob
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as pa_ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, CSV reads fall back to the pandas C parser
+    pa = None
+    pa_csv = None
+    pa_ds = None
+    pq = None
+
+try:
+    import zstandard
+except ImportError:  # optional: pandas needs it for .zst, pyarrow's decompressor is used otherwise
+    zstandard = None
+
+CSV_ENGINES = ("auto", "c", "pyarrow", "mmap")
+
+# Compressed inputs are decompressed transparently: "sales.csv.gz", "sales.jsonl.zst", ...
+COMPRESSION_EXTS = {"gz": "gzip", "bz2": "bz2", "zst": "zstd"}
+JSON_LINES_EXTS = ("jsonl", "ndjson")
+PARQUET_EXTS = ("parquet", "pq")
+ARROW_EXTS = ("arrow", "feather", "ipc")
+
+# Schema types from sources.yml -> dtype used by the CSV parser
+READ_DTYPES = {
+    "int64": "float64",  # float64 so missing values can be NA; cast to Int64 in clean
+    "float": "float64",
+    "string": "string",
+    "date": "string",
+}
 
 class DataExtractor:
-    def __init__(self,  logger=None):
+    def __init__(self,  logger=None, schema_path: str = "config/sources.yml", source_name: str = "dirty_cafe_sales"):
         if logger:
             self.logger = logging.getLogger("Extract")
             self.logger.setLevel(logger.level)
@@ -20,25 +58,141 @@ class DataExtractor:
                 level=logging.INFO
             )
         self.logger.info("------------------------ Extractor initialized -----------------------")
+
+        self.source_config = self._load_source_config(schema_path, source_name)
+
+
+    def _load_source_config(self, path: str, source_name: str) -> SourceConfig:
+        # Schema hints are optional for extraction; without them pandas infers every column
+        if not path or not os.path.exists(path):
+            self.logger.warning(f"_load_source_config: No config at {path}, reading without schema hints")
+            return SourceConfig(name=source_name)
+
+        source = get_source_config(path, source_name)
+        if source is None:
+            self.logger.warning(f"_load_source_config: No config found for source '{source_name}', reading without schema hints")
+            return SourceConfig(name=source_name)
+        return source
+
+
+    def _csv_read_options(self, file_path) -> dict:
+        # Build dtype/usecols/na_values for read_csv from the source schema
+        schema = self.source_config.schema
+        cleaning = self.source_config.cleaning
+        if not schema:
+            return {}
+
+        header = [str(c).strip() for c in self._read_header(file_path)]
+
+        usecols = [c for c in header if c in schema]
+        if not usecols:
+            self.logger.warning("extract: No schema columns in header, reading without schema hints")
+            return {}
+
+        # Columns that need regex extraction stay text, e.g. "TXN_123" for an int64 ID
+        regex_cols = {r.get("column") for r in cleaning.get("transformations", []) if "regex_extract" in r}
+        categorical = set(self.source_config.extract.get("categorical", []))
+
+        dtype = {}
+        for col in usecols:
+            if col in categorical:
+                dtype[col] = "category"
+            elif col in regex_cols:
+                dtype[col] = "string"
+            elif schema[col] in READ_DTYPES:
+                dtype[col] = READ_DTYPES[schema[col]]
+
+        return {
+            "usecols": usecols,
+            "dtype": dtype,
+            "na_values": list(cleaning.get("missing_values", [])),
+        }
+
+
+    @classmethod
+    def _read_header(cls, file_path) -> list:
+        with cls._open_input(file_path) as source:
+            columns = list(pd.read_csv(source, nrows=0).columns)
+        if hasattr(file_path, "seek"):
+            file_path.seek(0)
+        return columns
+
+
+    @classmethod
+    @contextmanager
+    def _open_input(cls, file_path):
+        # What to hand the pandas readers: the path itself, or for .zst without zstandard a stream
+        # decompressed by pyarrow (pandas can't open those on its own)
+        zstd_path = isinstance(file_path, (str, os.PathLike)) and cls._file_type(file_path)[1] == "zstd"
+        if not zstd_path or zstandard is not None or pa is None:
+            yield file_path
+            return
+        with pa.input_stream(os.fspath(file_path), compression="zstd") as stream:
+            yield stream
+
+
+    @staticmethod
+    def _file_type(file_name) -> tuple:
+        # ("csv", "gzip") for "sales.csv.gz", ("json", None) for "sales.json"
+        parts = str(file_name).lower().split('.')
+        compression = COMPRESSION_EXTS.get(parts[-1])
+        if compression and len(parts) > 2:
+            parts = parts[:-1]
+        return parts[-1], compression
+
+
+    @staticmethod
+    def _relax_numeric(read_opts: dict) -> dict:
+        # Fall back to text for numeric columns; clean() coerces them with to_numeric
+        if "dtype" not in read_opts:
+            return read_opts
+        dtype = {c: ("string" if t == "float64" else t) for c, t in read_opts.get("dtype", {}).items()}
+        return {**read_opts, "dtype": dtype}
     
 
-    def extract(self, file_name: str):
+    def extract(self, file_name: str, chunksize: int = None, engine: str = "auto", columns: list = None, filters: list = None):
         # Determine file type and call relevant method for non-Streamli version
-        file_type = file_name.split('.')[-1].lower()
-        self.logger.info(f"extract: Extracting data as {file_type}...")
+        # With chunksize set, returns an iterator of DataFrames instead of one frame
+        # columns/filters are pushed down into Parquet/Arrow reads
+        file_type, compression = self._file_type(file_name)
+        self.logger.info(f"extract: Extracting data as {file_type}{f' ({compression})' if compression else ''}...")
 
         if file_type == 'csv':
-            return self.extract_csv(file_name)
+            return self.extract_csv(file_name, chunksize=chunksize, engine=engine)
         elif file_type == 'json':
-            return self.extract_json(file_name)
+            return self.extract_json(file_name, chunksize=chunksize)
+        elif file_type in JSON_LINES_EXTS:
+            return self.extract_json(file_name, chunksize=chunksize, lines=True)
+        elif file_type in PARQUET_EXTS:
+            return self.extract_parquet(file_name, columns=columns, filters=filters, chunksize=chunksize)
+        elif file_type in ARROW_EXTS:
+            return self.extract_arrow(file_name, columns=columns, filters=filters, chunksize=chunksize)
         else:
             self.logger.error(f"extract: Unsupported file type: {file_type}")
             raise ValueError(f"extract: Unsupported file type: {file_type}")
 
 
-    def extract_csv(self, file_path):
+    # engine: "auto", "c" (pandas parser), "pyarrow" (multithreaded) or "mmap" (pandas parser over a memory-mapped local file)
+    def extract_csv(self, file_path, chunksize: int = None, engine: str = "auto"):
         self.logger.info(f"extract: Extracting CSV data from {file_path}...")
-        data = pd.read_csv(file_path)
+        read_opts = self._csv_read_options(file_path)
+        engine = self._resolve_engine(file_path, engine, chunksize, read_opts)
+        self.logger.info(f"extract: Using '{engine}' CSV engine")
+
+        if chunksize:
+            return self._iter_chunks(
+                self._iter_csv_chunks(file_path, read_opts, chunksize, memory_map=(engine == "mmap")), "CSV"
+            )
+
+        try:
+            data = self._read_csv(file_path, read_opts, engine)
+        except ValueError as e:
+            if not read_opts:
+                raise
+            self.logger.warning(f"extract: Non-numeric values in numeric columns ({e}), re-reading them as text")
+            if hasattr(file_path, "seek"):
+                file_path.seek(0)
+            data = self._read_csv(file_path, self._relax_numeric(read_opts), engine)
         
         self.logger.info(f"extract: Successfully extracted CSV data: {data.shape}.")
         self.logger.info(f"extract: Columns: {list(data.columns)}")
@@ -47,12 +201,232 @@ class DataExtractor:
         return data
 
 
-    def extract_json(self, file_path):
+    # Read every shard matching a directory + pattern (or a glob) in a process pool.
+    # Rows are tagged with a categorical source_file column. concat=False returns an
+    # iterator of per-file frames in file order instead of one frame.
+    def extract_dir(self, path: str, pattern: str = "*.csv", max_workers: int = None, concat: bool = True, engine: str = "auto"):
+        files = sorted(glob.glob(os.path.join(path, pattern) if os.path.isdir(path) else path))
+        if not files:
+            self.logger.error(f"extract_dir: No files match {path} ({pattern})")
+            raise FileNotFoundError(f"extract_dir: No files match {path} ({pattern})")
+
+        max_workers = min(max_workers or os.cpu_count() or 1, len(files))
+        self.logger.info(f"extract_dir: Extracting {len(files)} files with {max_workers} workers...")
+
+        frames = self._iter_shards(files, max_workers, engine)
+        if not concat:
+            return frames
+
+        data = pd.concat(list(frames), ignore_index=True)
+        self.logger.info(f"extract_dir: Successfully extracted {len(files)} files: {data.shape}.")
+        self.logger.info("------------------------ Extraction complete -----------------------")
+        return data
+
+
+    def _iter_shards(self, files: list, max_workers: int, engine: str):
+        # Same category set on every frame so concat keeps source_file categorical
+        names = [os.path.basename(f) for f in files]
+        source_type = pd.CategoricalDtype(names if len(set(names)) == len(names) else files)
+
+        def tag(i, df):
+            df["source_file"] = pd.Categorical.from_codes(np.full(len(df), i), dtype=source_type)
+            return df
+
+        if max_workers == 1:
+            for i, f in enumerate(files):
+                yield tag(i, self._read_shard(f, engine))
+            return
+
+        # Keep at most max_workers reads in flight so a slow consumer doesn't buffer every shard
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            pending = deque()
+            for i, f in enumerate(files):
+                pending.append(pool.submit(self._read_shard, f, engine))
+                if len(pending) >= max_workers:
+                    yield tag(i - len(pending) + 1, pending.popleft().result())
+            first = len(files) - len(pending)
+            for j, future in enumerate(pending):
+                yield tag(first + j, future.result())
+
+
+    def _read_shard(self, file_path: str, engine: str) -> pd.DataFrame:
+        return self.extract(file_path, engine=engine)
+
+
+    # lines: JSON Lines (one record per line), inferred from .jsonl/.ndjson when not given.
+    # Only JSON Lines can be streamed with chunksize; a JSON document has to be parsed whole.
+    def extract_json(self, file_path, chunksize: int = None, lines: bool = None):
         self.logger.info(f"extract: Extracting JSON data from {file_path}...")
-        data = pd.read_json(file_path)
+        if lines is None:
+            lines = isinstance(file_path, (str, os.PathLike)) and self._file_type(file_path)[0] in JSON_LINES_EXTS
+
+        if chunksize:
+            if not lines:
+                self.logger.error("extract: Chunked JSON reads need JSON Lines input")
+                raise ValueError("extract: Chunked JSON reads need JSON Lines input")
+            return self._iter_chunks(self._iter_json_chunks(file_path, chunksize), "JSON")
+
+        with self._open_input(file_path) as source:
+            data = pd.read_json(source, lines=lines)
         
         self.logger.info(f"extract: Successfully extracted JSON data: {data.shape}.")
         self.logger.info(f"extract: Columns: {list(data.columns)}")
         self.logger.info("------------------------ Extraction complete -----------------------")
 
-        return data
\ No newline at end of file
+        return data
+
+
+    def _resolve_engine(self, file_path, engine: str, chunksize: int, read_opts: dict) -> str:
+        if engine not in CSV_ENGINES:
+            self.logger.error(f"extract: Unsupported CSV engine: {engine}")
+            raise ValueError(f"extract: Unsupported CSV engine: {engine}")
+
+        is_local = isinstance(file_path, (str, os.PathLike)) and os.path.isfile(file_path)
+        # Compressed files are streamed through a decompressor, there is nothing to memory-map
+        can_mmap = is_local and self._file_type(file_path)[1] is None
+
+        if engine == "auto":
+            # pyarrow only with schema hints: its own type inference differs from pandas
+            if pa_csv is not None and is_local and not chunksize and read_opts:
+                return "pyarrow"
+            return "mmap" if can_mmap else "c"
+
+        if engine == "pyarrow" and (pa_csv is None or chunksize):
+            reason = "pyarrow not installed" if pa_csv is None else "chunked reads"
+            self.logger.warning(f"extract: pyarrow engine unavailable ({reason}), falling back to pandas")
+            return "mmap" if can_mmap else "c"
+
+        if engine == "mmap" and not can_mmap:
+            self.logger.warning("extract: mmap needs an uncompressed local file, falling back to 'c'")
+            return "c"
+
+        return engine
+
+
+    def _read_csv(self, file_path, read_opts: dict, engine: str) -> pd.DataFrame:
+        if engine == "pyarrow":
+            return self._read_csv_pyarrow(file_path, read_opts)
+        with self._open_input(file_path) as source:
+            return pd.read_csv(source, memory_map=(engine == "mmap"), **read_opts)
+
+
+    @staticmethod
+    def _read_csv_pyarrow(file_path, read_opts: dict) -> pd.DataFrame:
+        # Map the pandas read options onto pyarrow's multithreaded reader
+        pa_types = {
+            "float64": pa.float64(),
+            "string": pa.string(),
+            "category": pa.dictionary(pa.int32(), pa.string()),
+        }
+        dtype = read_opts.get("dtype", {})
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=read_opts.get("usecols"),
+            column_types={c: pa_types[t] for c, t in dtype.items() if t in pa_types},
+            null_values=pa_csv.ConvertOptions().null_values + read_opts.get("na_values", []),
+            strings_can_be_null=True,
+        )
+        table = pa_csv.read_csv(
+            file_path,
+            read_options=pa_csv.ReadOptions(use_threads=True),
+            convert_options=convert_options,
+        )
+
+        # Hinted string columns come back as pandas' string dtype, same as the C parser
+        types_mapper = (lambda t: pd.StringDtype() if t == pa.string() else None) if dtype else None
+        data = table.to_pandas(types_mapper=types_mapper)
+
+        # pyarrow orders categories by appearance, pandas sorts them
+        for col, t in dtype.items():
+            if t == "category" and col in data.columns:
+                data[col] = data[col].cat.set_categories(sorted(data[col].cat.categories))
+        return data
+
+
+    def _iter_csv_chunks(self, file_path, read_opts: dict, chunksize: int, memory_map: bool = False):
+        rows_done = 0
+        while True:
+            try:
+                with self._open_input(file_path) as source, pd.read_csv(
+                    source, chunksize=chunksize, skiprows=range(1, rows_done + 1),
+                    memory_map=memory_map, **read_opts
+                ) as reader:
+                    for chunk in reader:
+                        rows_done += len(chunk)
+                        yield chunk
+                return
+            except ValueError as e:
+                relaxed = self._relax_numeric(read_opts)
+                if relaxed == read_opts:
+                    raise
+                # Restart after the last yielded row with numeric columns read as text
+                self.logger.warning(f"extract: Non-numeric values in numeric columns ({e}), re-reading them as text")
+                read_opts = relaxed
+                if hasattr(file_path, "seek"):
+                    file_path.seek(0)
+
+
+    # Parquet file or (hive-partitioned) dataset directory. Only the requested columns are read,
+    # and filters, e.g. [("transaction_date", ">=", pd.Timestamp("2023-06-01"))], skip row groups
+    # and partitions whose statistics rule them out. With chunksize, returns an iterator of frames
+    # of at most chunksize rows, read batch by batch.
+    def extract_parquet(self, file_path, columns: list = None, filters: list = None, chunksize: int = None):
+        self._require_pyarrow("extract_parquet")
+        self.logger.info(f"extract: Extracting Parquet data from {file_path} (columns={columns}, filters={filters})...")
+        if chunksize:
+            return self._iter_chunks(self._iter_dataset_batches(file_path, "parquet", columns, filters, chunksize), "Parquet")
+        data = pd.read_parquet(file_path, engine="pyarrow", columns=columns, filters=filters)
+
+        self.logger.info(f"extract: Successfully extracted Parquet data: {data.shape}.")
+        self.logger.info(f"extract: Columns: {list(data.columns)}")
+        self.logger.info("------------------------ Extraction complete -----------------------")
+        return data
+
+
+    # Arrow IPC (Feather v2) file or directory, with the same column/filter pushdown and chunking as Parquet
+    def extract_arrow(self, file_path, columns: list = None, filters: list = None, chunksize: int = None):
+        self._require_pyarrow("extract_arrow")
+        self.logger.info(f"extract: Extracting Arrow IPC data from {file_path} (columns={columns}, filters={filters})...")
+        if chunksize:
+            return self._iter_chunks(self._iter_dataset_batches(file_path, "ipc", columns, filters, chunksize), "Arrow IPC")
+        dataset = pa_ds.dataset(file_path, format="ipc", partitioning="hive")
+        expression = pq.filters_to_expression(filters) if filters else None
+        data = dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+        self.logger.info(f"extract: Successfully extracted Arrow IPC data: {data.shape}.")
+        self.logger.info(f"extract: Columns: {list(data.columns)}")
+        self.logger.info("------------------------ Extraction complete -----------------------")
+        return data
+
+
+    @staticmethod
+    def _iter_dataset_batches(file_path, file_format: str, columns: list, filters: list, chunksize: int):
+        # Record batches of at most chunksize rows (row groups can make them smaller)
+        dataset = pa_ds.dataset(file_path, format=file_format, partitioning="hive")
+        expression = pq.filters_to_expression(filters) if filters else None
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=chunksize):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+
+    def _require_pyarrow(self, caller: str):
+        if pa is None:
+            self.logger.error(f"{caller}: pyarrow is required for columnar inputs")
+            raise ImportError(f"{caller}: pyarrow is required for columnar inputs")
+
+
+    @classmethod
+    def _iter_json_chunks(cls, file_path, chunksize: int):
+        with cls._open_input(file_path) as source, pd.read_json(source, lines=True, chunksize=chunksize) as reader:
+            yield from reader
+
+
+    def _iter_chunks(self, chunks, kind: str):
+        # Yield bounded chunks so peak memory does not grow with input size
+        total_rows = 0
+        for i, chunk in enumerate(chunks):
+            total_rows += len(chunk)
+            self.logger.info(f"extract: {kind} chunk {i}: {chunk.shape}")
+            yield chunk
+
+        self.logger.info(f"extract: Successfully streamed {total_rows} {kind} rows.")
+        self.logger.info("------------------------ Extraction complete -----------------------")
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import threading
+import psycopg2
+from src.config import get_source_config
+from src.db_conn import get_conn
+from src.util import get_logger
+
+logger = get_logger(name="Keys", log_file="../logs/etl.log", level=logging.INFO)
+
+# Natural key -> surrogate key mappings per dimension, kept across runs so each upload
+# reuses the keys already loaded and only numbers new members. Configured per source:
+#
+#   normalize:
+#     key_registry:
+#       backend: db            # read existing keys from the dimension tables in load.tables
+#     # or
+#       backend: file
+#       path: data/keys/dirty_cafe_sales.json
+#
+# Natural keys are tuples of the dimension's dedupe columns (after rename), with None for NA.
+
+
+class FileKeyStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.cache_key = ("file", os.path.abspath(path))
+
+    def load(self, dims: dict) -> dict:
+        if not os.path.exists(self.path):
+            return {name: {} for name in dims}
+        with open(self.path, "r") as f:
+            data = json.load(f)
+        return {name: {tuple(k): int(v) for k, v in data.get(name, [])} for name in dims}
+
+    def save(self, mappings: dict):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({name: [[list(k), v] for k, v in keys.items()] for name, keys in mappings.items()}, f)
+        os.replace(tmp, self.path)
+
+
+class DbKeyStore:
+    # dims: {dim_name: {"target": table, "natural": [cols], "surrogate_key": col}}
+    def __init__(self, conn_params: dict, settings: dict = None):
+        self.conn_params = conn_params or {}
+        self.settings = settings
+        self.cache_key = ("db",) + tuple(self.conn_params.get(k) for k in ("host", "port", "database"))
+
+    def load(self, dims: dict) -> dict:
+        mappings = {}
+        # Same session settings as the Loader, so both share one connection pool
+        with get_conn(self.conn_params, pooled=True, settings=self.settings) as conn:
+            for name, dim in dims.items():
+                cols = ", ".join(dim["natural"] + [dim["surrogate_key"]])
+                cur = conn.cursor()
+                try:
+                    cur.execute(f"SELECT {cols} FROM {dim['target']}")
+                    rows = cur.fetchall()
+                except psycopg2.errors.UndefinedTable:
+                    # First run against this database: nothing loaded yet
+                    conn.rollback()
+                    rows = []
+                finally:
+                    cur.close()
+                mappings[name] = {tuple(row[:-1]): int(row[-1]) for row in rows}
+                logger.info(f"DbKeyStore: {len(rows)} keys from {dim['target']}")
+        return mappings
+
+    def save(self, mappings: dict):
+        # The loader writes new dimension members to the same tables keys are read from
+        pass
+
+
+# Committed mappings per store and dimension, shared by every run in the process
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+class KeyRegistry(dict):
+    # dim_name -> {natural key: surrogate key}; pass as normalize(key_state=...).
+    # normalize adds new members to these working copies; commit() once they are loaded.
+    def __init__(self, store, dims: dict):
+        self.store = store
+        self.dims = dims
+
+        with _CACHE_LOCK:
+            missing = [name for name in dims if (store.cache_key, name) not in _CACHE]
+            if missing:
+                for name, keys in store.load({name: dims[name] for name in missing}).items():
+                    _CACHE[(store.cache_key, name)] = keys
+            super().__init__({name: dict(_CACHE[(store.cache_key, name)]) for name in dims})
+
+    def commit(self):
+        with _CACHE_LOCK:
+            self.store.save(dict(self))
+            for name, keys in self.items():
+                _CACHE[(self.store.cache_key, name)] = dict(keys)
+        logger.info(f"KeyRegistry: committed {', '.join(f'{n}={len(k)}' for n, k in self.items())}")
+
+
+def clear_cache():
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+def open_key_registry(yaml_path: str, source_name: str, conn_params: dict = None):
+    # KeyRegistry for the source's configured backend, or None if it has no key_registry
+    src_cfg = get_source_config(yaml_path, source_name)
+    reg_cfg = src_cfg.normalize.get("key_registry") if src_cfg else None
+    if not reg_cfg:
+        return None
+
+    targets = {t["df_key"]: t["target"] for t in src_cfg.load.get("tables", [])}
+    dims = {}
+    for dim_cfg in src_cfg.normalize.get("dimensions", []):
+        rename_map = dim_cfg.get("rename", {})
+        natural = [rename_map.get(c, c) for c in dim_cfg.get("dedupe_on", dim_cfg["source_columns"])]
+        dims[dim_cfg["name"]] = {
+            "target": targets.get(f"stg_{dim_cfg['name']}"),
+            # Loader.load lowercases and underscores column names
+            "natural": [c.lower().replace(" ", "_") for c in natural],
+            "surrogate_key": dim_cfg["surrogate_key"],
+        }
+
+    backend = reg_cfg.get("backend", "db")
+    if backend == "db":
+        unmapped = [name for name, dim in dims.items() if not dim["target"]]
+        if unmapped:
+            raise ValueError(f"key_registry: no load target for dimensions {unmapped} of source '{source_name}'")
+        store = DbKeyStore(conn_params, src_cfg.load.get("session"))
+    elif backend == "file":
+        store = FileKeyStore(reg_cfg["path"])
+    else:
+        raise ValueError(f"Unknown key_registry backend '{backend}' for source '{source_name}'")
+
+    return KeyRegistry(store, dims)
@@ -1,14 +1,80 @@
 import pandas as pd
+import psycopg2
 from io import StringIO
 import logging
 from src.util import get_logger, _log_preview
-from src.db_conn import get_conn
+from src.db_conn import get_conn, POOL_MAX_SIZE
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from src.config import get_source_config
+from src.catalog import get_catalog, data_type
+from src.pgcopy import BinaryCopyStream, UnsupportedType
 import numpy as np
-import yaml
+import os
+import re
+import shutil
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_ds
+except ImportError:  # pyarrow is optional, only needed for Parquet output
+    pa = None
+    pa_ds = None
+
+# Partition value formats for date-partitioned Parquet output
+PARTITION_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+
+# Optional per-row content hash column (load.tables[].row_hash) and keys per hash lookup query
+ROW_HASH_COLUMN = "row_hash"
+HASH_LOOKUP_BATCH = 100_000
+
+# Type hints from sources.yml (dimension/final dtypes, schema types) -> compact PostgreSQL types
+PG_TYPE_HINTS = {
+    "int16": "SMALLINT",
+    "int32": "INTEGER",
+    "int64": "BIGINT",
+    "float": "DOUBLE PRECISION",
+    "float64": "DOUBLE PRECISION",
+    "money": "NUMERIC(10,2)",
+    "date": "DATE",
+    "datetime64[ns]": "TIMESTAMP",
+    "bool": "BOOLEAN",
+    "string": "TEXT",
+}
+
+# Text values treated as missing (compared after strip/lower)
+NULL_TOKENS = ["none", "nat", "nan", "unknown", ""]
+
+# Bytes handed to the server per read of a COPY stream
+COPY_READ_SIZE = 1 << 20
+
+# Smallest share of rows worth a separate COPY/merge stream
+MIN_STREAM_ROWS = 50_000
+
+# Tables with defer_indexes: true drop their declared secondary indexes (load.tables[].indexes)
+# for loads of at least this many rows and rebuild them afterwards
+DEFER_INDEX_MIN_ROWS = 100_000
+
+# Indexes of a partitioned parent, rebuilt on each partition swapped in by partition_replace
+PARENT_INDEXES_SQL = """
+    SELECT i.indisprimary, pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    WHERE i.indrelid = to_regclass(%s)
+    ORDER BY i.indexrelid;
+"""
+
+# Per-table load strategies (load.tables[].strategy in sources.yml)
+LOAD_STRATEGIES = ("upsert", "merge", "partition_replace")
 
 class Loader:
-    def __init__(self, logger=None, conn_params=None):
+    # Connections come from the process-wide pool in src.db_conn (pooled=False opens one per load).
+    # session_settings are applied to every connection, e.g. {"synchronous_commit": "off"}.
+    def __init__(self, logger=None, conn_params=None, pooled=True, session_settings=None):
         self.conn_params = conn_params or {}
+        self.pooled = pooled
+        self.session_settings = session_settings
+        # Dimension keys already written to appended Parquet output in this run, per table
+        self._output_keys = {}
 
         if logger:
             self.logger = logging.getLogger("Loader")
@@ -36,7 +102,11 @@ class Loader:
         self.logger.info("--------------- Loader initialized ---------------")
 
 
-    def _infer_pg_type(self, dtype):
+    def _infer_pg_type(self, dtype, hint: str = None):
+        # hint: logical type from sources.yml (see PG_TYPE_HINTS) or a literal SQL type
+        if hint:
+            return PG_TYPE_HINTS.get(str(hint).lower(), hint)
+
         if not hasattr(dtype, "kind"):
             return "TEXT"
 
@@ -52,15 +122,21 @@ class Loader:
         return "TEXT"
 
      
-    def _create_table_if_not_exists(self, conn, df: pd.DataFrame, table_name: str, primary_key: str = None):
-        cols = [f'"{col}" {self._infer_pg_type(dtype)}' for col, dtype in df.dtypes.items()]
+    def _create_table_if_not_exists(self, conn, df: pd.DataFrame, table_name: str, primary_key: str = None,
+                                    column_types: dict = None, partition_by: str = None):
+        column_types = column_types or {}
+        cols = [f'"{col}" {self._infer_pg_type(dtype, column_types.get(col))}' for col, dtype in df.dtypes.items()]
+        if primary_key and partition_by and partition_by != primary_key:
+            # A partitioned table's unique constraints must include the partition column
+            primary_key = f"{primary_key}, {partition_by}"
         pk_sql = f", PRIMARY KEY ({primary_key})" if primary_key else ""
+        partition_sql = f"PARTITION BY RANGE ({partition_by})" if partition_by else ""
 
         create_sql = f"""
             CREATE TABLE IF NOT EXISTS {table_name} (
                 {', '.join(cols)}
                 {pk_sql}
-            );
+            ) {partition_sql};
         """
 
         cur = conn.cursor()
@@ -71,46 +147,200 @@ class Loader:
         self.logger.info(f"Created table if missing: {table_name} (PK={primary_key})")
 
     
+    def _ensure_table(self, conn, df: pd.DataFrame, table_name: str, primary_key: str, column_types: dict = None,
+                      partition_by: str = None):
+        # DDL only for tables the catalog doesn't know; known tables are checked for drift instead
+        catalog = get_catalog(self.conn_params)
+        existing = catalog.columns(conn, table_name)
+        column_types = column_types or {}
+
+        if existing is None:
+            self._create_table_if_not_exists(conn, df, table_name, primary_key=primary_key, column_types=column_types,
+                                             partition_by=partition_by)
+            catalog.add(table_name, {
+                col: data_type(self._infer_pg_type(dtype, column_types.get(col))) for col, dtype in df.dtypes.items()
+            }, partitioned=bool(partition_by))
+            return True
+
+        if ROW_HASH_COLUMN in df.columns and ROW_HASH_COLUMN not in existing:
+            # Turning row_hash on for an existing table: add the column, rows without a hash count as changed
+            cur = conn.cursor()
+            cur.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {ROW_HASH_COLUMN} BIGINT;")
+            conn.commit()
+            cur.close()
+            existing = {**existing, ROW_HASH_COLUMN: "bigint"}
+            catalog.add(table_name, existing)
+            self.logger.info(f"load: added {ROW_HASH_COLUMN} to {table_name}")
+
+        missing = [c for c in df.columns if c not in existing]
+        if missing:
+            self.logger.error(f"load: {table_name} has no columns {missing}")
+            raise ValueError(f"load: {table_name} has no columns {missing}; alter the table or drop the columns")
+
+        unloaded = [c for c in existing if c not in df.columns]
+        if unloaded:
+            self.logger.info(f"load: {table_name}: columns {unloaded} are not in the frame and stay NULL/default")
+        for col, dtype in df.dtypes.items():
+            expected = data_type(self._infer_pg_type(dtype, column_types.get(col)))
+            if existing[col] != expected:
+                self.logger.warning(f"load: {table_name}.{col} is {existing[col]}, the frame maps to {expected}")
+        return False
+
+
+    @staticmethod
+    def _row_hashes(df: pd.DataFrame) -> np.ndarray:
+        # Content hash per row over every column, stored as BIGINT
+        return pd.util.hash_pandas_object(df, index=False).to_numpy().view(np.int64)
+
+
+    def _changed_rows(self, conn, df: pd.DataFrame, table_name: str, key: str) -> pd.DataFrame:
+        # Rows whose key is new or whose stored hash differs, looked up in batches of keys
+        stored = []
+        cur = conn.cursor()
+        keys = df[key].dropna().unique()
+        for start in range(0, len(keys), HASH_LOOKUP_BATCH):
+            batch = pd.Series(keys[start:start + HASH_LOOKUP_BATCH]).to_numpy(dtype=object).tolist()
+            cur.execute(f"SELECT {key}, {ROW_HASH_COLUMN} FROM {table_name} WHERE {key} = ANY(%s);", (batch,))
+            stored.extend(cur.fetchall())
+        cur.close()
+
+        if not stored:
+            return df
+        stored_hashes = pd.Series([h for _, h in stored], index=[k for k, _ in stored], dtype="Int64")
+        # Rows stored before row_hash was enabled have a NULL hash and count as changed
+        matched = stored_hashes.reindex(df[key].to_numpy())
+        unchanged = matched.eq(df[ROW_HASH_COLUMN].to_numpy()).fillna(False).to_numpy(dtype=bool)
+        return df[~unchanged]
+
+
     def _sanitize(self, df: pd.DataFrame) -> pd.DataFrame:
-        df_safe = df.copy()
-
-        def normalize(x):
-            if pd.isna(x) or x is pd.NA or x is pd.NaT:
-                return None
-            if isinstance(x, pd.Timestamp):
-                return x.to_pydatetime()
-            if isinstance(x, str) and x.strip().lower() in ("none", "nat", "nan", "unknown", ""):
-                return None
-            if isinstance(x, (np.integer, np.int64)):
-                return int(x)
-            if isinstance(x, (np.floating, np.float64)):
-                return float(x)
-            if isinstance(x, np.bool_):
-                return bool(x)
-
-            return x
-
-        for col in df_safe.columns:
-            df_safe[col] = df_safe[col].map(normalize).astype(object)
+        # Column-wise: text columns get placeholder tokens masked to NA, numeric and datetime
+        # columns keep their dtypes. Python values are only produced when rows are serialized.
+        columns = {}
+        for col in df.columns:
+            s = df[col]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                s = s.astype(s.cat.categories.dtype)
+            if s.dtype == object:
+                s = s.infer_objects()
+
+            if s.dtype == object or pd.api.types.is_string_dtype(s.dtype):
+                # Check tokens once per distinct value, then map back through the codes
+                codes, uniques = pd.factorize(s)
+                is_token = np.array([isinstance(v, str) and v.strip().lower() in NULL_TOKENS for v in uniques] + [False])
+                tokens = is_token[codes]
+                if tokens.any():
+                    s = s.mask(tokens)
+            columns[col] = s
 
+        df_safe = pd.DataFrame(columns, index=df.index)
         self.logger.info(f"sanitize: cleaned {list(df_safe.columns)}")
         return df_safe
 
-        
-    def load(self, df: pd.DataFrame, table_name: str, conflict_cols: list[str] = None, create_if_missing=True):
+
+    @staticmethod
+    def _rows(df: pd.DataFrame):
+        # Row tuples of plain Python values (int/float/bool/str/datetime, None for NA) for executemany
+        columns = []
+        for col in df.columns:
+            s = df[col]
+            if pd.api.types.is_datetime64_any_dtype(s.dtype):
+                values = np.asarray(s.array.to_pydatetime(), dtype=object)
+            else:
+                values = s.to_numpy(dtype=object)
+            missing = s.isna().to_numpy()
+            if missing.any():
+                values[missing] = None
+            columns.append(values.tolist())
+        return zip(*columns)
+
+
+    # strategy="upsert" sends rows through executemany; strategy="merge" COPYs them into a temporary
+    # staging table and applies one set-based INSERT ... ON CONFLICT per batch, updating only rows
+    # whose values changed. batch_size splits large frames into several COPY/merge rounds.
+    # COPY uses the binary format (copy_format="binary") and falls back to CSV for column types
+    # the encoder doesn't handle; copy_format="csv" always sends CSV text.
+    # partition_by names a date column: the table is created range-partitioned by month and
+    # missing monthly partitions are created before rows are written. strategy="partition_replace"
+    # replaces every month the frame covers (see _replace_partitions).
+    # rollup keeps a daily summary table in step with the load, in the same transaction:
+    #   {"target": "public.agg_daily_sales", "group_by": [...], "date": "transaction_date",
+    #    "sums": {rollup column: fact column}, "count": "num_transactions"}
+    def load(self, df: pd.DataFrame, table_name: str, conflict_cols: list[str] = None, create_if_missing=True,
+             strategy: str = "upsert", batch_size: int = None, copy_format: str = "binary", settings: dict = None,
+             streams: int = 1, column_types: dict = None, row_hash: bool = False, partition_by: str = None,
+             rollup: dict = None):
         if df.empty:
             self.logger.warning(f"load: {table_name}: DataFrame empty — skipping.")
             return
 
+        # partition_replace runs one stream per month itself
+        if streams > 1 and len(df) >= streams * MIN_STREAM_ROWS and strategy != "partition_replace":
+            self._load_streams(df, table_name, conflict_cols, create_if_missing, streams,
+                               strategy=strategy, batch_size=batch_size, copy_format=copy_format, settings=settings,
+                               column_types=column_types, row_hash=row_hash, partition_by=partition_by, rollup=rollup)
+            return
+
+        if strategy not in LOAD_STRATEGIES:
+            raise ValueError(f"load: unknown strategy '{strategy}' for {table_name}")
+        if rollup and not conflict_cols:
+            raise ValueError(f"load: {table_name}: a rollup needs a primary key to track updated rows")
+        if rollup and strategy == "upsert":
+            # Row-by-row upserts can't report old values; the merge computes the rollup delta
+            strategy = "merge"
+
         # Safe column formatting
         df = df.copy()
         df.columns = [c.lower().replace(" ", "_") for c in df.columns]
 
         df = self._sanitize(df)
 
-        with get_conn(self.conn_params) as conn:
+        hashed = row_hash and conflict_cols
+        if hashed:
+            df[ROW_HASH_COLUMN] = self._row_hashes(df)
+
+        if partition_by and (partition_by not in df.columns or df[partition_by].isna().any()):
+            raise ValueError(f"load: {table_name}: rows without {partition_by} have no partition to go to")
+
+        if strategy == "partition_replace":
+            self._replace_partitions(df, table_name, conflict_cols, partition_by, create_if_missing,
+                                     column_types=column_types, copy_format=copy_format, settings=settings,
+                                     streams=streams, rollup=rollup)
+            return
+
+        with get_conn(self.conn_params, pooled=self.pooled, settings=settings or self.session_settings) as conn:
+            created = False
             if create_if_missing and conflict_cols:
-                self._create_table_if_not_exists(conn, df, table_name, primary_key=conflict_cols[0])
+                created = self._ensure_table(conn, df, table_name, conflict_cols[0], column_types, partition_by)
+                if rollup:
+                    self._ensure_rollup(conn, df, table_name, rollup, column_types)
+
+            moved_from = None
+            if partition_by:
+                if get_catalog(self.conn_params).partitioned(conn, table_name):
+                    self._ensure_partitions(conn, df, table_name, partition_by)
+                    if conflict_cols and partition_by not in conflict_cols:
+                        # A key whose partition column changed is deleted from its old partition by the merge
+                        moved_from = partition_by
+                        conflict_cols = [*conflict_cols, partition_by]
+                        if strategy == "upsert":
+                            strategy = "merge"
+                else:
+                    self.logger.warning(f"load: {table_name} is not partitioned, partition_by {partition_by} ignored")
+
+            # Send only new or changed rows; a table created just now has nothing to compare against
+            if hashed and not created:
+                total = len(df)
+                df = self._changed_rows(conn, df, table_name, conflict_cols[0])
+                self.logger.info(f"load: {table_name}: {len(df)} of {total} rows new or changed")
+                if df.empty:
+                    conn.commit()
+                    return
+
+            # Set-based merge path
+            if conflict_cols and strategy == "merge":
+                self._merge(conn, df, table_name, conflict_cols, batch_size, copy_format, rollup, moved_from)
+                return
 
             # UPSERT path
             if conflict_cols:
@@ -127,7 +357,8 @@ class Loader:
                 """
 
                 cur = conn.cursor()
-                cur.executemany(upsert_sql, df.itertuples(index=False, name=None))
+                for batch in self._batches(df, batch_size):
+                    cur.executemany(upsert_sql, self._rows(batch))
                 conn.commit()
                 cur.close()
 
@@ -135,43 +366,706 @@ class Loader:
                 return
 
             # COPY path (no PK)
-            buf = StringIO()
-            df.to_csv(buf, index=False, header=False)
-            buf.seek(0)
+            cur = conn.cursor()
+            type_oids = self._copy_types(cur, table_name) if copy_format == "binary" else None
+            fmt = self._copy(cur, df, table_name, type_oids=type_oids)
+            conn.commit()
+            cur.close()
+
+            self.logger.info(f"COPY ({fmt}): {len(df)} rows → {table_name}")
+
+
+    def _load_streams(self, df: pd.DataFrame, table_name: str, conflict_cols: list[str], create_if_missing: bool,
+                      streams: int, **kwargs):
+        # Splits one large load into parallel streams on separate connections. Rows are split by
+        # key hash so every copy of a key lands in the same stream; each stream commits on its own.
+        partition_by = kwargs.get("partition_by")
+        if conflict_cols:
+            if create_if_missing or partition_by:
+                sample = self._sanitize(df.head(1).rename(columns=lambda c: c.lower().replace(" ", "_")))
+                with get_conn(self.conn_params, pooled=self.pooled, settings=kwargs.get("settings") or self.session_settings) as conn:
+                    if create_if_missing:
+                        self._ensure_table(conn, sample, table_name, conflict_cols[0], kwargs.get("column_types"),
+                                           partition_by)
+                        if kwargs.get("rollup"):
+                            self._ensure_rollup(conn, sample, table_name, kwargs["rollup"], kwargs.get("column_types"))
+                    # Every stream usually has rows for the same new months; concurrent CREATE ... PARTITION OF
+                    # can fail, so the partitions are created here, once, and the streams find them in the catalog
+                    column = next((c for c in df.columns if c.lower().replace(" ", "_") == partition_by), None)
+                    if column is not None and get_catalog(self.conn_params).partitioned(conn, table_name):
+                        self._ensure_partitions(conn, df[column].to_frame(partition_by), table_name, partition_by)
+            keys = df[[c for c in df.columns if c.lower().replace(" ", "_") in conflict_cols]]
+            part = (pd.util.hash_pandas_object(keys, index=False).to_numpy() % streams)
+            parts = [df[part == i] for i in range(streams)]
+        else:
+            size = -(-len(df) // streams)
+            parts = [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+        with ThreadPoolExecutor(max_workers=streams) as pool:
+            futures = [
+                pool.submit(self.load, p, table_name, conflict_cols, False, **kwargs)
+                for p in parts if not p.empty
+            ]
+            for f in futures:
+                f.result()
 
+        self.logger.info(f"load: {len(df)} rows → {table_name} in {len(futures)} parallel streams")
+
+
+    @staticmethod
+    def _month_ranges(dates: pd.Series) -> list:
+        # (partition suffix, first day, first day of the next month) for each month in dates
+        months = pd.to_datetime(dates.dropna()).dt.to_period("M").unique()
+        return [(f"p{m.year}_{m.month:02d}", m.start_time.date(), (m + 1).start_time.date()) for m in sorted(months)]
+
+
+    def _ensure_partitions(self, conn, df: pd.DataFrame, table_name: str, column: str):
+        # Monthly partitions <table>_pYYYY_MM for the rows about to be written, created once per process
+        catalog = get_catalog(self.conn_params)
+        parent = catalog.columns(conn, table_name) or {}
+        cur = conn.cursor()
+        created = []
+        for suffix, start, end in self._month_ranges(df[column]):
+            part = f"{table_name}_{suffix}"
+            if catalog.columns(conn, part) is None:
+                cur.execute(f"CREATE TABLE IF NOT EXISTS {part} PARTITION OF {table_name} FOR VALUES FROM (%s) TO (%s);",
+                            (start, end))
+                catalog.add(part, parent, partitioned=False)
+                created.append(part)
+        conn.commit()
+        cur.close()
+        if created:
+            self.logger.info(f"load: created partitions {created}")
+
+
+    def _replace_partitions(self, df: pd.DataFrame, table_name: str, conflict_cols: list[str], partition_by: str,
+                            create_if_missing: bool = True, column_types: dict = None, copy_format: str = "binary",
+                            settings: dict = None, streams: int = 1, rollup: dict = None):
+        # Backfill: every month the frame covers is replaced by the frame's rows for that month.
+        # Each month is COPYed into a fresh table and indexed in parallel, then all of them are swapped
+        # in for the old partitions in one transaction, so nothing is deleted row by row and no dead
+        # tuples are left behind. Months not in the frame are kept.
+        if not partition_by:
+            raise ValueError(f"load: {table_name}: strategy 'partition_replace' needs partition_by")
+
+        with get_conn(self.conn_params, pooled=self.pooled, settings=settings or self.session_settings) as conn:
+            if create_if_missing and conflict_cols:
+                self._ensure_table(conn, df, table_name, conflict_cols[0], column_types, partition_by)
+                if rollup:
+                    self._ensure_rollup(conn, df, table_name, rollup, column_types)
+            if not get_catalog(self.conn_params).partitioned(conn, table_name):
+                raise ValueError(f"load: {table_name} is not partitioned; recreate it with partition_by {partition_by}")
             cur = conn.cursor()
-            cur.copy_expert(f"COPY {table_name} FROM STDIN WITH CSV NULL ''", buf)
+            cur.execute(PARENT_INDEXES_SQL, (table_name,))
+            indexes = cur.fetchall()
+            cur.close()
+            conn.commit()
+
+        row_key = [c for c in conflict_cols or [] if c != partition_by]
+        if row_key:
+            # Last row per key wins, as with merge
+            df = df.drop_duplicates(subset=row_key, keep="last")
+
+        months = pd.to_datetime(df[partition_by]).dt.to_period("M")
+        ranges = self._month_ranges(df[partition_by])
+        with ThreadPoolExecutor(max_workers=max(1, min(streams, len(ranges)))) as pool:
+            futures = [
+                pool.submit(self._prepare_partition, df[(months == pd.Period(start, "M")).to_numpy()], table_name,
+                            partition_by, suffix, start, end, indexes, copy_format, settings)
+                for suffix, start, end in ranges
+            ]
+            for f in futures:
+                f.result()
+
+        self._swap_partitions(table_name, row_key, partition_by, ranges, len(indexes), settings, rollup)
+        self.logger.info(f"REPLACE: {len(df)} rows → {table_name}, {len(ranges)} partitions swapped")
+
+
+    def _prepare_partition(self, df: pd.DataFrame, table_name: str, column: str, suffix: str, start, end,
+                           indexes: list, copy_format: str = "binary", settings: dict = None):
+        # <partition>_new with the month's rows, a CHECK matching the partition bounds (so ATTACH skips its
+        # validation scan) and the parent's indexes (so ATTACH adopts them instead of building them)
+        part = f"{table_name}_{suffix}"
+        part_name = part.split(".")[-1]
+        fresh = f"{part}_new"
+        cols = list(df.columns)
+
+        with get_conn(self.conn_params, pooled=self.pooled, settings=settings or self.session_settings) as conn:
+            cur = conn.cursor()
+            # Leftover of an interrupted run
+            cur.execute(f"DROP TABLE IF EXISTS {fresh};")
+            cur.execute(f"CREATE TABLE {fresh} (LIKE {table_name} INCLUDING DEFAULTS);")
+            type_oids = self._copy_types(cur, fresh, cols) if copy_format == "binary" else None
+            fmt = self._copy(cur, df, fresh, columns=cols, type_oids=type_oids)
+
+            cur.execute(f"ALTER TABLE {fresh} ADD CONSTRAINT {part_name}_bounds "
+                        f"CHECK ({column} IS NOT NULL AND {column} >= %s AND {column} < %s);", (start, end))
+            for i, (primary, definition) in enumerate(indexes):
+                name = f"{part_name}_new_{i}"
+                cur.execute(self._partition_index_sql(definition, name, fresh))
+                if primary:
+                    cur.execute(f"ALTER TABLE {fresh} ADD CONSTRAINT {name} PRIMARY KEY USING INDEX {name};")
             conn.commit()
             cur.close()
 
-            self.logger.info(f"COPY: {len(df)} rows → {table_name}")
+        self.logger.info(f"REPLACE ({fmt}): {len(df)} rows → {fresh}")
+
+
+    @staticmethod
+    def _partition_index_sql(definition: str, name: str, table: str) -> str:
+        # pg_get_indexdef of a partitioned parent's index ("CREATE [UNIQUE] INDEX x ON ONLY parent USING ...")
+        # rewritten for one partition-to-be
+        match = re.match(r"CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ (USING .+)$", definition)
+        if not match:
+            raise ValueError(f"load: can't rebuild index '{definition}' for {table}")
+        return f"CREATE {match.group(1) or ''}INDEX {name} ON {table} {match.group(2)};"
+
+
+    def _swap_partitions(self, table_name: str, row_key: list, column: str, ranges: list, n_indexes: int,
+                         settings: dict = None, rollup: dict = None):
+        # One transaction for every month. Keys that moved here from months not being replaced are
+        # deleted first and the rollup is brought up to date; only the catalog changes at the end
+        # run under the ACCESS EXCLUSIVE lock DETACH takes on the parent, until the commit.
+        schema = f"{table_name.split('.')[0]}." if "." in table_name else ""
+        replaced = " OR ".join([f"(t.{column} >= %s AND t.{column} < %s)"] * len(ranges))
+        bounds = [b for _, start, end in ranges for b in (start, end)]
+
+        with get_conn(self.conn_params, pooled=self.pooled, settings=settings or self.session_settings) as conn:
+            cur = conn.cursor()
+            for suffix, start, end in ranges:
+                fresh = f"{table_name}_{suffix}_new"
+                if row_key:
+                    moved = (f"DELETE FROM {table_name} t USING {fresh} p "
+                             f"WHERE {' AND '.join(f't.{c} = p.{c}' for c in row_key)} AND NOT ({replaced})")
+                    if rollup:
+                        # Their old months lose them from the rollup
+                        measured = self._rollup_measures(rollup)
+                        negated = ", ".join(f"-o.{c} AS {c}" if c in rollup["sums"].values() else f"o.{c}"
+                                            for c in measured)
+                        moved = (f"WITH moved AS ({moved} RETURNING {', '.join(f't.{c}' for c in measured)})"
+                                 + self._rollup_insert(rollup, f"(SELECT {negated}, -1 AS _n FROM moved o) AS m"))
+                    cur.execute(moved + ";", bounds)
+                if rollup:
+                    # The month's daily totals are recomputed from its new rows
+                    cur.execute(f"DELETE FROM {rollup['target']} WHERE {rollup['date']} >= %s AND {rollup['date']} < %s;",
+                                (start, end))
+                    cur.execute(self._rollup_insert(rollup, f"(SELECT *, 1 AS _n FROM {fresh}) AS p") + ";")
+
+            for suffix, start, end in ranges:
+                part = f"{table_name}_{suffix}"
+                part_name = part.split(".")[-1]
+                cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (part,))
+                if cur.fetchone()[0]:
+                    cur.execute(f"ALTER TABLE {table_name} DETACH PARTITION {part};")
+                    cur.execute(f"DROP TABLE {part};")
+                cur.execute(f"ALTER TABLE {part}_new RENAME TO {part_name};")
+                for i in range(n_indexes):
+                    cur.execute(f"ALTER INDEX {schema}{part_name}_new_{i} RENAME TO {part_name}_{i};")
+                cur.execute(f"ALTER TABLE {table_name} ATTACH PARTITION {part} FOR VALUES FROM (%s) TO (%s);",
+                            (start, end))
+            conn.commit()
+            cur.close()
+
+            catalog = get_catalog(self.conn_params)
+            for suffix, _, _ in ranges:
+                catalog.add(f"{table_name}_{suffix}", catalog.columns(conn, table_name) or {}, partitioned=False)
+
+
+    def _copy_types(self, cur, table_name: str, columns: list = None):
+        # Target column type OIDs for binary COPY
+        cur.execute(f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name} LIMIT 0;")
+        return [d[1] for d in cur.description]
+
+
+    def _copy(self, cur, df: pd.DataFrame, table_name: str, columns: list = None, type_oids: list = None) -> str:
+        # Binary COPY streamed chunk by chunk when the target types are known and supported, CSV otherwise
+        target = f"{table_name} ({', '.join(columns)})" if columns else table_name
+        if type_oids:
+            try:
+                stream = BinaryCopyStream(df, type_oids)
+            except UnsupportedType as e:
+                self.logger.info(f"COPY: {table_name}: falling back to CSV ({e})")
+            else:
+                cur.copy_expert(f"COPY {target} FROM STDIN WITH (FORMAT binary)", stream, size=COPY_READ_SIZE)
+                return "binary"
+
+        buf = StringIO()
+        df.to_csv(buf, index=False, header=False)
+        buf.seek(0)
+        cur.copy_expert(f"COPY {target} FROM STDIN WITH CSV NULL ''", buf)
+        return "csv"
 
-    
-    def load_from_yaml(self, normalized_dict: dict, rejects_df: pd.DataFrame, source_name: str, yaml_path: str):
-        with open(yaml_path, "r") as f:
-            config = yaml.safe_load(f)
 
-        src_cfg = next((s for s in config["sources"] if s["name"] == source_name), None)
-        if not src_cfg or "load" not in src_cfg:
+    @staticmethod
+    def _batches(df: pd.DataFrame, batch_size: int = None):
+        if not batch_size or len(df) <= batch_size:
+            yield df
+            return
+        for start in range(0, len(df), batch_size):
+            yield df.iloc[start:start + batch_size]
+
+
+    # moved_from: the partition column of a partitioned table, part of conflict_cols. Rows are then
+    # unique by the other key columns, and a key whose partition column changed moves partitions.
+    def _merge(self, conn, df: pd.DataFrame, table_name: str, conflict_cols: list[str], batch_size: int = None,
+               copy_format: str = "binary", rollup: dict = None, moved_from: str = None):
+        cols = list(df.columns)
+        insert_cols = ", ".join(cols)
+        key_cols = ", ".join(conflict_cols)
+        row_key = ", ".join(c for c in conflict_cols if c != moved_from)
+        update = [c for c in cols if c not in conflict_cols]
+        stage = f"_stage_{table_name.split('.')[-1]}"
+
+        # Last row per key wins, as with executemany; only changed rows are rewritten
+        if update:
+            on_conflict = f"""DO UPDATE SET {', '.join(f'{c}=EXCLUDED.{c}' for c in update)}
+                    WHERE ({', '.join(f't.{c}' for c in update)}) IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in update)})"""
+        else:
+            on_conflict = "DO NOTHING"
+        merge_sql = f"""
+            INSERT INTO {table_name} AS t ({insert_cols})
+            SELECT DISTINCT ON ({row_key}) {insert_cols} FROM {stage}
+            ORDER BY {row_key}, _seq DESC
+            ON CONFLICT ({key_cols}) {on_conflict};
+        """
+        if moved_from:
+            merge_sql = f"""
+                DELETE FROM {table_name} t USING (
+                    SELECT DISTINCT ON ({row_key}) {row_key}, {moved_from} FROM {stage}
+                    ORDER BY {row_key}, _seq DESC
+                ) s
+                WHERE {self._moved_where(conflict_cols, moved_from)};
+            """ + merge_sql
+        cur = conn.cursor()
+        cur.execute(f"CREATE TEMP TABLE {stage} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP;")
+        cur.execute(f"ALTER TABLE {stage} ADD COLUMN _seq BIGSERIAL;")
+
+        if rollup:
+            # Batches collect their rollup deltas; the rollup is updated once, before the commit
+            delta = f"_delta_{table_name.split('.')[-1]}"
+            merge_sql = self._merge_rollup_sql(table_name, stage, delta, cols, conflict_cols, on_conflict, rollup,
+                                               moved_from)
+            cur.execute(f"CREATE TEMP TABLE {delta} ON COMMIT DROP AS "
+                        f"SELECT {', '.join(self._rollup_measures(rollup))}, 0 AS _n FROM {table_name} WITH NO DATA;")
+
+        type_oids = self._copy_types(cur, stage, cols) if copy_format == "binary" else None
+
+        written = 0
+        for batch in self._batches(df, batch_size):
+            self._copy(cur, batch, stage, columns=cols, type_oids=type_oids)
+            cur.execute(merge_sql)
+            written += cur.fetchone()[0] if rollup else max(cur.rowcount, 0)
+            cur.execute(f"TRUNCATE {stage};")
+
+        if rollup:
+            # One statement per transaction, rows in key order: concurrent streams lock rollup rows in
+            # the same order and never hold some while waiting for others
+            cur.execute(self._rollup_insert(rollup, delta) + ";")
+
+        conn.commit()
+        cur.close()
+
+        self.logger.info(f"MERGE: {len(df)} rows staged, {written} inserted/updated → {table_name}")
+
+
+    @staticmethod
+    def _rollup_measures(rollup: dict) -> list:
+        # Fact columns a rollup reads: its keys, then the summed columns
+        return list(dict.fromkeys([*rollup["group_by"], rollup["date"], *rollup["sums"].values()]))
+
+
+    @staticmethod
+    def _rollup_insert(rollup: dict, source: str) -> str:
+        # Adds the rows of source (fact columns plus _n = +1/-1 per row) to the rollup's daily totals.
+        # Rows go in key order so concurrent loads lock rollup rows in the same order.
+        keys = [*rollup["group_by"], rollup["date"]]
+        totals = [*rollup["sums"], rollup["count"]]
+        select = [f"COALESCE({c}, 0)" for c in rollup["group_by"]] + [f"{rollup['date']}::date"]
+        select += [f"COALESCE(SUM({c}), 0)" for c in rollup["sums"].values()] + ["SUM(_n)"]
+        positions = ", ".join(str(i + 1) for i in range(len(keys)))
+        return f"""
+            INSERT INTO {rollup['target']} AS r ({', '.join([*keys, *totals])})
+            SELECT {', '.join(select)} FROM {source}
+            WHERE {rollup['date']} IS NOT NULL
+            GROUP BY {positions} ORDER BY {positions}
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {', '.join(f'{c} = r.{c} + EXCLUDED.{c}' for c in totals)}"""
+
+
+    @staticmethod
+    def _moved_where(conflict_cols: list[str], moved_from: str) -> str:
+        # Stored rows t with a key of s under another partition column value
+        same_key = [f"t.{c} = s.{c}" for c in conflict_cols if c != moved_from]
+        return " AND ".join([*same_key, f"t.{moved_from} <> s.{moved_from}"])
+
+
+    def _merge_rollup_sql(self, table_name: str, stage: str, delta: str, cols: list, conflict_cols: list[str],
+                          on_conflict: str, rollup: dict, moved_from: str = None) -> str:
+        # The merge as one statement: the old versions of the rows it changes (or moves to another
+        # partition) are read from the same snapshot, so delta gets exactly new minus old
+        insert_cols = ", ".join(cols)
+        key_cols = ", ".join(conflict_cols)
+        row_key = ", ".join(c for c in conflict_cols if c != moved_from)
+        measured = self._rollup_measures(rollup)
+        returned = ", ".join(dict.fromkeys([*conflict_cols, *measured]))
+        negated = ", ".join(f"-o.{c}" if c in rollup["sums"].values() else f"o.{c}" for c in measured)
+        moved, moved_delta = "", ""
+        if moved_from:
+            moved = f"""
+            ), moved AS (
+                DELETE FROM {table_name} t USING src s
+                WHERE {self._moved_where(conflict_cols, moved_from)}
+                RETURNING {', '.join(f't.{c}' for c in measured)}"""
+            moved_delta = f"""
+                UNION ALL
+                SELECT {negated}, -1 FROM moved o"""
+        return f"""
+            WITH src AS (
+                SELECT DISTINCT ON ({row_key}) {insert_cols} FROM {stage}
+                ORDER BY {row_key}, _seq DESC{moved}
+            ), old AS (
+                SELECT {', '.join(f't.{c}' for c in dict.fromkeys([*conflict_cols, *measured]))}
+                FROM {table_name} t JOIN src USING ({key_cols})
+            ), upserted AS (
+                INSERT INTO {table_name} AS t ({insert_cols})
+                SELECT {insert_cols} FROM src
+                ON CONFLICT ({key_cols}) {on_conflict}
+                RETURNING {returned}
+            ), changed AS (
+                INSERT INTO {delta} ({', '.join(measured)}, _n)
+                SELECT {', '.join(measured)}, 1 FROM upserted
+                UNION ALL
+                SELECT {negated}, -1 FROM old o JOIN upserted u USING ({key_cols}){moved_delta}
+            )
+            SELECT count(*) FROM upserted;
+        """
+
+
+    def _ensure_rollup(self, conn, df: pd.DataFrame, table_name: str, rollup: dict, column_types: dict = None):
+        # Creates the rollup table on first use, filled from the rows table_name already holds
+        catalog = get_catalog(self.conn_params)
+        if catalog.columns(conn, rollup["target"]) is not None:
+            return
+        column_types = column_types or {}
+        keys = [*rollup["group_by"], rollup["date"]]
+        columns = {c: self._infer_pg_type(df[c].dtype, column_types.get(c)) for c in rollup["group_by"]}
+        columns[rollup["date"]] = "DATE"
+        for name, src in rollup["sums"].items():
+            # Exact types, so adding and subtracting deltas never drifts
+            columns[name] = "BIGINT" if pd.api.types.is_integer_dtype(df[src].dtype) else "NUMERIC"
+        columns[rollup["count"]] = "BIGINT"
+
+        defs = [f"{c} {t} NOT NULL" + (" DEFAULT 0" if c not in keys else "") for c, t in columns.items()]
+        cur = conn.cursor()
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {rollup['target']} ({', '.join(defs)}, PRIMARY KEY ({', '.join(keys)}));")
+        cur.execute(self._rollup_insert(rollup, f"(SELECT *, 1 AS _n FROM {table_name}) AS f") + ";")
+        conn.commit()
+        cur.close()
+        catalog.add(rollup["target"], {c: data_type(t) for c, t in columns.items()})
+        self.logger.info(f"load: created rollup {rollup['target']} from {table_name}")
+
+
+    # Write each normalized table (and rejects) as a compressed Parquet dataset under out_dir/<table>.
+    # partition_by: {"column": "transaction_date", "granularity": "month"} adds a hive partition
+    # column <column>_<granularity> to tables that have the column. Row groups carry min/max
+    # statistics so readers can skip them. mode="append" adds files next to earlier writes.
+    def write_parquet(self, normalized_dict: dict, rejects_df: pd.DataFrame, out_dir: str, partition_by: dict = None,
+                      compression: str = "zstd", row_group_size: int = None, mode: str = "overwrite"):
+        if pa is None:
+            self.logger.error("write_parquet: pyarrow is required for Parquet output")
+            raise ImportError("write_parquet: pyarrow is required for Parquet output")
+
+        tables = {**normalized_dict, "rejected": rejects_df}
+        file_options = pa_ds.ParquetFileFormat().make_write_options(compression=compression, write_statistics=True)
+
+        for name, df in tables.items():
+            table_dir = os.path.join(out_dir, name)
+            if mode == "overwrite" and os.path.isdir(table_dir):
+                shutil.rmtree(table_dir)
+
+            if df is None or df.empty:
+                self.logger.warning(f"write_parquet: {name}: DataFrame empty — skipping.")
+                continue
+
+            partitioning = None
+            if partition_by and partition_by["column"] in df.columns:
+                col = partition_by["column"]
+                granularity = partition_by.get("granularity", "month")
+                part_col = f"{col}_{granularity}"
+                df = df.assign(**{part_col: pd.to_datetime(df[col]).dt.strftime(PARTITION_FORMATS[granularity])})
+                partitioning = pa_ds.partitioning(pa.schema([(part_col, pa.string())]), flavor="hive")
+
+            pa_ds.write_dataset(
+                pa.Table.from_pandas(df, preserve_index=False),
+                table_dir,
+                format="parquet",
+                file_options=file_options,
+                partitioning=partitioning,
+                basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                max_rows_per_group=row_group_size or 1024 * 1024,
+                existing_data_behavior="overwrite_or_ignore",
+            )
+            self.logger.info(f"PARQUET: {len(df)} rows → {table_dir}")
+
+
+    @staticmethod
+    def _schema_column_types(src_cfg) -> dict:
+        # df_key -> {column: type hint} from the normalize config and source schema:
+        # surrogate keys use their dimension dtype, fact columns their final dtype or source schema type
+        norm = src_cfg.normalize
+        fact = norm.get("fact", {})
+        key_types = {d["surrogate_key"]: d.get("dtype", "int32") for d in norm.get("dimensions", [])}
+
+        types = {f"stg_{d['name']}": {d["surrogate_key"]: key_types[d["surrogate_key"]]} for d in norm.get("dimensions", [])}
+        if fact:
+            fact_types = {k: key_types[k] for k in fact.get("surrogate_keys", []) if k in key_types}
+            for source_col, col in fact.get("columns", {}).items():
+                if src_cfg.schema.get(source_col) == "date":
+                    fact_types[col] = "date"
+                elif col in fact.get("final_dtypes", {}):
+                    fact_types[col] = fact["final_dtypes"][col]
+            types[fact["name"]] = fact_types
+        return types
+
+
+    @staticmethod
+    def _load_dependencies(jobs: dict) -> dict:
+        # df_key -> df_keys that must commit first: explicit depends_on, otherwise every other
+        # table whose primary key appears as a column (dimensions before the facts that reference them)
+        pks = {key: t.get("pk") for key, (t, _) in jobs.items()}
+        deps = {}
+        for key, (t, df) in jobs.items():
+            if "depends_on" in t:
+                deps[key] = {d for d in t["depends_on"] if d in jobs}
+                continue
+            columns = {str(c).lower().replace(" ", "_") for c in df.columns}
+            deps[key] = {
+                other for other, pk in pks.items()
+                if other != key and pk and pk != pks[key] and pk in columns
+            }
+        return deps
+
+
+    def _run_load_graph(self, jobs: dict, deps: dict, load_fn, max_workers: int = None):
+        if not jobs:
+            return
+        pending = {key: set(d) for key, d in deps.items()}
+        done, failed, running = set(), {}, {}
+
+        with ThreadPoolExecutor(max_workers=max_workers or min(len(jobs), POOL_MAX_SIZE)) as pool:
+            def submit_ready():
+                changed = True
+                while changed:
+                    changed = False
+                    for key in list(pending):
+                        if pending[key] & failed.keys():
+                            self.logger.error(f"load_from_yaml: skipping {key}, a table it depends on failed")
+                            failed[key] = None
+                        elif pending[key] <= done:
+                            running[pool.submit(load_fn, *jobs[key])] = key
+                        else:
+                            continue
+                        del pending[key]
+                        changed = True
+
+            submit_ready()
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key = running.pop(future)
+                    try:
+                        future.result()
+                        done.add(key)
+                    except Exception as e:
+                        self.logger.error(f"load_from_yaml: loading {key} failed: {e}")
+                        failed[key] = e
+                submit_ready()
+
+        if pending:
+            raise ValueError(f"load_from_yaml: circular table dependencies between {sorted(pending)}")
+        errors = [e for e in failed.values() if e is not None]
+        if errors:
+            raise errors[0]
+
+
+    @staticmethod
+    def _index_specs(table_cfg: dict) -> list:
+        # (index name, columns) per entry of load.tables[].indexes: a column or a list of columns
+        name = table_cfg["target"].split(".")[-1]
+        specs = []
+        for entry in table_cfg.get("indexes", []):
+            cols = [entry] if isinstance(entry, str) else list(entry)
+            specs.append((f"{name}_{'_'.join(cols)}_idx", cols))
+        return specs
+
+
+    def _run_autocommit(self, statements: list, settings: dict = None):
+        # CREATE/DROP INDEX CONCURRENTLY can't run inside a transaction block; each statement commits on its own
+        with get_conn(self.conn_params, pooled=self.pooled, settings=settings or self.session_settings) as conn:
+            conn.autocommit = True
+            try:
+                cur = conn.cursor()
+                for sql in statements:
+                    cur.execute(sql)
+                cur.close()
+            finally:
+                conn.autocommit = False
+
+
+    def _concurrently(self, table_name: str, settings: dict = None) -> str:
+        # Partitioned parents don't support CONCURRENTLY; their indexes cascade to every partition
+        with get_conn(self.conn_params, pooled=self.pooled, settings=settings or self.session_settings) as conn:
+            partitioned = get_catalog(self.conn_params).partitioned(conn, table_name)
+        return "" if partitioned else "CONCURRENTLY "
+
+
+    def drop_indexes(self, table_name: str, indexes: list, settings: dict = None):
+        schema = f"{table_name.split('.')[0]}." if "." in table_name else ""
+        how = self._concurrently(table_name, settings)
+        self._run_autocommit([f"DROP INDEX {how}IF EXISTS {schema}{name};" for name, _ in indexes], settings)
+        self.logger.info(f"load: {table_name}: dropped indexes {[name for name, _ in indexes]} for the load")
+
+
+    def build_indexes(self, table_name: str, indexes: list, settings: dict = None):
+        # Missing indexes only, built without blocking writers where possible
+        schema = f"{table_name.split('.')[0]}." if "." in table_name else ""
+        how = self._concurrently(table_name, settings)
+        for name, cols in indexes:
+            try:
+                self._run_autocommit([f"CREATE INDEX {how}IF NOT EXISTS {name} ON {table_name} ({', '.join(cols)});"], settings)
+            except psycopg2.Error:
+                # A failed concurrent build leaves an invalid index that IF NOT EXISTS would keep
+                self._run_autocommit([f"DROP INDEX {how}IF EXISTS {schema}{name};"], settings)
+                raise
+        self.logger.info(f"load: {table_name}: indexes {[name for name, _ in indexes]} in place")
+
+
+    def analyze(self, table_name: str, settings: dict = None):
+        # Fresh planner statistics, so the first queries after a large load get good plans
+        self._run_autocommit([f"ANALYZE {table_name};"], settings)
+        self.logger.info(f"load: {table_name}: analyzed")
+
+
+    @staticmethod
+    def _load_config(source_name: str, yaml_path: str):
+        src_cfg = get_source_config(yaml_path, source_name)
+        if not src_cfg or not src_cfg.load:
             raise ValueError(f"YAML missing load rules for source '{source_name}'")
+        return src_cfg
+
+
+    # Bulk mode across several load_from_yaml(maintain_indexes=False) calls, e.g. one per chunk:
+    # drop the deferred indexes once before the first load and rebuild + ANALYZE after the last
+    def prepare_bulk_load(self, source_name: str, yaml_path: str):
+        src_cfg = self._load_config(source_name, yaml_path)
+        settings = src_cfg.load.get("session")
+        for t in src_cfg.load.get("tables", []):
+            if t.get("defer_indexes") and t.get("indexes"):
+                self.drop_indexes(t["target"], self._index_specs(t), settings)
+
+
+    def finish_bulk_load(self, source_name: str, yaml_path: str):
+        src_cfg = self._load_config(source_name, yaml_path)
+        settings = src_cfg.load.get("session")
+        for t in src_cfg.load.get("tables", []):
+            try:
+                if t.get("indexes"):
+                    self.build_indexes(t["target"], self._index_specs(t), settings)
+                self.analyze(t["target"], settings)
+            except psycopg2.errors.UndefinedTable:
+                self.logger.warning(f"finish_bulk_load: {t['target']} doesn't exist — nothing loaded")
+
+
+    def _output_frames(self, normalized_dict: dict, new_members: dict, pks: dict, mode: str) -> dict:
+        # Appended output (chunks of one run) gets each dimension member once; an overwrite starts over
+        frames = dict(normalized_dict)
+        for name in new_members:
+            pk = pks.get(name)
+            df = frames.get(name)
+            if mode == "overwrite":
+                self._output_keys.pop(name, None)
+            if df is None or not pk or pk not in df.columns:
+                continue
+            written = self._output_keys.setdefault(name, set())
+            fresh = ~df[pk].isin(written)
+            written.update(df.loc[fresh, pk].tolist())
+            frames[name] = df[fresh]
+        return frames
+
+
+    # strategies: {df_key: strategy} overrides for one run, e.g. {"stg_sales": "partition_replace"} for a backfill.
+    # With maintain_indexes, each table's declared indexes are deferred (defer_indexes and a large frame)
+    # or ensured after its load, and the table is analyzed; see prepare/finish_bulk_load otherwise.
+    def load_from_yaml(self, normalized_dict: dict, rejects_df: pd.DataFrame, source_name: str, yaml_path: str, output_mode: str = "overwrite",
+                       strategies: dict = None, maintain_indexes: bool = True):
+        src_cfg = self._load_config(source_name, yaml_path)
+
+        # Dimension tables hold every member the batch references; only the new ones go to the database
+        new_members = getattr(normalized_dict, "new_members", {})
+        pks = {t["df_key"]: t.get("pk") for t in src_cfg.load["tables"]}
+
+        # Optional file output next to the database load
+        out_cfg = src_cfg.load.get("output")
+        if out_cfg and pa is None:
+            self.logger.warning("load_from_yaml: pyarrow not installed — skipping Parquet output")
+        elif out_cfg:
+            self.write_parquet(
+                self._output_frames(normalized_dict, new_members, pks, output_mode),
+                rejects_df,
+                out_dir=out_cfg["path"],
+                partition_by=out_cfg.get("partition_by"),
+                compression=out_cfg.get("compression", "zstd"),
+                row_group_size=out_cfg.get("row_group_size"),
+                mode=output_mode,
+            )
 
-        for t in src_cfg["load"]["tables"]:
+        jobs = {}
+        for t in src_cfg.load["tables"]:
             df_key = t["df_key"]
 
             if df_key == "rejected":
                 df = rejects_df
             else:
-                df = normalized_dict.get(df_key)
+                df = new_members.get(df_key, normalized_dict.get(df_key))
 
             if df is None:
                 self.logger.warning(f"load_from_yaml: df_key '{df_key}' not found — skipping")
                 continue
 
-            # Load each table
-            self.load(
-                df=df,
-                table_name=t["target"],
-                conflict_cols=[t["pk"]] if t.get("pk") else None
-            )
+            jobs[df_key] = (t, df)
+
+        # Each table is loaded on its own pooled connection as soon as the tables it references have committed
+        settings = src_cfg.load.get("session")
+        schema_types = self._schema_column_types(src_cfg)
+
+        def load_table(t, df):
+            indexes = self._index_specs(t)
+            deferred = maintain_indexes and indexes and t.get("defer_indexes") and len(df) >= DEFER_INDEX_MIN_ROWS
+            if deferred:
+                self.drop_indexes(t["target"], indexes, settings)
+            try:
+                self.load(
+                    df=df,
+                    table_name=t["target"],
+                    conflict_cols=[t["pk"]] if t.get("pk") else None,
+                    strategy=(strategies or {}).get(t["df_key"], t.get("strategy", "upsert")),
+                    batch_size=t.get("batch_size"),
+                    copy_format=t.get("copy_format", "binary"),
+                    settings=settings,
+                    streams=t.get("streams", 1),
+                    row_hash=t.get("row_hash", False),
+                    partition_by=t.get("partition_by"),
+                    rollup=t.get("rollup"),
+                    column_types={**schema_types.get(t["df_key"], {}), **t.get("column_types", {})}
+                )
+            finally:
+                # A failed load still gets its indexes back
+                if deferred:
+                    self.build_indexes(t["target"], indexes, settings)
+            if maintain_indexes and not df.empty:
+                if indexes and not deferred:
+                    self.build_indexes(t["target"], indexes, settings)
+                self.analyze(t["target"], settings)
+
+        self._run_load_graph(jobs, self._load_dependencies(jobs), load_table, max_workers=src_cfg.load.get("parallelism"))
 
         self.logger.info("--------------- All loading complete ---------------")
@@ -1,9 +1,11 @@
 from src.extract import DataExtractor
 from src.transform import Transformer
 from src.load import Loader
+from src.keys import open_key_registry
 from src.analytics import *
 from src.util import get_logger
 import os
+from datetime import timedelta
 import streamlit as st
 import pandas as pd
 import altair as alt
@@ -42,7 +44,8 @@ def streamlit_run_etl( uploaded_file, db_conf, logger=None):
     if not transformer.validate_clean_df(df_clean):
         return {"status": "failed", "reason": "post-cleaning validation"}, None, None, None, None, None, None, None, None
 
-    normalized = transformer.normalize(df_clean)
+    key_registry = open_key_registry("config/sources.yml", "dirty_cafe_sales", db_conf)
+    normalized = transformer.normalize(df_clean, key_state=key_registry)
 
 
     loader.load_from_yaml(
@@ -51,6 +54,8 @@ def streamlit_run_etl( uploaded_file, db_conf, logger=None):
         source_name="dirty_cafe_sales",
         yaml_path="config/sources.yml"
     )
+    if key_registry is not None:
+        key_registry.commit()
 
     analytics = SalesAnalytics(
         normalized["stg_sales"],
@@ -82,7 +87,8 @@ def run_etl(input_file: str, db_conf: dict, logger=None):
     if not transformer.validate_clean_df(df_clean):
         return {"status": "failed", "reason": "post-cleaning validation"}, None, None, None, None, None, None
 
-    normalized = transformer.normalize(df_clean)
+    key_registry = open_key_registry("config/sources.yml", "dirty_cafe_sales", db_conf)
+    normalized = transformer.normalize(df_clean, key_state=key_registry)
 
     loader.load_from_yaml(
         normalized_dict=normalized,
@@ -90,6 +96,8 @@ def run_etl(input_file: str, db_conf: dict, logger=None):
         source_name="dirty_cafe_sales",
         yaml_path="config/sources.yml"
     )
+    if key_registry is not None:
+        key_registry.commit()
 
     analytics = SalesAnalytics(
         normalized["stg_sales"],
@@ -103,6 +111,61 @@ def run_etl(input_file: str, db_conf: dict, logger=None):
     }, analytics, normalized["stg_sales"], normalized["stg_product"], normalized["stg_location"], normalized["stg_payment_method"], df_rejects, df_raw, df_clean
 
 
+# Streaming version for inputs too large for memory: each chunk is cleaned, normalized and loaded
+# before the next is read. Dedup and surrogate keys are carried across chunks, so the loaded
+# tables match a single-shot run. Keys come from the key registry when one is configured. Returns row counts only, no in-memory frames.
+def run_etl_stream(input_file: str, db_conf: dict, chunksize: int = 100_000, logger=None):
+    if logger is None:
+        logger = get_logger(name="ETL", log_file="../logs/etl.log")
+    extractor = DataExtractor(logger=logger)
+    transformer = Transformer(logger=logger)
+    loader = Loader(logger=logger, conn_params=db_conf)
+
+    seen_keys = set()
+    key_state = open_key_registry("config/sources.yml", "dirty_cafe_sales", db_conf)
+    if key_state is None:
+        key_state = {}
+    counts = {"chunks": 0, "raw_rows": 0, "clean_rows": 0, "reject_rows": 0}
+
+    # Deferred indexes are dropped once for the whole run, then rebuilt and the tables analyzed at the end
+    loader.prepare_bulk_load("dirty_cafe_sales", "config/sources.yml")
+    try:
+        chunks = extractor.extract(input_file, chunksize=chunksize)
+        if isinstance(chunks, pd.DataFrame):
+            raise ValueError(f"run_etl_stream: {input_file} can't be read in chunks")
+        for df_raw in chunks:
+            if counts["chunks"] == 0 and not transformer.validate_raw_df(df_raw):
+                return {"status": "failed", "reason": "pre-cleaning validation", **counts}
+
+            df_clean, df_rejects = transformer.clean(df_raw, seen_keys=seen_keys)
+
+            if not transformer.validate_clean_df(df_clean):
+                return {"status": "failed", "reason": "post-cleaning validation", **counts}
+
+            normalized = transformer.normalize(df_clean, key_state=key_state)
+
+            loader.load_from_yaml(
+                normalized_dict=normalized,
+                rejects_df=df_rejects,
+                source_name="dirty_cafe_sales",
+                yaml_path="config/sources.yml",
+                output_mode="append" if counts["chunks"] else "overwrite",
+                maintain_indexes=False
+            )
+            if hasattr(key_state, "commit"):
+                key_state.commit()
+
+            counts["chunks"] += 1
+            counts["raw_rows"] += len(df_raw)
+            counts["clean_rows"] += len(df_clean)
+            counts["reject_rows"] += len(df_rejects)
+    finally:
+        loader.finish_bulk_load("dirty_cafe_sales", "config/sources.yml")
+
+    logger.info(f"run_etl_stream: Complete: {counts}")
+    return {"status": "success", **counts}
+
+
 def streamlit_app():
     st.set_page_config(
         page_title="Cafe Sales ETL Dashboard",
@@ -120,22 +183,30 @@ def streamlit_app():
     st.title("Cafe Sales ETL Dashboard")
     uploaded_file = st.file_uploader("Upload CSV or JSON", type=["csv", "json"])
 
+    # Widgets below rerun the script and st.button is only True on the click's run, so the ETL result is
+    # kept in session_state and the dashboard is drawn from it on every rerun
     if uploaded_file and st.button("Run ETL"):
-        result, analytics, stg_sales, stg_product, stg_location, stg_payment_method, df_rejects, df_raw, df_clean = \
-            streamlit_run_etl(uploaded_file, db_conf)
+        result, *frames = streamlit_run_etl(uploaded_file, db_conf)
 
         if result["status"] != "success":
+            st.session_state.pop("etl", None)
             st.error(f"ETL failed: {result.get('reason')}")
             return
 
+        st.session_state["etl"] = frames
+        st.session_state.pop("etl_history", None)
         st.success("ETL completed successfully!")
-        
+
+    if "etl" in st.session_state:
+        analytics, stg_sales, stg_product, stg_location, stg_payment_method, df_rejects, df_raw, df_clean = st.session_state["etl"]
+
         #Summaries
         st.header("Summary Overview")
         st.write("Raw rows:", len(df_raw), "Clean rows:", len(df_clean), "Reject rows:", len(df_rejects))
         
-        total_sales = stg_sales["total_spent"].sum()
-        num_transactions = len(stg_sales)
+        totals = analytics.totals()
+        total_sales = totals["total_spent"]
+        num_transactions = totals["num_transactions"]
         num_products = stg_product["product_id"].nunique()
         num_locations = stg_location["location_id"].nunique()
         num_payment_methods = stg_payment_method["payment_id"].nunique()
@@ -184,48 +255,46 @@ def streamlit_app():
         
         st.title("Analytics")
 
-        sales_df = stg_sales.copy()
-
-        # Merge the proper naming from dimension tables so analytics can reference table with names alongside IDs
-        if 'product_id' in sales_df.columns and stg_product is not None:
-            product_name_col = [c for c in stg_product.columns if c != 'product_id'][0]
-            sales_df = sales_df.merge(
-                stg_product[['product_id', product_name_col]],
-                on='product_id', how='left'
-            )
-        else:
-            product_name_col = 'product_id'
-
-        if 'location_id' in sales_df.columns and stg_location is not None:
-            location_name_col = [c for c in stg_location.columns if c != 'location_id'][0]
-            sales_df = sales_df.merge(
-                stg_location[['location_id', location_name_col]],
-                on='location_id', how='left'
-            )
-        else:
-            location_name_col = 'location_id'
-
-        if 'payment_id' in sales_df.columns and stg_payment_method is not None:
-            payment_name_col = [c for c in stg_payment_method.columns if c != 'payment_id'][0]
-            sales_df = sales_df.merge(
-                stg_payment_method[['payment_id', payment_name_col]],
-                on='payment_id', how='left'
-            )
-        else:
-            payment_name_col = 'payment_id'
-        
-        #st.subheader("Sales Fact Table with Names")
-        #st.dataframe(sales_df)
+        # This upload only, or aggregated by Postgres over everything loaded so far
+        if st.checkbox("Include all loaded history (from the database)"):
+            # Read once per ETL run, not on every widget change
+            if "etl_history" not in st.session_state:
+                st.session_state["etl_history"] = SalesAnalytics.from_db(db_conf)
+            analytics = st.session_state["etl_history"]
+
+        # Every table below is a roll-up of the analytics cube, labelled from the dimension tables
+        product_name_col = analytics.label_column(analytics.product, 'product_id')
+        location_name_col = analytics.label_column(analytics.location, 'location_id')
+        payment_name_col = analytics.label_column(analytics.payment, 'payment_id')
+
+        # Drill-down filters: a date range and dimension members, applied through the cube's sorted index
+        filters = {}
+        days = analytics.cube['transaction_date'].dropna()
+        if not days.empty:
+            first, last = days.min().date(), days.max().date()
+            picked = st.date_input("Date range", value=(first, last), min_value=first, max_value=last)
+            if isinstance(picked, (tuple, list)) and len(picked) == 2 and tuple(picked) != (first, last):
+                filters["start"], filters["end"] = picked[0], picked[1] + timedelta(days=1)
+
+        filter_cols = st.columns(3)
+        for col, (dimension, dim, label, title) in zip(filter_cols, (
+            ("product", analytics.product, product_name_col, "Products"),
+            ("location", analytics.location, location_name_col, "Locations"),
+            ("payment", analytics.payment, payment_name_col, "Payment Methods"),
+        )):
+            options = dim[label].dropna().unique().tolist() if dim is not None and label in dim.columns else []
+            with col:
+                chosen = st.multiselect(title, options)
+            if chosen:
+                filters[dimension] = chosen
+
+        if filters:
+            analytics = analytics.filter(**filters)
 
         # Analytics
         st.subheader("Top Products by Sales")
         col1a, col2a = st.columns(2)
-        sales_by_product = sales_df.groupby(product_name_col).agg(
-            total_spent=('total_spent', 'sum'),
-            total_quantity=('quantity', 'sum')
-        ).reset_index()
-
-        sales_by_product = sales_by_product.sort_values('total_spent', ascending=False)
+        sales_by_product = analytics.breakdown("product", ['total_spent', 'total_quantity'])
 
         with col1a:
             st.dataframe(sales_by_product.head(10))
@@ -242,10 +311,7 @@ def streamlit_app():
             st.altair_chart(fig, use_container_width=True)
         
         col1b, col2b = st.columns(2)
-        sales_by_location = sales_df.groupby(location_name_col).agg(
-            total_spent=('total_spent', 'sum'),
-            total_quantity=('quantity', 'sum')
-        ).reset_index()
+        sales_by_location = analytics.breakdown("location", ['total_spent', 'total_quantity'])
         with col1b:
             st.subheader("Sales by Location")
             st.dataframe(sales_by_location)
@@ -254,10 +320,7 @@ def streamlit_app():
             st.bar_chart(sales_by_location.set_index(location_name_col)['total_spent'])
 
         col1c, col2c = st.columns(2)
-        sales_by_payment = sales_df.groupby(payment_name_col).agg(
-            total_spent=('total_spent', 'sum'),
-            total_quantity=('quantity', 'sum')
-        ).reset_index()
+        sales_by_payment = analytics.breakdown("payment", ['total_spent', 'total_quantity'])
         with col1c:
             st.subheader("Sales by Payment Method")
             st.dataframe(sales_by_payment)
@@ -266,10 +329,7 @@ def streamlit_app():
             st.bar_chart(sales_by_payment.set_index(payment_name_col)['total_spent'])
 
 
-        daily_sales = sales_df.groupby('transaction_date').agg(
-            total_spent=('total_spent', 'sum'),
-            num_transactions=('transaction_id', 'count')
-        ).reset_index()
+        daily_sales = analytics.daily_summary(['total_spent', 'num_transactions'])
 
         col1d, col2d = st.columns(2)
 
@@ -305,6 +365,27 @@ def streamlit_app():
 
             st.altair_chart(chart, use_container_width=True)
 
+        # Trends: rolling windows and period-over-period changes, from one dense day x member array
+        st.title("Trends")
+        trend_by = st.selectbox("Trends by", ["Total", "Product", "Location", "Payment Method"])
+        trend_dim = {"Total": None, "Product": "product", "Location": "location", "Payment Method": "payment"}[trend_by]
+
+        rolling = analytics.rolling_sales(windows=(7, 28), dimension=trend_dim)
+        st.subheader("Rolling 7 / 28-day Revenue")
+        if trend_dim is None:
+            st.line_chart(rolling.set_index('transaction_date')[['rolling_7d', 'rolling_28d']])
+        else:
+            trend_label = rolling.columns[1]
+            st.line_chart(rolling.pivot(index='transaction_date', columns=trend_label, values='rolling_7d'))
+
+        col1e, col2e = st.columns(2)
+        with col1e:
+            st.subheader("Week over Week")
+            st.dataframe(analytics.period_over_period("W", dimension=trend_dim))
+        with col2e:
+            st.subheader("Month over Month")
+            st.dataframe(analytics.period_over_period("M", dimension=trend_dim))
+
 
 if __name__ == "__main__":
     logger = get_logger(name="ETL", log_file="logs/etl.log")
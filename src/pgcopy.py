@@ -0,0 +1,247 @@
+import struct
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+
+# PostgreSQL binary COPY encoder. Rows are laid out straight from the column arrays into one
+# uint8 buffer per chunk, and BinaryCopyStream hands the chunks to cursor.copy_expert as a
+# file-like object, so only one chunk is ever converted and encoded in memory.
+#
+# Binary COPY needs the exact target column types (type OIDs from cursor.description). Columns
+# of any other type, or values that don't fit, raise UnsupportedType so callers can use CSV.
+
+HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+TRAILER = struct.pack(">h", -1)
+
+BOOL, INT8, INT2, INT4, FLOAT4, FLOAT8 = 16, 20, 21, 23, 700, 701
+NAME, BPCHAR, VARCHAR, TEXT = 19, 1042, 1043, 25
+DATE, TIMESTAMP, TIMESTAMPTZ, NUMERIC = 1082, 1114, 1184, 1700
+
+INT_TYPES = {INT2: (">i2", 2**15), INT4: (">i4", 2**31), INT8: (">i8", 2**63)}
+FLOAT_TYPES = {FLOAT4: ">f4", FLOAT8: ">f8"}
+TEXT_TYPES = {NAME, BPCHAR, VARCHAR, TEXT}
+
+# Days / microseconds between 1970-01-01 and the PostgreSQL epoch 2000-01-01
+PG_EPOCH_DAYS = 10957
+PG_EPOCH_US = PG_EPOCH_DAYS * 86_400_000_000
+
+CHUNK_ROWS = 50_000
+
+
+class UnsupportedType(ValueError):
+    pass
+
+
+class _Fixed:
+    # Big-endian bytes of one fixed-width value per row
+    def __init__(self, data: np.ndarray, null: np.ndarray):
+        self.width = data.dtype.itemsize
+        self.data = data.view(np.uint8).reshape(-1, self.width)
+        self.null = null
+
+    def sizes(self):
+        return np.where(self.null, 0, self.width)
+
+
+class _Variable:
+    # Per-row codes into a blob of distinct encoded values (text, numeric)
+    def __init__(self, codes: np.ndarray, encoded: list, null: np.ndarray):
+        self.codes = codes
+        self.lengths = np.array([len(b) for b in encoded], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)[:-1]]).astype(np.int64)
+        self.blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        self.null = null
+
+    def sizes(self):
+        return np.where(self.null, 0, self.lengths[np.maximum(self.codes, 0)])
+
+
+def _coerce(s: pd.Series, oid: int) -> pd.Series:
+    # Checks the whole column against the target type before anything is streamed, so a bad value
+    # can still fall back to CSV. Columns already in a matching dtype are returned as is.
+    if oid in INT_TYPES:
+        if not (pd.api.types.is_numeric_dtype(s.dtype) or pd.api.types.is_bool_dtype(s.dtype)):
+            s = _to_numeric(s)
+        if pd.api.types.is_float_dtype(s.dtype):
+            values = s.dropna().to_numpy(dtype=np.float64)
+            if not np.array_equal(values, np.trunc(values)):
+                raise UnsupportedType(f"column '{s.name}' has fractional values for an integer column")
+        bound = INT_TYPES[oid][1]
+        if s.notna().any() and (s.min() < -bound or s.max() >= bound):
+            raise UnsupportedType(f"column '{s.name}' is out of range for its integer column")
+        return s
+
+    if oid in FLOAT_TYPES:
+        return s if pd.api.types.is_numeric_dtype(s.dtype) else _to_numeric(s)
+
+    if oid == BOOL:
+        if not pd.api.types.is_bool_dtype(s.dtype):
+            raise UnsupportedType(f"column '{s.name}' is not boolean")
+        return s
+
+    if oid in (TIMESTAMP, TIMESTAMPTZ, DATE):
+        if not pd.api.types.is_datetime64_any_dtype(s.dtype):
+            try:
+                s = pd.to_datetime(s)
+            except (ValueError, TypeError):
+                raise UnsupportedType(f"column '{s.name}' is not a date/time column")
+        if getattr(s.dt, "tz", None) is not None:
+            s = s.dt.tz_convert("UTC").dt.tz_localize(None)
+        return s
+
+    if oid in TEXT_TYPES:
+        return s
+
+    if oid == NUMERIC:
+        if not pd.api.types.is_numeric_dtype(s.dtype):
+            s = _to_numeric(s)
+        if pd.api.types.is_float_dtype(s.dtype) and np.isinf(s.to_numpy(dtype=np.float64, na_value=np.nan)).any():
+            raise UnsupportedType(f"column '{s.name}' has infinite values for a NUMERIC column")
+        return s
+
+    raise UnsupportedType(f"column '{s.name}' has unsupported type oid {oid}")
+
+
+def _to_numeric(s: pd.Series) -> pd.Series:
+    try:
+        return pd.to_numeric(s)
+    except (ValueError, TypeError):
+        raise UnsupportedType(f"column '{s.name}' is not numeric")
+
+
+def _numeric_bytes(value) -> bytes:
+    # NUMERIC wire format: ndigits, weight, sign, dscale, then base-10000 digits
+    d = Decimal(repr(value)) if isinstance(value, float) else Decimal(str(value))
+    if d.is_nan():
+        return struct.pack(">hhHh", 0, 0, 0xC000, 0)
+    if d.is_infinite():
+        raise UnsupportedType("infinite values are not supported for NUMERIC")
+
+    sign, digits, exp = d.as_tuple()
+    dscale = max(-exp, 0)
+    text = "".join(map(str, digits)) + "0" * max(exp, 0)
+    text = text.rjust(dscale + 1, "0")
+    int_part, frac_part = text[:len(text) - dscale], text[len(text) - dscale:]
+
+    int_part = int_part.rjust(-(-len(int_part) // 4) * 4, "0")
+    frac_part = frac_part.ljust(-(-len(frac_part) // 4) * 4, "0")
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    weight = len(groups) - 1
+    groups += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+
+    return struct.pack(f">hhHh{len(groups)}h", len(groups), weight, 0x4000 if sign else 0, dscale, *groups)
+
+
+def _variable(s: pd.Series, null: np.ndarray, encode) -> _Variable:
+    codes, uniques = pd.factorize(s)
+    # An all-NA chunk still needs one (unused) entry to index into
+    encoded = [encode(v) for v in uniques] or [b""]
+    return _Variable(codes, encoded, null | (codes < 0))
+
+
+def _prepare(s: pd.Series, oid: int):
+    # Wire layout for one chunk of a column already checked by _coerce
+    null = s.isna().to_numpy()
+
+    if oid in INT_TYPES:
+        values = s.to_numpy(dtype=np.float64 if pd.api.types.is_float_dtype(s.dtype) else np.int64, na_value=0)
+        return _Fixed(values.astype(INT_TYPES[oid][0]), null)
+
+    if oid in FLOAT_TYPES:
+        return _Fixed(s.to_numpy(dtype=np.float64, na_value=np.nan).astype(FLOAT_TYPES[oid]), null)
+
+    if oid == BOOL:
+        return _Fixed(s.to_numpy(dtype=np.uint8, na_value=0), null)
+
+    if oid in (TIMESTAMP, TIMESTAMPTZ, DATE):
+        ns = s.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        if oid == DATE:
+            return _Fixed((np.floor_divide(ns, 86_400_000_000_000) - PG_EPOCH_DAYS).astype(">i4"), null)
+        return _Fixed((np.floor_divide(ns, 1000) - PG_EPOCH_US).astype(">i8"), null)
+
+    if oid in TEXT_TYPES:
+        return _variable(s, null, lambda v: (v if isinstance(v, str) else str(v)).encode("utf-8"))
+
+    return _variable(s, null, _numeric_bytes)
+
+
+def _encode_rows(columns: list) -> bytes:
+    # One chunk: row i is [field count][len][value]... with len -1 for NULL
+    sizes = [c.sizes() for c in columns]
+    row_sizes = 2 + 4 * len(columns) + np.sum(sizes, axis=0, dtype=np.int64)
+    row_start = np.concatenate([[0], np.cumsum(row_sizes)[:-1]]).astype(np.int64)
+    buf = np.empty(int(row_sizes.sum()), dtype=np.uint8)
+
+    # Field count per row
+    buf[row_start[:, None] + np.arange(2)] = np.frombuffer(struct.pack(">h", len(columns)), dtype=np.uint8)
+
+    pos = row_start + 2
+    for col, size in zip(columns, sizes):
+        null = col.null
+        lengths = np.where(null, -1, size).astype(">i4").view(np.uint8).reshape(-1, 4)
+        buf[pos[:, None] + np.arange(4)] = lengths
+
+        present = ~null
+        dest = pos[present] + 4
+        if isinstance(col, _Fixed):
+            buf[dest[:, None] + np.arange(col.width)] = col.data[present]
+        else:
+            codes = col.codes[present]
+            lens = col.lengths[codes]
+            total = int(lens.sum())
+            if total:
+                before = np.cumsum(lens) - lens
+                step = np.arange(total) - np.repeat(before, lens)
+                buf[np.repeat(dest, lens) + step] = col.blob[np.repeat(col.offsets[codes], lens) + step]
+
+        pos = pos + 4 + size
+
+    return buf.tobytes()
+
+
+def encode(df: pd.DataFrame, type_oids: list, chunk_rows: int = CHUNK_ROWS):
+    # Yields the binary COPY stream for df in chunks of chunk_rows rows
+    if len(type_oids) != len(df.columns):
+        raise UnsupportedType(f"{len(df.columns)} columns for {len(type_oids)} target columns")
+    columns = [_coerce(df.iloc[:, i], oid) for i, oid in enumerate(type_oids)]
+
+    def chunks():
+        yield HEADER
+        for start in range(0, len(df), chunk_rows):
+            rows = slice(start, start + chunk_rows)
+            yield _encode_rows([_prepare(s.iloc[rows], oid) for s, oid in zip(columns, type_oids)])
+        yield TRAILER
+
+    return chunks()
+
+
+class BinaryCopyStream:
+    # File-like read() over encoded chunks for cursor.copy_expert
+    def __init__(self, df: pd.DataFrame, type_oids: list, chunk_rows: int = CHUNK_ROWS):
+        self._chunks = encode(df, type_oids, chunk_rows)
+        self._current = memoryview(b"")
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            rest = bytes(self._current[self._pos:])
+            self._current, self._pos = memoryview(b""), 0
+            return rest + b"".join(self._chunks)
+
+        while self._pos >= len(self._current):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._current, self._pos = memoryview(chunk), 0
+
+        out = bytes(self._current[self._pos:self._pos + size])
+        self._pos += len(out)
+        return out
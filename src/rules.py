@@ -0,0 +1,148 @@
+import ast
+import operator
+import numpy as np
+import pandas as pd
+
+# Domain rules from sources.yml, e.g. {"column": "Quantity", "must_be": "> 0"}.
+# must_be is parsed once as "<column> <must_be>" into a Python AST, checked against a
+# small whitelist and compiled into a NumPy predicate. Nothing is ever passed to eval.
+#
+# Supported forms:
+#   "> 0", ">= 0.5", "!= 'ERROR'", "in ['Cash', 'Card']", "not in ('x',)"
+#   ".between(1, 10)", ".isin(['Cash', 'Card'])"
+#   "> 0 and x < 100", ">= 1 or x == -1"   (x refers to the column again)
+
+COLUMN = "x"
+
+COMPARE_OPS = {
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+
+def _literal(node):
+    try:
+        value = ast.literal_eval(node)
+    except ValueError:
+        raise ValueError(f"only literal values are allowed, got '{ast.unparse(node)}'")
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return value
+
+
+def _compile(node):
+    # Returns fn(values) -> bool ndarray of rows that satisfy the rule
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(v) for v in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return lambda x: combine.reduce([p(x) for p in parts])
+
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        left, right = _compile(node.left), _compile(node.right)
+        combine = np.logical_and if isinstance(node.op, ast.BitAnd) else np.logical_or
+        return lambda x: combine(left(x), right(x))
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+        inner = _compile(node.operand)
+        return lambda x: ~inner(x)
+
+    if isinstance(node, ast.Compare):
+        if not (isinstance(node.left, ast.Name) and node.left.id == COLUMN) or len(node.ops) != 1:
+            raise ValueError("comparisons must be of the form '<op> <literal>'")
+        op, value = node.ops[0], _literal(node.comparators[0])
+        if isinstance(op, (ast.In, ast.NotIn)):
+            members = np.asarray(value, dtype=object)
+            if isinstance(op, ast.In):
+                return lambda x: np.isin(x, members)
+            return lambda x: ~np.isin(x, members)
+        if type(op) not in COMPARE_OPS:
+            raise ValueError(f"unsupported operator '{type(op).__name__}'")
+        fn = COMPARE_OPS[type(op)]
+        return lambda x: np.asarray(fn(x, value), dtype=bool)
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+            and isinstance(node.func.value, ast.Name) and node.func.value.id == COLUMN:
+        method, args = node.func.attr, [_literal(a) for a in node.args]
+        if node.keywords:
+            raise ValueError("keyword arguments are not supported")
+        if method == "between" and len(args) == 2:
+            low, high = args
+            return lambda x: (x >= low) & (x <= high)
+        if method == "isin" and len(args) == 1:
+            members = np.asarray(args[0], dtype=object)
+            return lambda x: np.isin(x, members)
+        raise ValueError(f"unsupported method '{method}' with {len(args)} arguments")
+
+    raise ValueError(f"unsupported expression '{ast.unparse(node)}'")
+
+
+class DomainRule:
+    def __init__(self, column: str, must_be: str):
+        self.column = column
+        self.must_be = must_be
+        self.name = f"{column} {must_be}"
+        try:
+            tree = ast.parse(f"{COLUMN} {must_be}", mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Invalid domain rule '{self.name}': {e.msg}")
+        try:
+            self.predicate = _compile(tree.body)
+        except ValueError as e:
+            raise ValueError(f"Invalid domain rule '{self.name}': {e}")
+
+
+class RuleSet:
+    # Compiled once per Transformer; evaluate() checks every rule against a frame in one pass
+    def __init__(self, rules: list, logger=None):
+        self.logger = logger
+        self.rules = []
+        for rule in rules:
+            try:
+                self.rules.append(DomainRule(rule.get("column"), str(rule.get("must_be"))))
+            except ValueError as e:
+                if self.logger:
+                    self.logger.error(f"RuleSet: {e}")
+
+    @staticmethod
+    def _column_values(s: pd.Series):
+        # NA rows are not domain failures (required_fields covers missing values)
+        missing = s.isna().to_numpy()
+        if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+            return s.to_numpy(dtype="float64", na_value=np.nan), missing
+        values = s.to_numpy(dtype=object, na_value=None)
+        if missing.any():
+            values = values.copy()
+            values[missing] = ""
+        return values, missing
+
+    def evaluate(self, df: pd.DataFrame) -> tuple:
+        # Returns (invalid mask, index of the first failed rule per row or -1)
+        invalid = np.zeros(len(df), dtype=bool)
+        failed_rule = np.full(len(df), -1, dtype=np.int16)
+        columns = {}
+
+        for i, rule in enumerate(self.rules):
+            if rule.column not in df.columns:
+                if self.logger:
+                    self.logger.warning(f"apply_domain_rules: Column '{rule.column}' not found, skipping.")
+                continue
+            if rule.column not in columns:
+                columns[rule.column] = self._column_values(df[rule.column])
+            values, missing = columns[rule.column]
+
+            try:
+                with np.errstate(invalid="ignore"):
+                    rule_invalid = ~rule.predicate(values) & ~missing
+            except TypeError as e:
+                if self.logger:
+                    self.logger.error(f"apply_domain_rules: Cannot apply '{rule.name}': {e}")
+                continue
+
+            failed_rule[rule_invalid & (failed_rule < 0)] = i
+            invalid |= rule_invalid
+
+        return invalid, failed_rule
@@ -1,10 +1,25 @@
 import pandas as pd
+import numpy as np
 import logging
+import threading
+from collections import OrderedDict
 from src.util import get_logger
+from src.rules import RuleSet
+from src.config import SourceConfig, get_source_config
 import yaml
 
 logger = get_logger(name='Transform', log_file='../logs/etl.log', level=logging.INFO)
 
+
+class Normalized(dict):
+    # table name -> DataFrame, as returned by Transformer.normalize. Dimension tables hold every member
+    # the batch references; new_members holds, per dimension table, only the members that got their
+    # key in this call (what the loader writes to the database).
+    def __init__(self, tables=(), new_members: dict = None):
+        super().__init__(tables)
+        self.new_members = dict(new_members or {})
+
+
 class Transformer:
     def __init__(self, schema_path: str = "config/sources.yml", source_name: str = "dirty_cafe_sales", logger=None):
         if logger:
@@ -22,62 +37,16 @@ class Transformer:
         self.logger.info("------------------------ Transformer initialized -----------------------")
 
         self.source_config = self._load_source_config(schema_path, source_name)
-        self.expected_schema = self._load_schema(schema_path, source_name)
-        self.expected_cleaning = self._load_cleaning(schema_path, source_name)
+        self.expected_schema = self.source_config.schema
+        self.expected_cleaning = self.source_config.cleaning
+        self.domain_rules = RuleSet(self.expected_cleaning.get("domain_rules", []), logger=self.logger)
 
 
-    def _load_schema(self, path: str, source_name: str) -> dict:
-        self.logger.info(f"_load_schema: Loading schema for '{source_name}' from {path}")
-        try:
-            with open(path, "r") as f:
-                config = yaml.safe_load(f)
-
-            for source in config.get("sources", []):
-                if source.get("name") == source_name:
-                    return source.get("schema", {})
-
-            self.logger.error(f"_load_schema: No schema found for source '{source_name}'")
-            raise ValueError(f"_load_schema: No schema found for source '{source_name}'")
-        except FileNotFoundError:
-            self.logger.error(f"_load_schema: Schema file not found at {path}")
-            raise
-        except yaml.YAMLError as e:
-            self.logger.error(f"_load_schema: Error parsing YAML file: {e}")
-            raise
-        
-        
-    def _load_cleaning(self, path: str, source_name: str) -> dict:
-        self.logger.info(f"_load_cleaning: Loading cleaning rules for '{source_name}' from {path}")
+    def _load_source_config(self, path: str, source_name: str) -> SourceConfig:
+        # Parsed once per process and shared with the extractor and loader
+        self.logger.info(f"_load_source_config: Loading source config for '{source_name}' from {path}")
         try:
-            with open(path, "r") as f:
-                config = yaml.safe_load(f)
-
-            for source in config.get("sources", []):
-                if source.get("name") == source_name:
-                    return source.get("cleaning", {})
-
-            self.logger.error(f"_load_cleaning: No cleaning rules found for source '{source_name}'")
-            raise ValueError(f"_load_cleaning: No cleaning rules found for source '{source_name}'")
-        except FileNotFoundError:
-            self.logger.error(f"_load_cleaning: Cleaning rules file not found at {path}")
-            raise
-        except yaml.YAMLError as e:
-            self.logger.error(f"_load_cleaning: Error parsing YAML file: {e}")
-            raise
-    
-    
-    def _load_source_config(self, path: str, source_name: str) -> dict:
-        self.logger.info(f"_load_source_config: Loading full source config for '{source_name}' from {path}")
-        try:
-            with open(path, "r") as f:
-                config = yaml.safe_load(f)
-
-            for source in config.get("sources", []):
-                if source.get("name") == source_name:
-                    return source  
-
-            raise ValueError(f"_load_source_config: No config found for source '{source_name}'")
-
+            source = get_source_config(path, source_name)
         except FileNotFoundError:
             self.logger.error(f"_load_source_config: Config file not found at {path}")
             raise
@@ -85,6 +54,11 @@ class Transformer:
             self.logger.error(f"_load_source_config: Error parsing YAML: {e}")
             raise
 
+        if source is None:
+            self.logger.error(f"_load_source_config: No config found for source '{source_name}'")
+            raise ValueError(f"_load_source_config: No config found for source '{source_name}'")
+        return source
+
 
     # Pre-clean validation
     def validate_raw_df(self, df: pd.DataFrame) -> bool:
@@ -123,7 +97,8 @@ class Transformer:
 
 
     # Clean, standarduze bad values, trim ID, type conversions, compute empties if possible
-    def clean(self, df_raw: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # seen_keys: PKs kept by earlier chunks of the same stream, updated in place
+    def clean(self, df_raw: pd.DataFrame, seen_keys: set = None) -> tuple[pd.DataFrame, pd.DataFrame]:
         self.logger.info("clean: Cleaning DataFrame...")
 
         # Clean column names
@@ -131,7 +106,7 @@ class Transformer:
 
         # Standardize missing vals
         bad_values = set(self.expected_cleaning.get("missing_values", []))
-        df = df_raw.replace(bad_values, pd.NA).copy()
+        df = self._standardize_missing(df_raw.copy(), bad_values)
 
         # Apply transformations (ID trim, numeric, to_string)
         df = self._apply_transformations(df)
@@ -155,11 +130,17 @@ class Transformer:
 
         # Deduplicate using PK from YAML
         pk = self.expected_schema.get("pk", ["Transaction ID"])
-        if isinstance(pk, str):
-            pk = [pk]
+        pk = [pk] if isinstance(pk, str) else list(pk)
 
         before = len(df_clean)
         df_clean = df_clean.drop_duplicates(subset=pk)
+
+        # Streaming: also drop PKs already kept by a previous chunk
+        if seen_keys is not None:
+            keys = self._pk_index(df_clean, pk)
+            unseen = ~keys.isin(seen_keys)
+            df_clean = df_clean[unseen]
+            seen_keys.update(keys[unseen])
         after = len(df_clean)
         self.logger.info(f"clean: Deduplicated: removed {before - after} duplicate rows.")
 
@@ -169,8 +150,32 @@ class Transformer:
         return df_clean, df_rejects
 
 
+    @staticmethod
+    def _standardize_missing(df: pd.DataFrame, bad_values: set) -> pd.DataFrame:
+        # Only text columns can hold bad tokens; typed columns from the extractor are skipped
+        for col in df.columns:
+            s = df[col]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                present = [v for v in s.cat.categories if v in bad_values]
+                if present:
+                    df[col] = s.cat.remove_categories(present)
+            elif s.dtype == object or pd.api.types.is_string_dtype(s.dtype):
+                df[col] = s.replace(list(bad_values), pd.NA)
+        return df
+
+
+    @staticmethod
+    def _pk_index(df: pd.DataFrame, pk: list) -> pd.Index:
+        if len(pk) == 1:
+            return pd.Index(df[pk[0]])
+        return pd.MultiIndex.from_frame(df[pk])
+
+
     def _apply_transformations(self, df: pd.DataFrame) -> pd.DataFrame:
         rules = self.expected_cleaning.get("transformations", [])
+        # memoize: transform each distinct value once and gather results back through factorize codes
+        memoize = self.expected_cleaning.get("memoize", True)
+        cache_size = self.expected_cleaning.get("memo_cache_size", 0)
 
         # Apply each transformation rule from YAML
         for rule in rules:
@@ -179,59 +184,84 @@ class Transformer:
                 self.logger.warning(f"_apply_transformations: Column '{col}' not found. Skipping.")
                 continue
 
-            # Regex application
-            if "regex_extract" in rule:
-                pattern = rule["regex_extract"]
-                self.logger.info(f"_apply_transformations: regex_extract on '{col}' using '{pattern}'")
-                df[col] = df[col].astype(str).str.extract(pattern)
+            self.logger.info(f"_apply_transformations: {self._describe_rule(rule)} on '{col}'")
+            if memoize:
+                cache = _value_cache(rule, cache_size) if cache_size else None
+                df[col] = self._transform_memoized(df[col], rule, cache)
+            else:
+                df[col] = self._transform_column(df[col], rule)
 
-            # Numeric conversions
-            if "numeric" in rule:
-                cast_type = rule["numeric"]
-                self.logger.info(f"_apply_transformations: casting '{col}' to {cast_type}")
+        return df
 
-                if cast_type == "int":
-                    df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
-                elif cast_type == "float":
-                    df[col] = pd.to_numeric(df[col], errors="coerce").astype("float")
 
-            # String conversion
-            if rule.get("to_string"):
-                df[col] = df[col].astype("string")
+    @staticmethod
+    def _describe_rule(rule) -> str:
+        steps = []
+        if "regex_extract" in rule:
+            steps.append(f"regex_extract '{rule['regex_extract']}'")
+        if "numeric" in rule:
+            steps.append(f"cast to {rule['numeric']}")
+        if rule.get("to_string"):
+            steps.append("to_string")
+        return ", ".join(steps) or "no-op"
+
+
+    @staticmethod
+    def _transform_column(s: pd.Series, rule) -> pd.Series:
+        # Regex application
+        if "regex_extract" in rule:
+            if not pd.api.types.is_string_dtype(s.dtype) or s.dtype == object:
+                s = s.astype(str)
+            s = s.str.extract(rule["regex_extract"], expand=False)
+
+        # Numeric conversions
+        if "numeric" in rule:
+            if rule["numeric"] == "int":
+                s = pd.to_numeric(s, errors="coerce").astype("Int64")
+            elif rule["numeric"] == "float":
+                s = pd.to_numeric(s, errors="coerce").astype("float")
+
+        # String conversion
+        if rule.get("to_string"):
+            s = s.astype("string")
+
+        return s
+
+
+    def _transform_memoized(self, s: pd.Series, rule, cache=None) -> pd.Series:
+        codes, uniques = pd.factorize(s)
+        uniques = pd.Series(uniques)
+
+        # NA gets its own slot so it goes through the rule exactly like other values
+        if (codes < 0).any():
+            codes = np.where(codes < 0, len(uniques), codes)
+            uniques = pd.concat([uniques, pd.Series([None], dtype=uniques.dtype)], ignore_index=True)
+
+        # The cross-chunk cache only pays off for low-cardinality columns
+        if cache is not None and len(uniques) <= len(s) // 2:
+            results = cache.transform(uniques, lambda u: self._transform_column(u, rule))
+        else:
+            results = self._transform_column(uniques, rule)
+
+        return pd.Series(results.array.take(codes), index=s.index, name=s.name)
+
 
-        return df
-    
-    
     def _mark_missing_required(self, df: pd.DataFrame) -> pd.DataFrame:
         # Identify required fields from YAML
-        required = self.expected_cleaning.get("required_fields", [])
+        required = list(self.expected_cleaning.get("required_fields", []))
 
         df["__missing_required__"] = df[required].isna().any(axis=1)
         return df
 
 
     def _apply_domain_rules(self, df: pd.DataFrame) -> pd.DataFrame:
-        # Apply domain rules from YAML
-        rules = self.expected_cleaning.get("domain_rules", [])
-        df["__invalid_domain__"] = False
+        # Domain rules from YAML, compiled once in __init__ and checked in a single pass
+        invalid, failed_rule = self.domain_rules.evaluate(df)
+        df["__invalid_domain__"] = invalid
 
-        for rule in rules:
-            col = rule.get("column")
-            expr = rule.get("must_be")  # Check for numbers exceeding bounds set by rules
-
-            if col not in df.columns:
-                self.logger.warning(f"apply_domain_rules: Column '{col}' not found, skipping.")
-                continue
-
-            condition = f"df['{col}'] {expr}"
-
-            try:
-                invalid_mask = ~eval(condition)
-            except Exception as e:
-                self.logger.error(f"apply_domain_rules: Invalid domain rule '{condition}': {e}")
-                continue
-
-            df.loc[invalid_mask, "__invalid_domain__"] = True
+        codes, counts = np.unique(failed_rule[failed_rule >= 0], return_counts=True)
+        for code, count in zip(codes, counts):
+            self.logger.info(f"apply_domain_rules: {count} rows failed '{self.domain_rules.rules[code].name}'")
 
         return df
 
@@ -260,26 +290,28 @@ class Transformer:
         return True
     
 
-    def normalize(self, df_clean: pd.DataFrame) -> dict:
+    # key_state: {dim name: {natural key: surrogate key}} carried across chunks of a stream or runs.
+    # When given, keys continue from earlier chunks; dim tables still hold every member this batch
+    # references and the returned Normalized.new_members only the ones without a key before.
+    def normalize(self, df_clean: pd.DataFrame, key_state: dict = None) -> "Normalized":
         self.logger.info("normalize: Normalizing DataFrame...")
 
-        df = df_clean.copy()
-        df.columns = [str(c).strip() for c in df.columns]
-
-        normalized_outputs = {}
-
         # Get normalize config from YAML
-        norm_cfg = self.source_config.get("normalize", {})
+        norm_cfg = self.source_config.normalize
         dimensions_cfg = norm_cfg.get("dimensions", [])
         fact_cfg = norm_cfg.get("fact", {})
 
-        # Normalize, apply renaming column names
+        # Apply every dimension's renames in one pass over the column labels
+        rename_all = {}
         for dim_cfg in dimensions_cfg:
-            rename_map = dim_cfg.get("rename", {})
-            if rename_map:
-                df = df.rename(columns=rename_map)
+            rename_all.update(dim_cfg.get("rename", {}))
+        df = df_clean.set_axis([rename_all.get(str(c).strip(), str(c).strip()) for c in df_clean.columns], axis=1)
+        df = df.reset_index(drop=True)
+
+        normalized_outputs = Normalized()
+        key_columns = {}
 
-        # Process each dimension
+        # Process each dimension: group codes give every row its member, no merge back onto the fact frame
         for dim_cfg in dimensions_cfg:
             dim_name = dim_cfg["name"]
             # Columns from the raw df to include in table
@@ -287,40 +319,57 @@ class Transformer:
             rename_map = dim_cfg.get("rename", {})
             # Name of surrogate key column to create for table
             surrogate_key = dim_cfg["surrogate_key"]
+            dtype = dim_cfg.get("dtype", "int32")
             # Columns to track duplicates
             dedupe_on = dim_cfg.get("dedupe_on", source_cols)
 
             # Apply rename to dedupe columns
+            dim_cols = [rename_map.get(c, c) for c in source_cols]
             dedupe_on_renamed = [rename_map.get(c, c) for c in dedupe_on]
 
-            # Extract only the relevant columns for dim table
-            dim_df = df[[rename_map.get(c, c) for c in source_cols]].copy()
-
-            # Drop duplicates and reset index
-            dim_df = dim_df.drop_duplicates(subset=dedupe_on_renamed).reset_index(drop=True)
+            # Member code per row (order of first appearance, NA is its own member)
+            codes = self._group_codes(df, dedupe_on_renamed)
+            _, first_rows = np.unique(codes, return_index=True)
+            dim_df = df.loc[first_rows, dim_cols].reset_index(drop=True)
 
             # Add surrogate key
-            dim_df[surrogate_key] = (dim_df.index + 1).astype(dim_cfg.get("dtype", "int32"))
-
-            # Merge surrogate key back into main df
-            left_keys = [rename_map.get(c, c) for c in source_cols]  # keys in source df
-            right_keys = [rename_map.get(c, c) for c in source_cols]  # keys in dimension df
-            df = df.merge(dim_df[[*right_keys, surrogate_key]], left_on=left_keys, right_on=right_keys, how="left")
-
-            # Save dimension table in dict 
+            if key_state is None:
+                dim_df[surrogate_key] = np.arange(1, len(dim_df) + 1)
+                dim_df[surrogate_key] = dim_df[surrogate_key].astype(dtype)
+                new_members = dim_df
+            else:
+                dim_df, new_members = self._assign_stream_keys(
+                    dim_df, key_state.setdefault(dim_name, {}), dedupe_on_renamed, surrogate_key, dtype
+                )
+
+            row_keys = pd.Series(dim_df[surrogate_key].to_numpy()[codes], dtype=dtype)
+            if dim_cols != dedupe_on_renamed:
+                # Rows whose other columns differ from the member's first row don't map to a key
+                member_rows = df.loc[first_rows[codes], dim_cols].reset_index(drop=True)
+                row_vals = df[dim_cols]
+                same = ((row_vals == member_rows) | (row_vals.isna() & member_rows.isna())).all(axis=1)
+                row_keys = row_keys.astype("Int64").where(same.to_numpy())
+            key_columns[surrogate_key] = row_keys
+
+            # Save dimension table in dict
             normalized_outputs[f"stg_{dim_name}"] = dim_df
+            normalized_outputs.new_members[f"stg_{dim_name}"] = new_members
 
         # Process fact table from source df and dimension tables
         fact_columns_map = fact_cfg.get("columns", {})
-        surrogate_keys = fact_cfg.get("surrogate_keys", [])
+        surrogate_keys = list(fact_cfg.get("surrogate_keys", []))
         safe_numeric = fact_cfg.get("safe_numeric", [])
         float_columns = fact_cfg.get("float_columns", [])
         final_dtypes = fact_cfg.get("final_dtypes", {})
 
         # Combine source fact cols and surrogate keys
-        available_cols = [c for c in list(fact_columns_map.keys()) + surrogate_keys if c in df.columns]
-        stg_fact = df[available_cols].copy()
-        stg_fact = stg_fact.rename(columns=fact_columns_map)
+        fact_data = {}
+        for c in list(fact_columns_map.keys()) + surrogate_keys:
+            if c in key_columns:
+                fact_data[c] = key_columns[c]
+            elif c in df.columns:
+                fact_data[c] = df[c]
+        stg_fact = pd.DataFrame(fact_data).rename(columns=fact_columns_map)
 
         # Safe numeric conversions
         for col in safe_numeric:
@@ -344,4 +393,78 @@ class Transformer:
         self.logger.info(f"normalize: Normalization complete. Tables created: {table_names}")
         self.logger.info("------------------------ Transformations Complete -----------------------")
 
-        return normalized_outputs
\ No newline at end of file
+        return normalized_outputs
+
+
+    @staticmethod
+    def _group_codes(df: pd.DataFrame, cols: list) -> np.ndarray:
+        # 0-based member code per row, numbered in order of first appearance (NA is a member too;
+        # groupby's dropna=False works on every supported pandas, factorize's NA option needs 1.5)
+        return df.groupby(cols, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+
+
+    def _assign_stream_keys(self, dim_df: pd.DataFrame, keys: dict, key_cols: list, surrogate_key: str, dtype: str):
+        # Reuse keys handed out by earlier chunks or runs, number new members after the highest in order of appearance
+        natural = [
+            tuple(None if pd.isna(v) else v for v in row)
+            for row in dim_df[key_cols].itertuples(index=False, name=None)
+        ]
+        is_new = [k not in keys for k in natural]
+        next_key = max(keys.values(), default=0) + 1
+        for k, new in zip(natural, is_new):
+            if new:
+                keys[k] = next_key
+                next_key += 1
+
+        dim_df[surrogate_key] = pd.Series([keys[k] for k in natural], index=dim_df.index).astype(dtype)
+        new_members = dim_df[is_new].reset_index(drop=True)
+        return dim_df, new_members
+
+
+class _ValueCache:
+    # Bounded LRU of raw value -> transformed value for one transformation rule
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.dtype = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def transform(self, uniques: pd.Series, fn) -> pd.Series:
+        # Keys carry the type so 2 and 2.0 (which stringify differently) don't share a result
+        keys = [(type(v), v) for v in uniques.tolist()]
+        na = uniques.isna().to_numpy()
+
+        with self._lock:
+            hit = np.array([not is_na and k in self._data for k, is_na in zip(keys, na)], dtype=bool)
+            computed = fn(uniques[~hit].reset_index(drop=True))
+            if self.dtype is None:
+                self.dtype = computed.dtype
+
+            results, j = [], 0
+            for k, is_hit, is_na in zip(keys, hit, na):
+                if is_hit:
+                    self._data.move_to_end(k)
+                    results.append(self._data[k])
+                    continue
+                value = computed.iloc[j]
+                j += 1
+                results.append(value)
+                if not is_na:
+                    self._data[k] = value
+                    if len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+
+        return pd.Series(pd.array(results, dtype=self.dtype))
+
+
+# Shared across Transformers and runs; a rule's output depends only on the value and the rule
+_VALUE_CACHES = {}
+_VALUE_CACHES_LOCK = threading.Lock()
+
+
+def _value_cache(rule, maxsize: int) -> _ValueCache:
+    key = (rule.get("column"), rule.get("regex_extract"), rule.get("numeric"), bool(rule.get("to_string")), maxsize)
+    with _VALUE_CACHES_LOCK:
+        if key not in _VALUE_CACHES:
+            _VALUE_CACHES[key] = _ValueCache(maxsize)
+        return _VALUE_CACHES[key]
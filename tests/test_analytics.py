@@ -1,3 +1,4 @@
+import pytest
 import pandas as pd
 from src.analytics import SalesAnalytics
 
@@ -73,3 +74,237 @@ def test_daily_sales():
     assert list(df.columns) == ["transaction_date", "total_spent"]
     assert df[df["transaction_date"] == pd.to_datetime("2024-01-01").date()].iloc[0]["total_spent"] == 12
     assert df[df["transaction_date"] == pd.to_datetime("2024-01-02").date()].iloc[0]["total_spent"] == 3
+
+
+def test_cube_has_one_row_per_combination():
+    stg_sales, stg_product, stg_location, stg_payment = sample_data()
+    stg_sales = pd.concat([stg_sales, stg_sales.iloc[[0]]], ignore_index=True)
+    analytics = SalesAnalytics(stg_sales, stg_product, stg_location, stg_payment)
+
+    cube = analytics.cube
+
+    assert list(cube.columns) == ["product_id", "location_id", "payment_id", "transaction_date",
+                                  "total_spent", "num_transactions"]
+    assert len(cube) == 3
+    first = cube[(cube["product_id"] == 3) & (cube["location_id"] == 2)].iloc[0]
+    assert first["total_spent"] == 10 and first["num_transactions"] == 2
+    totals = analytics.totals()
+    assert totals == {"total_spent": 20.0, "num_transactions": 4}
+    assert isinstance(totals["num_transactions"], int)  # shown as "4", not "4.0"
+
+
+def test_frames_are_not_copied_or_modified():
+    stg_sales, stg_product, stg_location, stg_payment = sample_data()
+    analytics = SalesAnalytics(stg_sales, stg_product, stg_location, stg_payment)
+    analytics.daily_sales()
+
+    assert analytics.sales is stg_sales
+    assert stg_sales["transaction_date"].dtype == object  # not re-parsed in place
+
+
+def test_breakdown_detects_labels_and_sums_quantity():
+    stg_sales, _, stg_location, stg_payment = sample_data()
+    stg_sales["quantity"] = [1, 2, 3]
+    products = pd.DataFrame({"product_id": [3, 4, 3], "product_name": ["Coffee", "Bagel", "Coffee"]})
+    analytics = SalesAnalytics(stg_sales, products, stg_location, stg_payment)
+
+    df = analytics.breakdown("product")
+
+    assert list(df.columns) == ["product_name", "total_spent", "total_quantity", "num_transactions"]
+    assert df.to_dict("records")[0] == {"product_name": "Coffee", "total_spent": 8.0, "total_quantity": 4, "num_transactions": 2}
+
+
+def test_daily_summary_counts_transactions():
+    stg_sales, stg_product, stg_location, stg_payment = sample_data()
+    analytics = SalesAnalytics(stg_sales, stg_product, stg_location, stg_payment)
+
+    df = analytics.daily_summary(["total_spent", "num_transactions"])
+
+    assert df["num_transactions"].tolist() == [2, 1]
+    assert df["transaction_date"].tolist() == [pd.Timestamp("2024-01-01").date(), pd.Timestamp("2024-01-02").date()]
+
+
+class FakeNamedCursor:
+    # Server-side cursor stand-in: rows come back in fetchmany batches
+    def __init__(self, results, executed):
+        self.results = results
+        self.executed = executed
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        self.columns, self.rows = result
+        self.description = [(c,) for c in self.columns]
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+def test_from_db_builds_cube_with_sql(monkeypatch):
+    from unittest.mock import MagicMock
+    from datetime import date
+    import src.analytics as analytics_module
+
+    cube_rows = [
+        (3, 2, 1, date(2024, 1, 1), 5.0, 1, 1),
+        (4, 2, 2, date(2024, 1, 1), 7.0, 1, 1),
+        (3, 1, 1, date(2024, 1, 2), 3.0, 1, 1),
+    ]
+    results = [
+        (["product_id", "location_id", "payment_id", "transaction_date", "total_spent", "num_transactions", "total_quantity"], cube_rows),
+        (["product_id", "item"], [(3, "Coffee"), (4, "Bagel")]),
+        (["location_id", "location_type"], [(1, "In-Store"), (2, "Takeaway")]),
+        (["payment_id", "payment_method"], [(1, "Cash"), (2, "Card")]),
+    ]
+    executed, names = [], []
+    conn = MagicMock()
+    conn.__enter__.return_value = conn
+
+    def cursor(name=None):
+        names.append(name)
+        return FakeNamedCursor(results, executed)
+    conn.cursor.side_effect = cursor
+    monkeypatch.setattr(analytics_module, "get_conn", lambda *args, **kwargs: conn)
+    monkeypatch.setattr(analytics_module, "FETCH_SIZE", 2)
+
+    analytics = SalesAnalytics.from_db({}, start=date(2024, 1, 1))
+
+    assert all(names)  # every query through a named cursor
+    # Read from the daily rollup the loader maintains, not the fact table
+    assert "FROM public.agg_daily_sales" in executed[0][0]
+    assert "transaction_date >= %s" in executed[0][0] and executed[0][1] == [date(2024, 1, 1)]
+    assert analytics.sales_by_product().values.tolist() == [["Coffee", 8.0], ["Bagel", 7.0]]
+    assert analytics.sales_by_location().iloc[0]["location_type"] == "Takeaway"
+    daily = analytics.daily_sales()
+    assert daily["total_spent"].tolist() == [12.0, 3.0]
+    assert daily["transaction_date"].tolist() == [date(2024, 1, 1), date(2024, 1, 2)]
+
+
+def test_from_db_falls_back_to_fact_table_without_rollup(monkeypatch):
+    from unittest.mock import MagicMock
+    from datetime import date
+    import psycopg2
+    import src.analytics as analytics_module
+
+    results = [
+        psycopg2.errors.UndefinedTable(),
+        (["product_id", "location_id", "payment_id", "transaction_date", "total_spent", "num_transactions", "total_quantity"],
+         [(3, 2, 1, date(2024, 1, 1), 5.0, 1, 1)]),
+        (["product_id", "item"], [(3, "Coffee")]),
+        (["location_id", "location_type"], [(2, "Takeaway")]),
+        (["payment_id", "payment_method"], [(1, "Cash")]),
+    ]
+    executed = []
+    conn = MagicMock()
+    conn.__enter__.return_value = conn
+    conn.cursor.side_effect = lambda name=None: FakeNamedCursor(results, executed)
+    monkeypatch.setattr(analytics_module, "get_conn", lambda *args, **kwargs: conn)
+
+    analytics = SalesAnalytics.from_db({})
+
+    assert conn.rollback.called
+    assert "GROUP BY 1, 2, 3, 4" in executed[1][0] and "FROM public.stg_sales" in executed[1][0]
+    assert analytics.sales_by_product().values.tolist() == [["Coffee", 5.0]]
+
+
+def test_filter_by_date_range_and_members():
+    stg_sales, stg_product, stg_location, stg_payment = sample_data()
+    analytics = SalesAnalytics(stg_sales, stg_product, stg_location, stg_payment)
+
+    jan_1 = analytics.filter(start="2024-01-01", end="2024-01-02")
+    assert jan_1.sales_by_product().values.tolist() == [["Bagel", 7.0], ["Coffee", 5.0]]
+
+    takeaway_cash = analytics.filter(location="Takeaway", payment=["Cash"])
+    assert takeaway_cash.totals() == {"total_spent": 5.0, "num_transactions": 1}
+
+    # Filters on a view narrow it further; unknown labels match nothing
+    assert analytics.filter(product="Coffee").filter(start="2024-01-02").daily_sales()["total_spent"].tolist() == [3.0]
+    assert analytics.filter(product="Tea").cube.empty
+
+    # The unfiltered reports are unchanged and the index is shared by every view
+    assert analytics.sales_by_product()["total_spent"].tolist() == [8.0, 7.0]
+    assert jan_1._indexes is analytics._indexes
+
+
+def test_transactions_returns_filtered_fact_rows_in_date_order():
+    stg_sales, stg_product, stg_location, stg_payment = sample_data()
+    stg_sales = stg_sales.iloc[::-1]
+    analytics = SalesAnalytics(stg_sales, stg_product, stg_location, stg_payment)
+
+    assert analytics.transactions()["transaction_id"].tolist() == [234, 123, 345]
+    rows = analytics.filter(product="Coffee", end="2024-01-02").transactions()
+    assert rows["transaction_id"].tolist() == [123]
+    assert stg_sales["transaction_id"].tolist() == [345, 234, 123]  # fact table not reordered
+
+
+def trend_data():
+    stg_sales, stg_product, stg_location, stg_payment = sample_data()
+    days = pd.date_range("2024-01-01", "2024-02-15", freq="D")
+    stg_sales = pd.DataFrame({
+        "transaction_id": range(len(days)),
+        "product_id": [3, 4] * (len(days) // 2) + [3] * (len(days) % 2),
+        "location_id": 1,
+        "payment_id": 1,
+        "transaction_date": days,
+        "total_spent": [float(i + 1) for i in range(len(days))],
+    }).drop(index=[10, 11])  # two days without sales
+    return stg_sales, stg_product, stg_location, stg_payment
+
+
+def test_rolling_sales_matches_pandas_rolling():
+    analytics = SalesAnalytics(*trend_data())
+    daily = analytics.sales.set_index("transaction_date")["total_spent"].resample("D").sum()
+
+    df = analytics.rolling_sales(windows=(7, 28))
+
+    assert df["transaction_date"].tolist() == daily.index.tolist()  # gaps filled with zero days
+    assert df["rolling_7d"].tolist() == daily.rolling(7, min_periods=1).sum().tolist()
+    assert df["rolling_28d"].tolist() == daily.rolling(28, min_periods=1).sum().tolist()
+
+    by_product = analytics.rolling_sales(windows=(7,), dimension="product")
+    assert set(by_product["Item"]) == {"Coffee", "Bagel"}
+    last = by_product[by_product["transaction_date"] == by_product["transaction_date"].max()]
+    assert last["rolling_7d"].sum() == df["rolling_7d"].iloc[-1]
+
+
+def test_period_over_period():
+    analytics = SalesAnalytics(*trend_data())
+    daily = analytics.sales.set_index("transaction_date")["total_spent"]
+
+    monthly = analytics.period_over_period("M")
+
+    assert monthly["period"].tolist() == [pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-01")]
+    jan, feb = daily[:"2024-01-31"].sum(), daily["2024-02-01":].sum()
+    assert monthly["total_spent"].tolist() == [jan, feb]
+    assert monthly["change"].iloc[1] == feb - jan
+    assert monthly["pct_change"].iloc[1] == (feb - jan) / jan
+
+    weekly = analytics.period_over_period("W", dimension="location")
+    assert weekly["period"].iloc[0] == pd.Timestamp("2024-01-01")  # weeks start on Monday
+    assert weekly["location_type"].unique().tolist() == ["In-Store"]
+
+
+def test_rolling_window_updates_incrementally():
+    stg_sales, stg_product, stg_location, stg_payment = trend_data()
+    stg_sales = stg_sales[stg_sales["transaction_date"] != "2024-02-10"]  # a day without sales
+    history = stg_sales[stg_sales["transaction_date"] < "2024-02-10"]
+    state = SalesAnalytics(history, stg_product, stg_location, stg_payment).rolling_window((7, 28), dimension="product")
+
+    # Feed the remaining days one at a time and compare with a full recomputation
+    for day, rows in stg_sales[stg_sales["transaction_date"] > "2024-02-10"].groupby("transaction_date"):
+        labels = rows["product_id"].map({3: "Coffee", 4: "Bagel"})
+        current = state.add_day(day, dict(zip(labels, rows["total_spent"])))
+
+    full = SalesAnalytics(stg_sales, stg_product, stg_location, stg_payment).rolling_sales((7, 28), dimension="product")
+    last = full[full["transaction_date"] == full["transaction_date"].max()].set_index("Item")
+    for window in ("rolling_7d", "rolling_28d"):
+        assert current[window].to_dict() == pytest.approx(last[window].to_dict())
+
+    with pytest.raises(ValueError, match="not after"):
+        state.add_day("2024-02-01", {"Coffee": 1.0})
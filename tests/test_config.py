@@ -0,0 +1,60 @@
+import os
+import pickle
+import pytest
+from unittest.mock import patch
+import yaml
+from src.config import ConfigRegistry, SourceConfig
+
+
+def write_config(path, missing_values):
+    path.write_text(yaml.dump({"sources": [{
+        "name": "src",
+        "schema": {"a": "int64"},
+        "cleaning": {"missing_values": missing_values},
+    }]}))
+
+
+def test_registry_parses_once(tmp_path):
+    cfg = tmp_path / "sources.yml"
+    write_config(cfg, ["ERROR"])
+    registry = ConfigRegistry()
+
+    with patch("src.config.yaml.safe_load", wraps=yaml.safe_load) as safe_load:
+        first = registry.source(str(cfg), "src")
+        second = registry.source(str(cfg), "src")
+
+    assert first is second
+    assert safe_load.call_count == 1
+    assert first.cleaning["missing_values"] == ("ERROR",)
+    assert registry.source(str(cfg), "other") is None
+
+
+def test_registry_invalidates_on_change(tmp_path):
+    cfg = tmp_path / "sources.yml"
+    write_config(cfg, ["ERROR"])
+    registry = ConfigRegistry()
+    first = registry.source(str(cfg), "src")
+
+    # Touch only: same content, no re-parse
+    os.utime(cfg, ns=(1, 1))
+    with patch("src.config.yaml.safe_load") as safe_load:
+        assert registry.source(str(cfg), "src") is first
+        safe_load.assert_not_called()
+
+    write_config(cfg, ["ERROR", "UNKNOWN"])
+    assert registry.source(str(cfg), "src").cleaning["missing_values"] == ("ERROR", "UNKNOWN")
+
+
+def test_source_config_is_immutable(tmp_path):
+    cfg = tmp_path / "sources.yml"
+    write_config(cfg, ["ERROR"])
+    source = ConfigRegistry().source(str(cfg), "src")
+
+    with pytest.raises(TypeError):
+        source.schema["b"] = "float"
+    with pytest.raises(AttributeError):
+        source.name = "other"
+
+    restored = pickle.loads(pickle.dumps(source))
+    assert restored == source
+    assert pickle.loads(pickle.dumps(SourceConfig(name="empty"))).name == "empty"
@@ -50,3 +50,82 @@ def test_get_conn_empty_params_connect_called_with_no_arguments():
         
         mock_connect.assert_called_once_with()
         mock_conn.close.assert_called_once()
+
+
+@pytest.fixture
+def fresh_pools():
+    db_conn.close_pools()
+    yield
+    db_conn.close_pools()
+
+
+def _pooled_conn():
+    conn = MagicMock()
+    conn.closed = 0
+    conn.get_transaction_status.return_value = 0  # idle
+    return conn
+
+
+def test_pooled_conn_is_reused(fresh_pools):
+    mock_conn = _pooled_conn()
+
+    with patch("psycopg2.connect", return_value=mock_conn) as mock_connect:
+        for _ in range(3):
+            with db_conn.get_conn(VALID_PARAMS, pooled=True) as conn:
+                assert conn == mock_conn
+
+    mock_connect.assert_called_once()
+    mock_conn.close.assert_not_called()
+
+
+def test_pooled_broken_conn_is_replaced(fresh_pools):
+    first, second = _pooled_conn(), _pooled_conn()
+
+    with patch("psycopg2.connect", side_effect=[first, second]):
+        with db_conn.get_conn(VALID_PARAMS, pooled=True):
+            first.closed = 1  # server went away
+        with db_conn.get_conn(VALID_PARAMS, pooled=True) as conn:
+            assert conn == second
+
+
+def test_pooled_conn_released_after_error(fresh_pools, monkeypatch):
+    monkeypatch.setattr(db_conn, "POOL_MAX_SIZE", 1)
+    mock_conn = _pooled_conn()
+
+    with patch("psycopg2.connect", return_value=mock_conn):
+        with pytest.raises(RuntimeError):
+            with db_conn.get_conn(VALID_PARAMS, pooled=True):
+                raise RuntimeError("Test exception")
+        with db_conn.get_conn(VALID_PARAMS, pooled=True) as conn:  # would block if the slot leaked
+            assert conn == mock_conn
+
+
+def test_session_settings_sent_as_options():
+    with patch("psycopg2.connect", return_value=MagicMock()) as mock_connect:
+        with db_conn.get_conn({"host": "localhost"}, settings={"synchronous_commit": "off", "work_mem": "64MB"}):
+            pass
+
+    mock_connect.assert_called_once_with(host="localhost", options="-c synchronous_commit=off -c work_mem=64MB")
+
+
+def test_pooled_settings_share_one_pool(fresh_pools, monkeypatch):
+    monkeypatch.setattr(db_conn, "POOL_MAX_SIZE", 1)
+    mock_conn = _pooled_conn()
+    cur = mock_conn.cursor.return_value
+
+    with patch("psycopg2.connect", return_value=mock_conn) as mock_connect:
+        with db_conn.get_conn(VALID_PARAMS, pooled=True, settings={"work_mem": "64MB"}):
+            pass
+        with db_conn.get_conn(VALID_PARAMS, pooled=True, settings={"work_mem": "64MB"}):
+            pass
+        # Different settings reuse the same slot instead of opening a second pool
+        with db_conn.get_conn(VALID_PARAMS, pooled=True, settings={"synchronous_commit": "off"}) as conn:
+            assert conn == mock_conn
+
+    mock_connect.assert_called_once()
+    assert "options" not in mock_connect.call_args.kwargs
+    executed = [c.args for c in cur.execute.call_args_list]
+    assert executed == [
+        ("RESET ALL",), ("SELECT set_config(%s, %s, false)", ("work_mem", "64MB")),
+        ("RESET ALL",), ("SELECT set_config(%s, %s, false)", ("synchronous_commit", "off")),
+    ]
@@ -1,4 +1,5 @@
 from src.extract import DataExtractor
+import pytest
 import pandas as pd
 import os
 
@@ -12,3 +13,193 @@ def test_extract_csv(tmp_path):
 
     assert isinstance(df, pd.DataFrame)
     assert list(df.columns) == ["a", "b"]
+
+
+def test_extract_csv_chunked(tmp_path):
+    p = tmp_path / "test.csv"
+    p.write_text("a,b\n1,2\n3,4\n5,6")
+
+    extractor = DataExtractor()
+    chunks = list(extractor.extract(str(p), chunksize=2))
+
+    assert [len(c) for c in chunks] == [2, 1]
+    assert list(chunks[1].columns) == ["a", "b"]
+
+
+def _write_config(tmp_path):
+    cfg = tmp_path / "sources.yml"
+    cfg.write_text(
+        "sources:\n"
+        "  - name: src\n"
+        "    schema: {ID: int64, Item: string, Qty: int64}\n"
+        "    extract: {categorical: [Item]}\n"
+        "    cleaning:\n"
+        "      missing_values: [ERROR]\n"
+        "      transformations:\n"
+        "        - {column: ID, regex_extract: '(\\d+)', numeric: int}\n"
+    )
+    return str(cfg)
+
+
+def test_extract_csv_schema_hints(tmp_path):
+    p = tmp_path / "test.csv"
+    p.write_text("ID,Item,Qty,Extra\nTXN_1,Tea,ERROR,x\nTXN_2,Cake,2,y")
+
+    extractor = DataExtractor(schema_path=_write_config(tmp_path), source_name="src")
+    df = extractor.extract(str(p))
+
+    assert list(df.columns) == ["ID", "Item", "Qty"]
+    assert pd.api.types.is_string_dtype(df["ID"])
+    assert isinstance(df["Item"].dtype, pd.CategoricalDtype)
+    assert df["Qty"].dtype == "float64"
+    assert pd.isna(df.loc[0, "Qty"])
+
+
+def test_extract_csv_schema_hints_fallback(tmp_path):
+    p = tmp_path / "test.csv"
+    p.write_text("ID,Item,Qty\nTXN_1,Tea,abc\nTXN_2,Cake,2")
+
+    extractor = DataExtractor(schema_path=_write_config(tmp_path), source_name="src")
+    df = extractor.extract(str(p))
+    chunks = list(extractor.extract(str(p), chunksize=1))
+
+    assert df.loc[0, "Qty"] == "abc"
+    assert sum(len(c) for c in chunks) == 2
+
+
+def test_extract_csv_engines_match(tmp_path):
+    pytest.importorskip("pyarrow")
+    p = tmp_path / "test.csv"
+    p.write_text("ID,Item,Qty,Extra\nTXN_1,Tea,ERROR,x\nTXN_2,Cake,2,y\nTXN_3,Tea,,z")
+
+    extractor = DataExtractor(schema_path=_write_config(tmp_path), source_name="src")
+    expected = extractor.extract(str(p), engine="c")
+
+    for engine in ("pyarrow", "mmap", "auto"):
+        pd.testing.assert_frame_equal(extractor.extract(str(p), engine=engine), expected)
+
+
+def test_extract_csv_pyarrow_missing_falls_back(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.extract.pa_csv", None)
+    p = tmp_path / "test.csv"
+    p.write_text("a,b\n1,2")
+
+    df = DataExtractor().extract(str(p), engine="pyarrow")
+    assert list(df.columns) == ["a", "b"]
+
+
+def test_extract_csv_unknown_engine(tmp_path):
+    p = tmp_path / "test.csv"
+    p.write_text("a,b\n1,2")
+
+    with pytest.raises(ValueError):
+        DataExtractor().extract(str(p), engine="fast")
+
+
+def test_extract_dir(tmp_path):
+    for i in range(3):
+        (tmp_path / f"shard_{i}.csv").write_text(f"a,b\n{i},x\n{i},y")
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    extractor = DataExtractor()
+    df = extractor.extract_dir(str(tmp_path), max_workers=2)
+
+    assert len(df) == 6
+    assert isinstance(df["source_file"].dtype, pd.CategoricalDtype)
+    assert list(df.groupby("source_file", observed=True)["a"].first()) == [0, 1, 2]
+
+
+def test_extract_dir_iterator(tmp_path):
+    for i in range(3):
+        (tmp_path / f"shard_{i}.csv").write_text(f"a\n{i}")
+
+    frames = list(DataExtractor().extract_dir(str(tmp_path / "shard_*.csv"), concat=False, max_workers=2))
+
+    assert [f["a"].iloc[0] for f in frames] == [0, 1, 2]
+    assert [f["source_file"].iloc[0] for f in frames] == ["shard_0.csv", "shard_1.csv", "shard_2.csv"]
+
+
+def test_extract_dir_no_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        DataExtractor().extract_dir(str(tmp_path))
+
+
+def test_extract_gzip_csv(tmp_path):
+    import gzip
+    p = tmp_path / "test.csv.gz"
+    p.write_bytes(gzip.compress(b"a,b\n1,2\n3,4"))
+
+    extractor = DataExtractor()
+    df = extractor.extract(str(p))
+    chunks = list(extractor.extract(str(p), chunksize=1))
+
+    assert list(df.columns) == ["a", "b"]
+    assert len(chunks) == 2
+
+
+def test_extract_json_lines_chunked(tmp_path):
+    import gzip
+    p = tmp_path / "test.jsonl.gz"
+    p.write_bytes(gzip.compress(b'{"a": 1, "b": "x"}\n{"a": 2, "b": "y"}\n{"a": 3, "b": "z"}\n'))
+
+    chunks = list(DataExtractor().extract(str(p), chunksize=2))
+
+    assert [len(c) for c in chunks] == [2, 1]
+    assert list(chunks[0].columns) == ["a", "b"]
+
+
+def test_extract_zstd_streams_without_zstandard(tmp_path, monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+    # pandas can't open .zst without the optional zstandard package; pyarrow decompresses instead
+    monkeypatch.setattr("src.extract.zstandard", None)
+    csv_path, jsonl_path = tmp_path / "test.csv.zst", tmp_path / "test.jsonl.zst"
+    with pa.output_stream(str(csv_path), compression="zstd") as f:
+        f.write(b"a,b\n1,2\n3,4\n5,6\n")
+    with pa.output_stream(str(jsonl_path), compression="zstd") as f:
+        f.write(b'{"a": 1, "b": "x"}\n{"a": 2, "b": "y"}\n{"a": 3, "b": "z"}\n')
+
+    extractor = DataExtractor()
+    csv_chunks = list(extractor.extract(str(csv_path), chunksize=2))
+    json_chunks = list(extractor.extract(str(jsonl_path), chunksize=2))
+
+    assert [len(c) for c in csv_chunks] == [2, 1]
+    assert csv_chunks[1]["a"].tolist() == [5]
+    assert [len(c) for c in json_chunks] == [2, 1]
+    assert extractor.extract(str(csv_path), engine="c")["b"].tolist() == [2, 4, 6]
+    assert extractor.extract(str(jsonl_path))["b"].tolist() == ["x", "y", "z"]
+
+
+def test_extract_json_document_cannot_stream(tmp_path):
+    p = tmp_path / "test.json"
+    p.write_text('[{"a": 1}]')
+
+    extractor = DataExtractor()
+    assert len(extractor.extract(str(p))) == 1
+    with pytest.raises(ValueError):
+        extractor.extract(str(p), chunksize=1)
+
+
+def test_extract_parquet_and_arrow_in_chunks(tmp_path):
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"a": [1, 2, 3, 4, 5], "b": list("vwxyz")})
+    df.to_parquet(tmp_path / "test.parquet", row_group_size=2)
+    df.to_feather(tmp_path / "test.arrow")
+
+    extractor = DataExtractor()
+    for name in ("test.parquet", "test.arrow"):
+        chunks = list(extractor.extract(str(tmp_path / name), chunksize=2, filters=[("a", ">", 1)]))
+        assert all(len(c) <= 2 for c in chunks)
+        assert pd.concat(chunks)["a"].tolist() == [2, 3, 4, 5]
+
+
+def test_extract_parquet_and_arrow_pushdown(tmp_path):
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    df.to_parquet(tmp_path / "test.parquet")
+    df.to_feather(tmp_path / "test.arrow")
+
+    extractor = DataExtractor()
+    for name in ("test.parquet", "test.arrow"):
+        out = extractor.extract(str(tmp_path / name), columns=["a"], filters=[("a", ">", 1)])
+        assert list(out.columns) == ["a"]
+        assert list(out["a"]) == [2, 3]
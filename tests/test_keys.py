@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+import yaml
+from unittest.mock import MagicMock
+from src import keys
+from src.keys import FileKeyStore, DbKeyStore, KeyRegistry, open_key_registry
+from src.transform import Transformer
+
+DIMS = {"product": {"target": "public.stg_product", "natural": ["item"], "surrogate_key": "product_id"}}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    keys.clear_cache()
+    yield
+    keys.clear_cache()
+
+
+@pytest.fixture
+def sample_clean_df():
+    return pd.DataFrame({
+        "Transaction ID": [1, 2, 3],
+        "Item": pd.array(["Coffee", "Tea", None], dtype="string"),
+        "Quantity": [1, 2, 3],
+        "Total Spent": [2.0, 3.0, 4.5],
+        "Payment Method": pd.array(["Cash", "Card", "Cash"], dtype="string"),
+        "Location": pd.array(["In-store", "Takeaway", None], dtype="string"),
+        "Transaction Date": pd.array(["2023-01-01", "2023-01-02", "2023-01-03"], dtype="string"),
+    })
+
+
+def test_file_store_round_trip(tmp_path):
+    path = tmp_path / "keys" / "cafe.json"
+    registry = KeyRegistry(FileKeyStore(str(path)), DIMS)
+    registry["product"][("Coffee",)] = 1
+    registry["product"][(None,)] = 2
+    registry.commit()
+
+    keys.clear_cache()
+    reloaded = KeyRegistry(FileKeyStore(str(path)), DIMS)
+    assert reloaded["product"] == {("Coffee",): 1, (None,): 2}
+
+
+def test_uncommitted_keys_not_shared(tmp_path):
+    store = FileKeyStore(str(tmp_path / "k.json"))
+    first = KeyRegistry(store, DIMS)
+    first["product"][("Coffee",)] = 1
+
+    assert KeyRegistry(store, DIMS)["product"] == {}
+    first.commit()
+    assert KeyRegistry(store, DIMS)["product"] == {("Coffee",): 1}
+
+
+def test_db_store_reads_dimension_tables(monkeypatch):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.fetchall.return_value = [("Coffee", 4), ("Tea", 9)]
+    get_conn = MagicMock()
+    get_conn.return_value.__enter__.return_value = conn
+    monkeypatch.setattr("src.keys.get_conn", get_conn)
+
+    registry = KeyRegistry(DbKeyStore({"host": "h"}), DIMS)
+
+    cursor.execute.assert_called_once_with("SELECT item, product_id FROM public.stg_product")
+    assert registry["product"] == {("Coffee",): 4, ("Tea",): 9}
+
+    KeyRegistry(DbKeyStore({"host": "h"}), DIMS)  # served from the in-memory cache
+    assert get_conn.call_count == 1
+
+
+def test_normalize_reuses_registered_keys(tmp_path, sample_clean_df):
+    source = yaml.safe_load(open("config/sources.yml"))["sources"][0]
+    source["normalize"]["key_registry"] = {"backend": "file", "path": str(tmp_path / "keys.json")}
+    config_path = tmp_path / "sources.yml"
+    config_path.write_text(yaml.safe_dump({"sources": [source]}))
+
+    transformer = Transformer(schema_path=str(config_path))
+    first_run = open_key_registry(str(config_path), "dirty_cafe_sales")
+    first = transformer.normalize(sample_clean_df, key_state=first_run)
+    first_run.commit()
+
+    second_df = sample_clean_df.assign(Item=pd.array(["Cake", "Tea", "Coffee"], dtype="string"))
+    second = transformer.normalize(second_df, key_state=open_key_registry(str(config_path), "dirty_cafe_sales"))
+
+    assert first["stg_product"]["product_id"].tolist() == [1, 2, 3]
+    assert second["stg_product"]["Item"].tolist() == ["Cake", "Tea", "Coffee"]  # every referenced member
+    assert second["stg_product"]["product_id"].tolist() == [4, 2, 1]
+    assert second.new_members["stg_product"]["Item"].tolist() == ["Cake"]  # only the new member is loaded
+    assert second.new_members["stg_product"]["product_id"].tolist() == [4]
+    assert second["stg_sales"]["product_id"].tolist() == [4, 2, 1]
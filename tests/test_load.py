@@ -2,11 +2,21 @@ import pandas as pd
 import pytest
 from unittest.mock import MagicMock, patch
 from io import StringIO
+from datetime import datetime
 import yaml
 from src.load import Loader
+from src.catalog import clear_catalogs
 
 logger = MagicMock()
 
+
+@pytest.fixture(autouse=True)
+def empty_catalog():
+    # Tables created by one test must not be "known" to the next
+    clear_catalogs()
+    yield
+    clear_catalogs()
+
 @pytest.fixture
 def fake_conn():
     conn = MagicMock()
@@ -18,6 +28,8 @@ def fake_conn():
 
     cursor.__enter__.return_value = cursor
     cursor.__exit__.return_value = False
+    # No column types unless a test sets them: COPY then uses CSV
+    cursor.description = []
 
     return conn
 
@@ -82,11 +94,28 @@ def test_sanitize_various_numpy_types():
         "s": ["ok"]
     })
     out = loader._sanitize(df)
-    assert isinstance(out.loc[0, "i"], int)
-    assert isinstance(out.loc[0, "f"], float)
-    assert isinstance(out.loc[0, "b"], bool)
+    assert out["i"].dtype == "int64" and out["f"].dtype == "float64" and out["b"].dtype == "bool"
     assert out.loc[0, "s"] == "ok"
 
+    row = next(iter(loader._rows(out)))
+    assert isinstance(row[0], int)
+    assert isinstance(row[1], float)
+    assert isinstance(row[2], bool)
+    assert row[3] == "ok"
+
+
+def test_rows_converts_missing_and_datetimes():
+    loader = Loader(logger, conn_params={})
+    df = pd.DataFrame({
+        "d": pd.to_datetime(["2020-01-01", None]),
+        "n": pd.array([1, None], dtype="Int64"),
+        "s": ["x", " Unknown "],
+    })
+    rows = list(loader._rows(loader._sanitize(df)))
+    assert rows[0] == (datetime(2020, 1, 1), 1, "x")
+    assert type(rows[0][0]) is datetime
+    assert rows[1] == (None, None, None)
+
 
 def test_create_table(fake_conn):
     loader = Loader(logger, conn_params={})
@@ -196,4 +225,626 @@ def test_load_from_yaml_missing_source(tmp_path):
         yaml.dump(yaml_content, f)
     loader = Loader(logger, conn_params={})
     with pytest.raises(ValueError):
-        loader.load_from_yaml({}, pd.DataFrame(), "missing_source", str(yaml_path))
\ No newline at end of file
+        loader.load_from_yaml({}, pd.DataFrame(), "missing_source", str(yaml_path))
+
+def test_write_parquet_partitioned(tmp_path):
+    pytest.importorskip("pyarrow")
+    loader = Loader(logger, conn_params={})
+    sales = pd.DataFrame({
+        "transaction_id": [1, 2, 3],
+        "total_spent": [1.0, 2.0, 3.0],
+        "transaction_date": pd.to_datetime(["2024-01-05", "2024-01-20", "2024-02-01"]),
+    })
+    rejects = pd.DataFrame({"transaction_id": [9], "reason": ["bad"]})
+
+    loader.write_parquet({"stg_sales": sales}, rejects, str(tmp_path),
+                         partition_by={"column": "transaction_date", "granularity": "month"})
+
+    assert sorted(p.name for p in (tmp_path / "stg_sales").iterdir()) == \
+        ["transaction_date_month=2024-01", "transaction_date_month=2024-02"]
+    jan = pd.read_parquet(tmp_path / "stg_sales", filters=[("transaction_date_month", "=", "2024-01")])
+    assert sorted(jan["transaction_id"]) == [1, 2]
+    assert len(pd.read_parquet(tmp_path / "rejected")) == 1
+
+    # Overwrite replaces, append adds
+    loader.write_parquet({"stg_sales": sales}, rejects, str(tmp_path))
+    loader.write_parquet({"stg_sales": sales}, rejects, str(tmp_path), mode="append")
+    assert len(pd.read_parquet(tmp_path / "stg_sales")) == 6
+
+
+@pytest.mark.parametrize("step", ["load_from_yaml", "prepare_bulk_load", "finish_bulk_load"])
+def test_unknown_source_is_a_clear_error(step, sample_yaml):
+    loader = Loader(logger, conn_params={})
+    args = ({}, pd.DataFrame()) if step == "load_from_yaml" else ()
+
+    with pytest.raises(ValueError, match="missing load rules for source 'nope'"):
+        getattr(loader, step)(*args, "nope", str(sample_yaml))
+
+
+@patch("src.load.get_conn")
+def test_yaml_loader_writes_output(mock_get_conn, fake_conn, tmp_path):
+    mock_get_conn.return_value = fake_conn
+    yaml_file = tmp_path / "config.yaml"
+    yaml_file.write_text(yaml.dump({"sources": [{
+        "name": "test_source",
+        "load": {
+            "output": {"path": str(tmp_path / "out"), "compression": "snappy"},
+            "tables": [{"df_key": "stg_product", "target": "public.stg_product", "pk": "product_id"}],
+        },
+    }]}))
+    loader = Loader(logger, conn_params={})
+    loader.write_parquet = MagicMock()
+
+    normalized_dict = {"stg_product": pd.DataFrame({"product_id": [1], "name": ["A"]})}
+    loader.load_from_yaml(normalized_dict, pd.DataFrame(), "test_source", str(yaml_file))
+
+    loader.write_parquet.assert_called_once()
+    assert loader.write_parquet.call_args.kwargs["out_dir"] == str(tmp_path / "out")
+    assert loader.write_parquet.call_args.kwargs["compression"] == "snappy"
+
+
+@patch("src.load.get_conn")
+def test_yaml_loader_loads_new_members_and_outputs_full_dimensions(mock_get_conn, fake_conn, tmp_path):
+    from src.transform import Normalized
+    mock_get_conn.return_value = fake_conn
+    yaml_file = tmp_path / "config.yaml"
+    yaml_file.write_text(yaml.dump({"sources": [{
+        "name": "test_source",
+        "load": {
+            "output": {"path": str(tmp_path / "out")},
+            "tables": [{"df_key": "stg_product", "target": "public.stg_product", "pk": "product_id"}],
+        },
+    }]}))
+    loader = Loader(logger, conn_params={})
+    loader.load = MagicMock()
+    loader.write_parquet = MagicMock()
+
+    def chunk(ids, new):
+        product = pd.DataFrame({"product_id": ids, "name": [f"P{i}" for i in ids]})
+        return Normalized({"stg_product": product}, new_members={"stg_product": product[product["product_id"].isin(new)]})
+
+    loader.load_from_yaml(chunk([1, 2], new=[2]), pd.DataFrame(), "test_source", str(yaml_file))
+    loader.load_from_yaml(chunk([2, 3], new=[3]), pd.DataFrame(), "test_source", str(yaml_file), output_mode="append")
+
+    assert [c.kwargs["df"]["product_id"].tolist() for c in loader.load.call_args_list] == [[2], [3]]
+    written = [c.args[0]["stg_product"]["product_id"].tolist() for c in loader.write_parquet.call_args_list]
+    assert written == [[1, 2], [3]]  # appended chunks don't repeat members already written
+
+
+@patch("src.load.get_conn")
+def test_loader_merge_stages_and_merges_in_batches(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    cursor.rowcount = 2
+    loader = Loader(logger, conn_params={})
+    df = pd.DataFrame({"id": [1, 2, 3, 1], "name": ["A", "B", "C", "A2"]})
+
+    loader.load(df, "public.stg_product", conflict_cols=["id"], strategy="merge", batch_size=2)
+
+    copies = [c.args[0] for c in cursor.copy_expert.call_args_list]
+    assert copies == ["COPY _stage_stg_product (id, name) FROM STDIN WITH CSV NULL ''"] * 2
+    assert cursor.copy_expert.call_args_list[1].args[1].getvalue() == "3,C\n1,A2\n"
+    sql = [c.args[0] for c in cursor.execute.call_args_list]
+    assert any("CREATE TEMP TABLE _stage_stg_product (LIKE public.stg_product" in q for q in sql)
+    merges = [q for q in sql if "ON CONFLICT (id)" in q]
+    assert len(merges) == 2
+    assert "DISTINCT ON (id)" in merges[0] and "IS DISTINCT FROM (EXCLUDED.name)" in merges[0]
+    cursor.executemany.assert_not_called()
+    fake_conn.commit.assert_called()
+
+
+def test_loader_unknown_strategy():
+    loader = Loader(logger, conn_params={})
+    with pytest.raises(ValueError):
+        loader.load(pd.DataFrame({"id": [1]}), "public.t", conflict_cols=["id"], strategy="bogus")
+
+
+@patch("src.load.get_conn")
+def test_yaml_loader_passes_strategy(mock_get_conn, fake_conn, tmp_path):
+    mock_get_conn.return_value = fake_conn
+    yaml_file = tmp_path / "config.yaml"
+    yaml_file.write_text(yaml.dump({"sources": [{
+        "name": "test_source",
+        "load": {"tables": [{"df_key": "stg_product", "target": "public.stg_product", "pk": "product_id",
+                             "strategy": "merge", "batch_size": 500}]},
+    }]}))
+    loader = Loader(logger, conn_params={})
+    loader.load = MagicMock()
+
+    loader.load_from_yaml({"stg_product": pd.DataFrame({"product_id": [1]})}, pd.DataFrame(), "test_source", str(yaml_file))
+
+    assert loader.load.call_args.kwargs["strategy"] == "merge"
+    assert loader.load.call_args.kwargs["batch_size"] == 500
+
+
+@patch("src.load.get_conn")
+def test_loader_copy_binary_when_types_known(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    cursor.description = [("col1", 20), ("col2", 25)]  # bigint, text
+    loader = Loader(logger, conn_params={})
+
+    loader.load(pd.DataFrame({"col1": [1, 2], "col2": ["x", None]}), "public.stg_sales", conflict_cols=None)
+
+    statement, stream = cursor.copy_expert.call_args.args
+    assert statement == "COPY public.stg_sales FROM STDIN WITH (FORMAT binary)"
+    assert stream.read(-1).startswith(b"PGCOPY\n\xff\r\n\x00")
+
+
+@patch("src.load.get_conn")
+def test_loader_copy_falls_back_to_csv(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    cursor.description = [("col1", 114)]  # json has no binary encoder
+    loader = Loader(logger, conn_params={})
+
+    loader.load(pd.DataFrame({"col1": ['{"a": 1}']}), "public.stg_sales", conflict_cols=None)
+
+    assert cursor.copy_expert.call_args.args[0] == "COPY public.stg_sales FROM STDIN WITH CSV NULL ''"
+
+
+def _graph_jobs():
+    sales = pd.DataFrame({"transaction_id": [1], "product_id": [1], "location_id": [1]})
+    return {
+        "stg_product": ({"name": "stg_product", "pk": "product_id"}, pd.DataFrame({"product_id": [1], "Item": ["Tea"]})),
+        "stg_location": ({"name": "stg_location", "pk": "location_id"}, pd.DataFrame({"location_id": [1]})),
+        "stg_sales": ({"name": "stg_sales", "pk": "transaction_id"}, sales),
+        "rejected": ({"name": "rejected", "pk": "transaction_id"}, pd.DataFrame({"transaction_id": [2], "reason": ["bad"]})),
+    }
+
+
+def test_load_dependencies_dimensions_before_facts():
+    deps = Loader._load_dependencies(_graph_jobs())
+    assert deps == {"stg_product": set(), "stg_location": set(), "stg_sales": {"stg_product", "stg_location"}, "rejected": set()}
+
+
+def test_load_graph_runs_independent_tables_concurrently():
+    import threading, time
+    loader = Loader(logger, conn_params={})
+    jobs = _graph_jobs()
+    lock, active, events = threading.Lock(), [0], []
+
+    def load_fn(t, df):
+        with lock:
+            active[0] += 1
+            events.append(("start", t["name"], active[0]))
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+            events.append(("end", t["name"], active[0]))
+
+    loader._run_load_graph(jobs, loader._load_dependencies(jobs), load_fn)
+
+    assert max(n for kind, _, n in events if kind == "start") == 3  # both dimensions and rejects together
+    sales_start = events.index(next(e for e in events if e[:2] == ("start", "stg_sales")))
+    dims_end = [i for i, e in enumerate(events) if e[0] == "end" and e[1] in ("stg_product", "stg_location")]
+    assert max(dims_end) < sales_start
+
+
+def test_load_graph_skips_dependents_of_failed_table():
+    loader = Loader(logger, conn_params={})
+    jobs = _graph_jobs()
+    loaded = []
+
+    def load_fn(t, df):
+        if t["name"] == "stg_product":
+            raise RuntimeError("boom")
+        loaded.append(t["name"])
+
+    with pytest.raises(RuntimeError):
+        loader._run_load_graph(jobs, loader._load_dependencies(jobs), load_fn)
+    assert sorted(loaded) == ["rejected", "stg_location"]
+
+
+@patch("src.load.get_conn")
+def test_load_splits_large_merge_into_streams(mock_get_conn, fake_conn, monkeypatch):
+    mock_get_conn.return_value = fake_conn
+    monkeypatch.setattr("src.load.MIN_STREAM_ROWS", 1)
+    loader = Loader(logger, conn_params={})
+    merged = []
+    loader._merge = lambda conn, df, *args: merged.append(sorted(df["id"]))
+    df = pd.DataFrame({"id": [1, 2, 3, 4, 5, 6, 1], "v": range(7)})
+
+    loader.load(df, "public.t", conflict_cols=["id"], strategy="merge", streams=3)
+
+    assert sorted(k for part in merged for k in part) == [1, 1, 2, 3, 4, 5, 6]
+    assert any(part.count(1) == 2 for part in merged)  # duplicate keys stay in one stream
+    assert len(merged) > 1
+
+
+def test_infer_pg_type_hints():
+    loader = Loader(logger, conn_params={})
+    int_dtype = pd.Series([1]).dtype
+    assert loader._infer_pg_type(int_dtype, "int32") == "INTEGER"
+    assert loader._infer_pg_type(int_dtype, "int16") == "SMALLINT"
+    assert loader._infer_pg_type(pd.Series([1.5]).dtype, "money") == "NUMERIC(10,2)"
+    assert loader._infer_pg_type(pd.to_datetime(["2020-01-01"]).dtype, "date") == "DATE"
+    assert loader._infer_pg_type(int_dtype, "NUMERIC(12,4)") == "NUMERIC(12,4)"
+
+
+def test_schema_column_types_from_config():
+    from src.config import get_source_config
+    types = Loader._schema_column_types(get_source_config("config/sources.yml", "dirty_cafe_sales"))
+    assert types["stg_product"] == {"product_id": "int32"}
+    assert types["stg_sales"]["location_id"] == "int32"
+    assert types["stg_sales"]["transaction_date"] == "date"
+
+
+def test_ensure_table_uses_catalog(fake_conn):
+    cursor = fake_conn.cursor.return_value
+    cursor.fetchall.return_value = [("public", "stg_product", "product_id", "integer"), ("public", "stg_product", "item", "text")]
+    loader = Loader(logger, conn_params={})
+    df = pd.DataFrame({"product_id": [1], "item": ["Tea"]})
+
+    loader._ensure_table(fake_conn, df, "public.stg_product", "product_id", {"product_id": "int32"})
+    loader._ensure_table(fake_conn, df, "public.stg_product", "product_id", {"product_id": "int32"})
+
+    statements = [c.args[0] for c in cursor.execute.call_args_list]
+    assert sum("information_schema" in q for q in statements) == 1  # introspected once
+    assert not any("CREATE TABLE" in q for q in statements)  # known table, no DDL
+
+    with pytest.raises(ValueError, match="has no columns"):
+        loader._ensure_table(fake_conn, df.assign(extra=1), "public.stg_product", "product_id")
+
+
+def test_ensure_table_creates_unknown_table_once(fake_conn):
+    cursor = fake_conn.cursor.return_value
+    cursor.fetchall.return_value = []
+    loader = Loader(logger, conn_params={})
+    df = pd.DataFrame({"product_id": [1], "item": ["Tea"]})
+
+    for _ in range(2):
+        loader._ensure_table(fake_conn, df, "public.stg_product", "product_id", {"product_id": "int32"})
+
+    creates = [c.args[0] for c in cursor.execute.call_args_list if "CREATE TABLE" in c.args[0]]
+    assert len(creates) == 1
+    assert '"product_id" INTEGER' in creates[0]
+
+
+@patch("src.load.get_conn")
+def test_row_hash_sends_only_changed_rows(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    loader = Loader(logger, conn_params={})
+    df = pd.DataFrame({"id": [1, 2, 3], "name": ["A", "B", "C"]})
+    hashes = loader._row_hashes(loader._sanitize(df))
+
+    # Table known to the catalog; id 1 unchanged, id 2 changed, id 3 new
+    cursor.fetchall.side_effect = [
+        [("public", "t", "id", "bigint"), ("public", "t", "name", "text"), ("public", "t", "row_hash", "bigint")],
+        [(1, int(hashes[0])), (2, int(hashes[1]) + 1)],
+    ]
+    sent = []
+    loader._merge = lambda conn, frame, *args: sent.append(frame)
+
+    loader.load(df, "public.t", conflict_cols=["id"], strategy="merge", row_hash=True)
+
+    lookup = [c for c in cursor.execute.call_args_list if "ANY(%s)" in c.args[0]]
+    assert lookup[0].args[1] == ([1, 2, 3],)
+    assert sent[0]["id"].tolist() == [2, 3]
+    assert "row_hash" in sent[0].columns
+
+
+def test_row_hashes_are_stable_and_content_based():
+    loader = Loader(logger, conn_params={})
+    a = loader._row_hashes(pd.DataFrame({"id": [1, 2], "name": ["A", "B"]}))
+    b = loader._row_hashes(pd.DataFrame({"id": [1, 2], "name": ["A", "X"]}))
+    assert a[0] == b[0] and a[1] != b[1]
+    assert a.dtype == "int64"
+
+
+def test_create_partitioned_table_includes_partition_column_in_pk(fake_conn):
+    cursor = fake_conn.cursor.return_value
+    loader = Loader(logger, conn_params={})
+    df = pd.DataFrame({"transaction_id": ["T1"], "transaction_date": pd.to_datetime(["2023-01-05"])})
+
+    loader._create_table_if_not_exists(fake_conn, df, "public.stg_sales", primary_key="transaction_id",
+                                       partition_by="transaction_date")
+
+    sql = cursor.execute.call_args.args[0]
+    assert "PRIMARY KEY (transaction_id, transaction_date)" in sql
+    assert "PARTITION BY RANGE (transaction_date)" in sql
+
+
+def test_month_ranges():
+    dates = pd.Series(pd.to_datetime(["2023-12-31", "2023-01-05", "2023-01-20"]))
+    assert Loader._month_ranges(dates) == [
+        ("p2023_01", datetime(2023, 1, 1).date(), datetime(2023, 2, 1).date()),
+        ("p2023_12", datetime(2023, 12, 1).date(), datetime(2024, 1, 1).date()),
+    ]
+
+
+PARENT_INDEXES = [
+    (True, "CREATE UNIQUE INDEX stg_sales_pkey ON ONLY public.stg_sales USING btree (transaction_id, transaction_date)"),
+    (False, "CREATE INDEX stg_sales_product_id_idx ON ONLY public.stg_sales USING btree (product_id)"),
+]
+
+
+def partitioned_sales_cursor(cursor, columns, tables=()):
+    # Catalog rows for stg_sales (and other existing tables), the parent's index definitions for the index query
+    catalog = [("public", "stg_sales", c, "bigint") for c in columns] + [("public", t, "id", "bigint") for t in tables]
+    cursor.fetchall.side_effect = lambda: PARENT_INDEXES if "pg_index" in cursor.execute.call_args.args[0] else catalog
+
+
+@patch("src.load.get_conn")
+def test_partition_replace_swaps_each_month(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    partitioned_sales_cursor(cursor, ["transaction_id", "transaction_date", "product_id"])
+    cursor.fetchone.side_effect = [(True,), (True,), (False,)]  # partitioned; Jan exists, Feb doesn't
+    loader = Loader(logger, conn_params={})
+    loader._copy = MagicMock(return_value="binary")
+    df = pd.DataFrame({
+        "transaction_id": ["T1", "T2", "T3", "T2"],
+        "product_id": [1, 2, 3, 2],
+        "transaction_date": pd.to_datetime(["2023-01-05", "2023-01-20", "2023-02-01", "2023-01-20"]),
+    })
+
+    loader.load(df, "public.stg_sales", conflict_cols=["transaction_id"], strategy="partition_replace",
+                partition_by="transaction_date")
+
+    statements = [c.args[0] for c in cursor.execute.call_args_list]
+    jan = [q for q in statements if "p2023_01" in q]
+    assert jan[1].startswith("CREATE TABLE public.stg_sales_p2023_01_new (LIKE public.stg_sales")
+    assert "CHECK (transaction_date IS NOT NULL" in jan[3]
+    # The parent's indexes are built on the new table, so ATTACH adopts them
+    assert jan[4:7] == [
+        "CREATE UNIQUE INDEX stg_sales_p2023_01_new_0 ON public.stg_sales_p2023_01_new USING btree (transaction_id, transaction_date);",
+        "ALTER TABLE public.stg_sales_p2023_01_new ADD CONSTRAINT stg_sales_p2023_01_new_0 PRIMARY KEY USING INDEX stg_sales_p2023_01_new_0;",
+        "CREATE INDEX stg_sales_p2023_01_new_1 ON public.stg_sales_p2023_01_new USING btree (product_id);",
+    ]
+    # Keys stored under months not being replaced are removed from there
+    assert jan[7].startswith("DELETE FROM public.stg_sales t USING public.stg_sales_p2023_01_new p "
+                             "WHERE t.transaction_id = p.transaction_id AND NOT (")
+    assert jan[8:] == [
+        "ALTER TABLE public.stg_sales DETACH PARTITION public.stg_sales_p2023_01;",
+        "DROP TABLE public.stg_sales_p2023_01;",
+        "ALTER TABLE public.stg_sales_p2023_01_new RENAME TO stg_sales_p2023_01;",
+        "ALTER INDEX public.stg_sales_p2023_01_new_0 RENAME TO stg_sales_p2023_01_0;",
+        "ALTER INDEX public.stg_sales_p2023_01_new_1 RENAME TO stg_sales_p2023_01_1;",
+        "ALTER TABLE public.stg_sales ATTACH PARTITION public.stg_sales_p2023_01 FOR VALUES FROM (%s) TO (%s);",
+    ]
+    feb = [q for q in statements if "p2023_02" in q]
+    assert not any("DETACH" in q for q in feb)
+
+    # All the building happens before the parent is locked for the swap
+    first_detach = next(i for i, q in enumerate(statements) if "DETACH" in q)
+    assert max(i for i, q in enumerate(statements) if "INDEX" in q and q.startswith("CREATE")) < first_detach
+
+    # Duplicate key within January loaded once
+    loaded = {c.args[2]: c.args[1] for c in loader._copy.call_args_list}
+    assert loaded["public.stg_sales_p2023_01_new"]["transaction_id"].tolist() == ["T1", "T2"]
+    assert loaded["public.stg_sales_p2023_02_new"]["transaction_id"].tolist() == ["T3"]
+
+
+@patch("src.load.get_conn")
+def test_partition_replace_needs_partitioned_table(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    cursor.fetchall.return_value = [("public", "stg_sales", "transaction_id", "text"),
+                                    ("public", "stg_sales", "transaction_date", "date")]
+    cursor.fetchone.return_value = (False,)
+    df = pd.DataFrame({"transaction_id": ["T1"], "transaction_date": pd.to_datetime(["2023-01-05"])})
+
+    with pytest.raises(ValueError, match="not partitioned"):
+        Loader(logger, conn_params={}).load(df, "public.stg_sales", conflict_cols=["transaction_id"],
+                                            strategy="partition_replace", partition_by="transaction_date")
+
+
+@patch("src.load.get_conn")
+def test_merge_into_partitioned_table_creates_missing_partitions(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    cursor.fetchall.return_value = []
+    loader = Loader(logger, conn_params={})
+    merged = []
+    loader._merge = lambda conn, frame, table, conflict_cols, *args: merged.append(conflict_cols)
+    df = pd.DataFrame({"transaction_id": ["T1", "T2"], "transaction_date": pd.to_datetime(["2023-01-05", "2023-03-01"])})
+
+    for _ in range(2):
+        loader.load(df, "public.stg_sales", conflict_cols=["transaction_id"], strategy="merge",
+                    partition_by="transaction_date")
+
+    creates = [c for c in cursor.execute.call_args_list if "PARTITION OF" in c.args[0]]
+    assert [c.args[0].split()[5] for c in creates] == ["public.stg_sales_p2023_01", "public.stg_sales_p2023_03"]
+    assert merged[0] == ["transaction_id", "transaction_date"]
+
+
+@patch("src.load.get_conn")
+def test_streams_create_partitions_once_before_fanning_out(mock_get_conn, fake_conn, monkeypatch):
+    monkeypatch.setattr("src.load.MIN_STREAM_ROWS", 1)
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    cursor.fetchall.return_value = [("public", "stg_sales", c, "bigint") for c in ("transaction_id", "transaction_date")]
+    cursor.fetchone.return_value = (True,)  # partitioned
+    events = []
+    cursor.execute.side_effect = lambda sql, *args: events.append(sql.split()[5]) if "PARTITION OF" in sql else None
+    loader = Loader(logger, conn_params={})
+    loader.load = MagicMock(side_effect=lambda *args, **kwargs: events.append("stream"))
+    df = pd.DataFrame({"Transaction ID": [f"T{i}" for i in range(8)],
+                       "Transaction Date": pd.to_datetime(["2023-01-05", "2023-03-01"] * 4)})
+
+    loader._load_streams(df, "public.stg_sales", ["transaction_id"], True, 4, strategy="merge",
+                         partition_by="transaction_date")
+
+    assert mock_get_conn.call_count == 1  # one connection, before any stream starts
+    assert events[:2] == ["public.stg_sales_p2023_01", "public.stg_sales_p2023_03"]
+    assert events[2:] == ["stream"] * 4
+
+
+def test_merge_into_partitioned_table_moves_changed_dates(fake_conn):
+    cursor = fake_conn.cursor.return_value
+    cursor.rowcount = 1
+    loader = Loader(logger, conn_params={})
+    loader._copy = MagicMock(return_value="binary")
+    df = pd.DataFrame({"transaction_id": ["T1"], "product_id": [4], "total_spent": [3.0],
+                       "transaction_date": pd.to_datetime(["2023-02-01"])})
+
+    loader._merge(fake_conn, df, "public.stg_sales", ["transaction_id", "transaction_date"], moved_from="transaction_date")
+
+    merge = next(c.args[0] for c in cursor.execute.call_args_list if "ON CONFLICT" in c.args[0])
+    # A corrected date replaces the stored row instead of adding a second one under the old month
+    assert "DELETE FROM public.stg_sales t USING (" in merge
+    assert "WHERE t.transaction_id = s.transaction_id AND t.transaction_date <> s.transaction_date;" in merge
+    assert merge.index("DELETE") < merge.index("INSERT INTO public.stg_sales")
+    assert "SELECT DISTINCT ON (transaction_id) transaction_id, product_id, total_spent, transaction_date" in merge
+    assert "ON CONFLICT (transaction_id, transaction_date)" in merge
+
+    cursor.fetchone.return_value = (1,)
+    loader._merge(fake_conn, df, "public.stg_sales", ["transaction_id", "transaction_date"],
+                  rollup=ROLLUP, moved_from="transaction_date")
+    merge = next(c.args[0] for c in reversed(cursor.execute.call_args_list) if "upserted" in c.args[0])
+    assert "moved AS (" in merge and "-1 FROM moved o" in merge
+
+
+def test_index_specs():
+    specs = Loader._index_specs({"target": "public.stg_sales", "indexes": ["product_id", ["location_id", "transaction_date"]]})
+    assert specs == [
+        ("stg_sales_product_id_idx", ["product_id"]),
+        ("stg_sales_location_id_transaction_date_idx", ["location_id", "transaction_date"]),
+    ]
+
+
+@patch("src.load.get_conn")
+def test_build_indexes_concurrently_in_autocommit(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    cursor.fetchone.return_value = (False,)  # not partitioned
+    autocommit = []
+    cursor.execute.side_effect = lambda *args: autocommit.append(fake_conn.autocommit)
+    loader = Loader(logger, conn_params={})
+
+    loader.build_indexes("public.stg_sales", [("stg_sales_product_id_idx", ["product_id"])])
+    loader.analyze("public.stg_sales")
+
+    statements = [c.args[0] for c in cursor.execute.call_args_list]
+    assert "CREATE INDEX CONCURRENTLY IF NOT EXISTS stg_sales_product_id_idx ON public.stg_sales (product_id);" in statements
+    assert statements[-1] == "ANALYZE public.stg_sales;"
+    assert autocommit[-2:] == [True, True]
+    assert fake_conn.autocommit is False  # restored before the connection goes back to the pool
+
+
+@patch("src.load.get_conn")
+def test_partitioned_table_indexes_built_without_concurrently(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    cursor.fetchone.return_value = (True,)
+    loader = Loader(logger, conn_params={})
+
+    loader.drop_indexes("public.stg_sales", [("stg_sales_product_id_idx", ["product_id"])])
+    loader.build_indexes("public.stg_sales", [("stg_sales_product_id_idx", ["product_id"])])
+
+    statements = [c.args[0] for c in cursor.execute.call_args_list]
+    assert "DROP INDEX IF EXISTS public.stg_sales_product_id_idx;" in statements
+    assert "CREATE INDEX IF NOT EXISTS stg_sales_product_id_idx ON public.stg_sales (product_id);" in statements
+
+
+def test_load_from_yaml_defers_indexes_for_large_loads(tmp_path, monkeypatch):
+    yaml_file = tmp_path / "config.yaml"
+    yaml_file.write_text(yaml.dump({"sources": [{"name": "s", "load": {"tables": [
+        {"df_key": "stg_sales", "target": "public.stg_sales", "pk": "transaction_id",
+         "indexes": ["product_id"], "defer_indexes": True},
+        {"df_key": "stg_product", "target": "public.stg_product", "pk": "product_id"},
+    ]}}]}))
+    loader = Loader(logger, conn_params={})
+    calls = MagicMock()
+    loader.load = lambda **kwargs: calls.load(kwargs["table_name"])
+    loader.drop_indexes = lambda table, *args: calls.drop(table)
+    loader.build_indexes = lambda table, *args: calls.build(table)
+    loader.analyze = lambda table, *args: calls.analyze(table)
+    frames = {"stg_sales": pd.DataFrame({"transaction_id": [1, 2], "product_id": [1, 1]}),
+              "stg_product": pd.DataFrame({"product_id": [1]})}
+
+    monkeypatch.setattr("src.load.DEFER_INDEX_MIN_ROWS", 2)
+    loader.load_from_yaml(frames, pd.DataFrame(), "s", str(yaml_file))
+    sales = [c for c in calls.mock_calls if c.args == ("public.stg_sales",)]
+    assert [c[0] for c in sales] == ["drop", "load", "build", "analyze"]
+    assert ("analyze", ("public.stg_product",), {}) in calls.mock_calls
+
+    # Small loads keep the indexes in place and only make sure they exist
+    calls.reset_mock()
+    monkeypatch.setattr("src.load.DEFER_INDEX_MIN_ROWS", 3)
+    loader.load_from_yaml(frames, pd.DataFrame(), "s", str(yaml_file))
+    sales = [c for c in calls.mock_calls if c.args == ("public.stg_sales",)]
+    assert [c[0] for c in sales] == ["load", "build", "analyze"]
+
+
+ROLLUP = {"target": "public.agg_daily_sales", "group_by": ["product_id"], "date": "transaction_date",
+          "sums": {"total_spent": "total_spent"}, "count": "num_transactions"}
+
+
+def sales_frame():
+    return pd.DataFrame({"transaction_id": [1, 2], "product_id": [3, 4], "total_spent": [5.0, 7.0],
+                         "transaction_date": pd.to_datetime(["2024-01-01", "2024-01-02"])})
+
+
+@patch("src.load.get_conn")
+def test_merge_with_rollup_applies_deltas_once_per_transaction(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    cursor.fetchall.return_value = [("public", "stg_sales", c, "bigint") for c in sales_frame().columns] + \
+        [("public", "agg_daily_sales", "product_id", "bigint")]
+    cursor.fetchone.return_value = (2,)
+    loader = Loader(logger, conn_params={})
+    loader._copy = MagicMock(return_value="binary")
+
+    # upsert can't see old values, so rollup tables load through the merge
+    loader.load(sales_frame(), "public.stg_sales", conflict_cols=["transaction_id"], strategy="upsert", rollup=ROLLUP,
+                batch_size=1)
+
+    statements = [c.args[0] for c in cursor.execute.call_args_list]
+    merges = [i for i, q in enumerate(statements) if "upserted" in q]
+    assert len(merges) == len(sales_frame())
+    sql = statements[merges[0]]
+    assert "old AS (" in sql and "RETURNING transaction_id, product_id, transaction_date, total_spent" in sql
+    assert "INSERT INTO _delta_stg_sales" in sql and "-o.total_spent" in sql and "o.product_id" in sql
+    assert "agg_daily_sales" not in sql
+
+    # Every batch's delta goes to the rollup in one key-ordered statement at the end of the transaction
+    rollups = [i for i, q in enumerate(statements) if "INSERT INTO public.agg_daily_sales AS r" in q]
+    assert len(rollups) == 1 and rollups[0] > merges[-1]
+    assert "FROM _delta_stg_sales" in statements[rollups[0]]
+    assert "total_spent = r.total_spent + EXCLUDED.total_spent" in statements[rollups[0]]
+    assert not cursor.executemany.called
+    fake_conn.commit.assert_called()
+
+
+def test_ensure_rollup_creates_and_backfills_once(fake_conn):
+    cursor = fake_conn.cursor.return_value
+    cursor.fetchall.return_value = []
+    loader = Loader(logger, conn_params={})
+    df = loader._sanitize(sales_frame())
+
+    for _ in range(2):
+        loader._ensure_rollup(fake_conn, df, "public.stg_sales", ROLLUP, {"product_id": "int32"})
+
+    statements = [c.args[0] for c in cursor.execute.call_args_list]
+    creates = [q for q in statements if "CREATE TABLE" in q]
+    assert len(creates) == 1
+    assert "product_id INTEGER NOT NULL" in creates[0] and "total_spent NUMERIC NOT NULL DEFAULT 0" in creates[0]
+    assert "PRIMARY KEY (product_id, transaction_date)" in creates[0]
+    backfill = [q for q in statements if "INSERT INTO public.agg_daily_sales" in q]
+    assert len(backfill) == 1 and "FROM public.stg_sales" in backfill[0]
+
+
+@patch("src.load.get_conn")
+def test_partition_replace_recomputes_rollup_month(mock_get_conn, fake_conn):
+    mock_get_conn.return_value = fake_conn
+    cursor = fake_conn.cursor.return_value
+    partitioned_sales_cursor(cursor, sales_frame().columns, tables=["agg_daily_sales"])
+    cursor.fetchone.return_value = (True,)
+    loader = Loader(logger, conn_params={})
+    loader._copy = MagicMock(return_value="binary")
+
+    loader.load(sales_frame(), "public.stg_sales", conflict_cols=["transaction_id"], strategy="partition_replace",
+                partition_by="transaction_date", rollup=ROLLUP)
+
+    # Rollup work happens in the swap transaction, before the parent is locked
+    statements = [c.args[0] for c in cursor.execute.call_args_list]
+    detach = statements.index(next(q for q in statements if "DETACH PARTITION" in q))
+    moved = statements.index(next(q for q in statements if q.startswith("WITH moved AS (DELETE FROM public.stg_sales t")))
+    assert "INSERT INTO public.agg_daily_sales AS r" in statements[moved]
+    assert "-o.total_spent AS total_spent" in statements[moved] and "-1 AS _n FROM moved o" in statements[moved]
+    assert statements[moved + 1].startswith("DELETE FROM public.agg_daily_sales WHERE transaction_date >= %s")
+    assert "FROM public.stg_sales_p2024_01_new) AS p" in statements[moved + 2]
+    assert moved + 2 < detach
@@ -2,7 +2,34 @@ import pytest
 from unittest.mock import MagicMock, patch
 import pandas as pd
 import streamlit as st
-from src.main import run_etl, streamlit_run_etl, streamlit_app
+from src.main import run_etl, run_etl_stream, streamlit_run_etl, streamlit_app
+
+@pytest.fixture(autouse=True)
+def no_parquet_output(monkeypatch):
+    # config/sources.yml enables Parquet output; keep these tests from writing data/out
+    monkeypatch.setattr("src.load.Loader.write_parquet", MagicMock())
+
+
+@pytest.fixture(autouse=True)
+def no_key_registry(monkeypatch):
+    # config/sources.yml reads dimension keys from the database
+    monkeypatch.setattr("src.main.open_key_registry", lambda *args, **kwargs: None)
+
+
+@pytest.fixture(autouse=True)
+def no_index_maintenance(monkeypatch):
+    # Index builds and ANALYZE after each load go to the database
+    for name in ("drop_indexes", "build_indexes", "analyze", "prepare_bulk_load", "finish_bulk_load"):
+        monkeypatch.setattr(f"src.load.Loader.{name}", MagicMock())
+
+
+@pytest.fixture(autouse=True)
+def fresh_session_state():
+    # streamlit_app keeps the last ETL result in session_state across reruns
+    st.session_state.clear()
+    yield
+    st.session_state.clear()
+
 
 @pytest.fixture
 def sample_raw_df():
@@ -81,7 +108,7 @@ def test_run_etl_success(monkeypatch, sample_raw_df):
         def validate_raw_df(self, df): return True
         def clean(self, df): return (df, pd.DataFrame())
         def validate_clean_df(self, df): return True
-        def normalize(self, df):
+        def normalize(self, df, key_state=None):
             return {
                 "stg_sales": df,
                 "stg_product": df[["product_id", "quantity"]].drop_duplicates(),
@@ -101,6 +128,107 @@ def test_run_etl_success(monkeypatch, sample_raw_df):
     assert not stg_payment_method.empty
 
 
+def test_run_etl_with_registered_keys(monkeypatch, tmp_path):
+    # Second run against a registry that already holds every member: the dashboard frames stay
+    # complete, only the database load of the dimensions is empty
+    import yaml
+    from src.extract import DataExtractor
+    from src.keys import open_key_registry
+    from src.load import Loader
+    from src.transform import Transformer
+
+    input_file = tmp_path / "sales.csv"
+    with open("data/in/dirty_cafe_sales.csv") as f:
+        input_file.write_text("".join(f.readlines()[:201]))
+
+    source = yaml.safe_load(open("config/sources.yml"))["sources"][0]
+    source["normalize"]["key_registry"] = {"backend": "file", "path": str(tmp_path / "keys.json")}
+    config_path = tmp_path / "sources.yml"
+    config_path.write_text(yaml.safe_dump({"sources": [source]}))
+    registry = lambda *args, **kwargs: open_key_registry(str(config_path), "dirty_cafe_sales")
+
+    first_run = registry()
+    transformer = Transformer()
+    df_clean, _ = transformer.clean(DataExtractor().extract(str(input_file)))
+    transformer.normalize(df_clean, key_state=first_run)
+    first_run.commit()
+
+    monkeypatch.setattr("src.main.open_key_registry", registry)
+    load = MagicMock()
+    monkeypatch.setattr(Loader, "load", load)
+
+    result, analytics, stg_sales, stg_product, stg_location, stg_payment_method, *_ = run_etl(str(input_file), db_conf={})
+
+    assert result["status"] == "success"
+    assert not stg_product.empty and not stg_location.empty and not stg_payment_method.empty
+    assert set(stg_sales["product_id"]) <= set(stg_product["product_id"])
+    assert analytics.sales_by_product()["total_spent"].sum() == pytest.approx(stg_sales["total_spent"].sum())
+
+    loaded = {c.kwargs["table_name"]: c.kwargs["df"] for c in load.call_args_list}
+    assert loaded["public.stg_product"].empty  # nothing new to load
+    assert len(loaded["public.stg_sales"]) == len(stg_sales)
+
+
+def test_run_etl_stream_loads_each_chunk(monkeypatch, sample_raw_df):
+    from src.extract import DataExtractor
+    chunks = [sample_raw_df.iloc[[0]], sample_raw_df.iloc[[1]]]
+    monkeypatch.setattr(DataExtractor, "extract", lambda self, f, chunksize=None: iter(chunks))
+
+    class FakeTransformer:
+        def __init__(self, logger=None): pass
+        def validate_raw_df(self, df): return True
+        def clean(self, df, seen_keys=None): return (df, pd.DataFrame())
+        def validate_clean_df(self, df): return True
+        def normalize(self, df, key_state=None): return {"stg_sales": df}
+    monkeypatch.setattr("src.main.Transformer", lambda logger=None: FakeTransformer())
+
+    load_from_yaml = MagicMock()
+    monkeypatch.setattr("src.load.Loader.__init__", lambda self, conn_params, logger=None: None)
+    monkeypatch.setattr("src.load.Loader.load_from_yaml", load_from_yaml)
+
+    result = run_etl_stream("fake.csv", db_conf={}, chunksize=1)
+    assert result["status"] == "success"
+    assert result["chunks"] == 2
+    assert result["clean_rows"] == 2
+    assert load_from_yaml.call_count == 2
+    # Indexes dropped once before the first chunk and rebuilt once after the last
+    assert all(c.kwargs["maintain_indexes"] is False for c in load_from_yaml.call_args_list)
+    from src.load import Loader
+    assert Loader.prepare_bulk_load.call_count == 1
+    assert Loader.finish_bulk_load.call_count == 1
+
+
+def test_run_etl_stream_reads_parquet_by_batch(monkeypatch, sample_raw_df, tmp_path):
+    pytest.importorskip("pyarrow")
+    input_file = tmp_path / "sales.parquet"
+    sample_raw_df.to_parquet(input_file, row_group_size=1)
+
+    class FakeTransformer:
+        def __init__(self, logger=None): pass
+        def validate_raw_df(self, df): return True
+        def clean(self, df, seen_keys=None): return (df, pd.DataFrame())
+        def validate_clean_df(self, df): return True
+        def normalize(self, df, key_state=None): return {"stg_sales": df}
+    monkeypatch.setattr("src.main.Transformer", lambda logger=None: FakeTransformer())
+    load_from_yaml = MagicMock()
+    monkeypatch.setattr("src.load.Loader.load_from_yaml", load_from_yaml)
+
+    result = run_etl_stream(str(input_file), db_conf={}, chunksize=1)
+
+    assert result["status"] == "success"
+    assert result["chunks"] == 2 and result["raw_rows"] == 2
+    loaded = [c.kwargs["normalized_dict"]["stg_sales"] for c in load_from_yaml.call_args_list]
+    assert [df["transaction_id"].tolist() for df in loaded] == [[1], [2]]
+
+
+def test_run_etl_stream_rejects_unchunked_input(monkeypatch, sample_raw_df):
+    from src.extract import DataExtractor
+    monkeypatch.setattr(DataExtractor, "extract", lambda self, f, chunksize=None: sample_raw_df)
+
+    with pytest.raises(ValueError, match="can't be read in chunks"):
+        run_etl_stream("sales.xyz", db_conf={}, chunksize=1)
+
+
 def test_streamlit_run_etl_no_file(monkeypatch):
     result, *_ = streamlit_run_etl(None, db_conf={})
     assert result["status"] == "failed"
@@ -117,7 +245,7 @@ def test_streamlit_run_etl_csv_success(monkeypatch, sample_raw_df, fake_file_csv
         def validate_raw_df(self, df): return True
         def clean(self, df): return (df, pd.DataFrame())
         def validate_clean_df(self, df): return True
-        def normalize(self, df): 
+        def normalize(self, df, key_state=None): 
             return {
                 "stg_sales": df,
                 "stg_product": df[["product_id", "quantity"]].drop_duplicates(),
@@ -144,7 +272,7 @@ def test_streamlit_run_etl_json_success(monkeypatch, sample_raw_df, fake_file_js
         def validate_raw_df(self, df): return True
         def clean(self, df): return (df, pd.DataFrame())
         def validate_clean_df(self, df): return True
-        def normalize(self, df):
+        def normalize(self, df, key_state=None):
             return {
                 "stg_sales": df,  # includes 'quantity'
                 "stg_product": pd.DataFrame({
@@ -195,7 +323,7 @@ def test_streamlit_app_with_file(mock_button, mock_uploader, monkeypatch, sample
         def validate_raw_df(self, df): return True
         def clean(self, df): return (df, pd.DataFrame())
         def validate_clean_df(self, df): return True
-        def normalize(self, df):
+        def normalize(self, df, key_state=None):
             return {
                 "stg_sales": df,  
                 "stg_product": pd.DataFrame({
@@ -219,3 +347,33 @@ def test_streamlit_app_with_file(mock_button, mock_uploader, monkeypatch, sample
     Loader.load = MagicMock()
 
     streamlit_app()
+
+
+@patch("streamlit.multiselect")
+@patch("streamlit.file_uploader")
+@patch("streamlit.button")
+def test_streamlit_app_keeps_dashboard_across_reruns(mock_button, mock_uploader, mock_multiselect, monkeypatch, sample_raw_df, fake_file_csv):
+    from src.analytics import SalesAnalytics
+    stg_product = pd.DataFrame({"product_id": [101, 102], "product_name": ["A", "B"]})
+    stg_location = pd.DataFrame({"location_id": [201, 202], "location_name": ["Loc1", "Loc2"]})
+    stg_payment = pd.DataFrame({"payment_id": [301, 302], "payment_name": ["Card", "Cash"]})
+    analytics = SalesAnalytics(sample_raw_df, stg_product, stg_location, stg_payment)
+    filtered = MagicMock(wraps=analytics.filter)
+    monkeypatch.setattr(analytics, "filter", filtered)
+    run = MagicMock(return_value=({"status": "success"}, analytics, sample_raw_df, stg_product, stg_location, stg_payment,
+                                  pd.DataFrame(), sample_raw_df, sample_raw_df))
+    monkeypatch.setattr("src.main.streamlit_run_etl", run)
+    mock_uploader.return_value = fake_file_csv
+
+    mock_button.return_value = True
+    mock_multiselect.return_value = []
+    streamlit_app()
+    filtered.assert_not_called()
+
+    # Picking a product reruns the script; the button is no longer pressed
+    mock_button.return_value = False
+    mock_multiselect.side_effect = lambda title, options: options[:1] if title == "Products" else []
+    streamlit_app()
+
+    run.assert_called_once()
+    assert filtered.call_args.kwargs["product"] == ["A"]
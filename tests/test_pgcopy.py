@@ -0,0 +1,99 @@
+import struct
+from datetime import date, datetime
+from decimal import Decimal
+import pandas as pd
+import pytest
+from src import pgcopy
+from src.pgcopy import BinaryCopyStream, UnsupportedType, _numeric_bytes
+
+
+def _decode(data: bytes, oids: list) -> list:
+    # Minimal reader for the binary COPY format, enough to check the encoder
+    assert data.startswith(pgcopy.HEADER)
+    pos, rows = len(pgcopy.HEADER), []
+    while True:
+        (nfields,) = struct.unpack_from(">h", data, pos)
+        pos += 2
+        if nfields == -1:
+            assert pos == len(data)
+            return rows
+        row = []
+        for oid in oids:
+            (length,) = struct.unpack_from(">i", data, pos)
+            pos += 4
+            if length == -1:
+                row.append(None)
+                continue
+            raw = data[pos:pos + length]
+            pos += length
+            if oid == pgcopy.INT8:
+                row.append(struct.unpack(">q", raw)[0])
+            elif oid == pgcopy.INT4:
+                row.append(struct.unpack(">i", raw)[0])
+            elif oid == pgcopy.FLOAT8:
+                row.append(struct.unpack(">d", raw)[0])
+            elif oid == pgcopy.BOOL:
+                row.append(raw == b"\x01")
+            elif oid == pgcopy.TEXT:
+                row.append(raw.decode("utf-8"))
+            elif oid == pgcopy.DATE:
+                row.append(date(2000, 1, 1) + pd.Timedelta(days=struct.unpack(">i", raw)[0]))
+            elif oid == pgcopy.TIMESTAMP:
+                row.append(datetime(2000, 1, 1) + pd.Timedelta(microseconds=struct.unpack(">q", raw)[0]))
+            elif oid == pgcopy.NUMERIC:
+                ndigits, weight, sign, dscale = struct.unpack_from(">hhHh", raw)
+                digits = struct.unpack_from(f">{ndigits}h", raw, 8)
+                value = sum(Decimal(d) * Decimal(10000) ** (weight - i) for i, d in enumerate(digits))
+                row.append(-value if sign == 0x4000 else value)
+        rows.append(row)
+
+
+def _read_all(stream, size=7):
+    parts = []
+    while True:
+        part = stream.read(size)
+        if not part:
+            return b"".join(parts)
+        parts.append(part)
+
+
+def test_round_trip_all_types():
+    df = pd.DataFrame({
+        "id": [1, 2, 3],
+        "qty": pd.array([5, None, 7], dtype="Int64"),
+        "price": [1.5, None, -2.25],
+        "flag": [True, False, True],
+        "name": pd.array(["Coffee", None, "Thé"], dtype="string"),
+        "day": pd.to_datetime(["2023-01-31", None, "1999-12-31"]),
+        "ts": pd.Series([pd.Timestamp("2023-01-31 10:11:12.5"), pd.Timestamp("2000-01-01"), pd.NaT]),
+        "amount": [12.5, 0.0001, None],
+    })
+    oids = [pgcopy.INT8, pgcopy.INT4, pgcopy.FLOAT8, pgcopy.BOOL, pgcopy.TEXT, pgcopy.DATE, pgcopy.TIMESTAMP, pgcopy.NUMERIC]
+
+    rows = _decode(_read_all(BinaryCopyStream(df, oids, chunk_rows=2)), oids)
+
+    assert rows == [
+        [1, 5, 1.5, True, "Coffee", date(2023, 1, 31), datetime(2023, 1, 31, 10, 11, 12, 500000), Decimal("12.5")],
+        [2, None, None, False, None, None, datetime(2000, 1, 1), Decimal("0.0001")],
+        [3, 7, -2.25, True, "Thé", date(1999, 12, 31), None, None],
+    ]
+
+
+@pytest.mark.parametrize("value, expected", [
+    (12.5, (2, 0, 0, 1, [12, 5000])),
+    (-3.75, (2, 0, 0x4000, 2, [3, 7500])),
+    (10000, (1, 1, 0, 0, [1])),
+    (0.0, (0, 0, 0, 1, [])),
+])
+def test_numeric_wire_format(value, expected):
+    ndigits, weight, sign, dscale, digits = expected
+    assert _numeric_bytes(value) == struct.pack(f">hhHh{ndigits}h", ndigits, weight, sign, dscale, *digits)
+
+
+def test_unsupported_values_raise():
+    with pytest.raises(UnsupportedType):
+        BinaryCopyStream(pd.DataFrame({"q": [1.5]}), [pgcopy.INT8])
+    with pytest.raises(UnsupportedType):
+        BinaryCopyStream(pd.DataFrame({"q": [1]}), [114])  # json
+    with pytest.raises(UnsupportedType):
+        BinaryCopyStream(pd.DataFrame({"a": [1], "b": [2]}), [pgcopy.INT8])
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from unittest.mock import MagicMock
+from src.rules import RuleSet
+
+
+def sample_df():
+    return pd.DataFrame({
+        "Quantity": pd.array([1, 0, None, 5], dtype="Int64"),
+        "Price Per Unit": [1.0, np.nan, -1.0, 3.0],
+        "Payment Method": pd.array(["Cash", "Card", None, "Bitcoin"], dtype="string"),
+    })
+
+
+def test_rules_single_pass_with_first_failure():
+    rules = RuleSet([
+        {"column": "Quantity", "must_be": "> 0"},
+        {"column": "Price Per Unit", "must_be": ">= 0"},
+        {"column": "Payment Method", "must_be": "in ['Cash', 'Card']"},
+    ])
+    invalid, failed_rule = rules.evaluate(sample_df())
+
+    assert list(invalid) == [False, True, True, True]
+    assert list(failed_rule) == [-1, 0, 1, 2]
+
+
+def test_rules_methods_and_boolean_ops():
+    rules = RuleSet([
+        {"column": "Quantity", "must_be": ".between(1, 4)"},
+        {"column": "Price Per Unit", "must_be": "> 0 and x < 2"},
+    ])
+    invalid, _ = rules.evaluate(sample_df())
+
+    # NA is never a domain failure: required_fields handles missing values
+    assert list(invalid) == [False, True, True, True]
+
+
+def test_rules_reject_unsafe_expressions():
+    logger = MagicMock()
+    rules = RuleSet([
+        {"column": "Quantity", "must_be": "> __import__('os').getcwd()"},
+        {"column": "Quantity", "must_be": "; import os"},
+        {"column": "Quantity", "must_be": ".apply(print)"},
+    ], logger=logger)
+
+    assert rules.rules == []
+    assert logger.error.call_count == 3
+
+
+def test_rules_missing_column_skipped():
+    logger = MagicMock()
+    rules = RuleSet([{"column": "Nope", "must_be": "> 0"}], logger=logger)
+    invalid, _ = rules.evaluate(sample_df())
+
+    assert not invalid.any()
+    logger.warning.assert_called_once()
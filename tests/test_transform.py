@@ -66,3 +66,82 @@ def test_normalize_structure(sample_valid_df):
     sales_cols = ["transaction_id", "product_id", "quantity", "total_spent", "payment_id", "location_id", "transaction_date"]
     for col in sales_cols:
         assert col in normalized["stg_sales"].columns
+
+
+def test_stream_matches_single_shot(sample_valid_df):
+    df = pd.concat([sample_valid_df, sample_valid_df.iloc[[1]]], ignore_index=True)  # dupe lands in a later chunk
+    transformer = Transformer()
+    df_clean, _ = transformer.clean(df.copy())
+    single = transformer.normalize(df_clean)
+
+    seen_keys, key_state, parts = set(), {}, {}
+    for start in range(0, len(df), 2):
+        chunk_clean, _ = transformer.clean(df.iloc[start:start + 2].copy(), seen_keys=seen_keys)
+        normalized = transformer.normalize(chunk_clean, key_state=key_state)
+        for name, table in normalized.items():
+            # Each chunk's dimension tables repeat members seen before; new_members is what gets loaded
+            parts.setdefault(name, []).append(normalized.new_members.get(name, table))
+
+    for name, table in single.items():
+        streamed = pd.concat(parts[name], ignore_index=True)
+        pd.testing.assert_frame_equal(table.reset_index(drop=True), streamed)
+
+
+def test_clean_categorical_input(sample_valid_df):
+    df = sample_valid_df.copy()
+    df.loc[1, "Location"] = "UNKNOWN"
+    df["Location"] = df["Location"].astype("category")
+    transformer = Transformer()
+    df_clean, _ = transformer.clean(df)
+
+    assert pd.isna(df_clean.loc[df_clean["Transaction ID"] == 2, "Location"].iloc[0])
+    assert pd.api.types.is_string_dtype(df_clean["Location"])
+
+
+def test_memoized_transformations_match_direct():
+    df = pd.DataFrame({
+        "Transaction ID": ["TXN_1", "TXN_2", "TXN_1", None, "bad", "TXN_2"],
+        "Quantity": ["2", "x", "2", None, "3", "2"],
+    })
+    transformer = Transformer()
+    rules = [{"column": "Transaction ID", "regex_extract": r"(\d+)", "numeric": "int"},
+             {"column": "Quantity", "numeric": "float"}]
+
+    transformer.expected_cleaning = {"transformations": rules, "memoize": False}
+    direct = transformer._apply_transformations(df.copy())
+    for cache_size in (0, 100):
+        transformer.expected_cleaning = {"transformations": rules, "memoize": True, "memo_cache_size": cache_size}
+        pd.testing.assert_frame_equal(transformer._apply_transformations(df.copy()), direct)
+
+
+def test_value_cache_reused_across_chunks():
+    from src.transform import _ValueCache
+    cache = _ValueCache(maxsize=2)
+    calls = []
+
+    def fn(u):
+        calls.append(len(u))
+        return u.str.upper()
+
+    first = cache.transform(pd.Series(["a", "b"]), fn)
+    second = cache.transform(pd.Series(["b", "c", None]), fn)
+
+    assert first.tolist() == ["A", "B"]
+    assert second.tolist()[:2] == ["B", "C"] and pd.isna(second.iloc[2])
+    assert calls == [2, 2]  # "b" served from cache, NA always recomputed
+    assert list(cache._data) == [(str, "b"), (str, "c")]  # "a" evicted
+
+
+def test_normalize_keys_point_at_matching_members(sample_valid_df):
+    df = pd.concat([sample_valid_df, sample_valid_df], ignore_index=True)
+    df["Transaction ID"] = range(1, len(df) + 1)
+    transformer = Transformer()
+    df_clean, _ = transformer.clean(df.copy())
+    normalized = transformer.normalize(df_clean)
+
+    sales = normalized["stg_sales"].set_index("transaction_id")
+    product = normalized["stg_product"].set_index("product_id")
+    items = product.loc[sales["product_id"], "Item"].to_numpy()
+    expected = df_clean.set_index("Transaction ID").loc[sales.index, "Item"].to_numpy()
+    assert list(items) == list(expected)
+    assert product.index.tolist() == list(range(1, len(product) + 1))